@@ -0,0 +1,86 @@
+"""
+Spread a load generator's writes over several buckets.
+
+Every request normally goes to BUCKET_NAME, so the object store's per-bucket index is a
+single point of contention. With BUCKET_COUNT=N the generator writes to N buckets named
+BUCKET_NAME-0000 ... BUCKET_NAME-<N-1>, created in parallel before the run starts, and
+picks one per request:
+
+    uniform   every bucket equally likely
+    zipf:S    bucket i (from 0) chosen with weight 1/(i+1)**S, so a few buckets stay hot
+
+The chosen bucket is recorded in each result's bucket column, and process_data.py plots
+successful requests per second against the number of buckets written.
+
+This module is imported by the load generators, so keep it free of anything but the
+standard library.
+"""
+
+import itertools
+import logging
+import random
+from multiprocessing.pool import ThreadPool
+
+
+def bucket_names(prefix, count):
+    """The bucket names for count buckets; count 1 is just prefix, as before."""
+    if count <= 1:
+        return [prefix]
+    return ["{}-{:04d}".format(prefix, i) for i in range(count)]
+
+
+def keyset_bucket(names, index):
+    """
+    The bucket that key index of a key set lives in. mkobjects.py writes the key set with
+    this and mkobjects2.py reads it back with it, so both must be given the same names.
+    """
+    return names[index % len(names)]
+
+
+def parse_skew(skew, count):
+    """Weights for count buckets from "uniform" or "zipf:S"."""
+    name, _, parameter = skew.partition(":")
+    if name == "uniform":
+        return [1.0] * count
+    if name == "zipf":
+        s = float(parameter or 1.0)
+        return [1.0 / (i + 1) ** s for i in range(count)]
+    raise ValueError("Unknown skew {!r}, expected uniform or zipf:S".format(skew))
+
+
+class BucketChooser:
+    """Pick a bucket per request according to the weights. Safe to share between threads."""
+
+    def __init__(self, names, skew="uniform"):
+        self.names = names
+        self.skew = skew
+        self._cum_weights = list(itertools.accumulate(parse_skew(skew, len(names))))
+
+    def choose(self):
+        if len(self.names) == 1:
+            return self.names[0]
+        return random.choices(self.names, cum_weights=self._cum_weights)[0]
+
+
+def create_buckets(names, create, threads=16):
+    """
+    Call create(name) for every bucket from a pool of threads. A bucket that already exists
+    (another pod got there first) is fine; returns the names that couldn't be created.
+    """
+    def create_one(name):
+        try:
+            create(name)
+        except Exception as e:
+            if getattr(e, "status", None) == 409:
+                return None
+            logging.error("Creating bucket %s failed: %s", name, e)
+            return name
+        return None
+
+    pool = ThreadPool(processes=max(1, min(threads, len(names))))
+    try:
+        failed = [name for name in pool.map(create_one, names) if name is not None]
+    finally:
+        pool.close()
+    logging.info("%d of %d buckets ready", len(names) - len(failed), len(names))
+    return failed
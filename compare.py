@@ -0,0 +1,213 @@
+"""
+Compare two benchmark runs and flag statistically significant regressions.
+
+    python compare.py baseline.sres candidate.sres
+    python compare.py before.csv after.csv --endpoint s3.echo.stfc.ac.uk --op PUT --threshold 0.1
+
+Both runs are loaded into a ResultStore (CSV or binary results files) and filtered the
+same way. For each metric the table gives the baseline and candidate values, the relative
+change and its bootstrap confidence interval:
+
+    ok/s, MB/s     successful requests and bytes per second. The runs are cut into
+                   --window second windows and the windows are resampled, so minute-scale
+                   drifts in the rate widen the interval as they should.
+    p50/p90/p99    latency percentiles of successful requests. Durations are binned on a
+                   fine log scale (BINS bins over both runs, well under 1% apart) and each
+                   resample is one multinomial draw over the bins, so resampling costs the
+                   same for a thousand rows as for millions.
+    error rate     failed / all requests, resampled as a binomial. Its change and interval
+                   are the difference in percentage points, so a baseline with no errors
+                   still compares.
+
+A change is significant when its interval excludes zero, and a regression when it is also
+worse than --threshold (lower throughput, higher latency or error rate; for the error
+rate the threshold is a difference, 0.05 meaning 5 percentage points). The duration
+distributions are also compared as a whole with a two-sample Kolmogorov-Smirnov test and a
+Mann-Whitney test (the chance a candidate request is slower than a baseline one). With
+millions of rows their p-values are tiny for any difference at all, so read them together
+with the effect sizes.
+
+The exit status is 1 if any regression was flagged, so this can gate a pipeline.
+"""
+
+import argparse
+import math
+import time
+
+import numpy as np
+
+from resultstore import ResultStore
+
+BINS = 2048
+QUANTILES = [0.5, 0.9, 0.99]
+# metrics where a higher value is worse
+HIGHER_IS_WORSE = {"p50 ms", "p90 ms", "p99 ms", "error rate"}
+
+
+class Run:
+    """The parts of one run the comparison needs, as NumPy arrays."""
+
+    def __init__(self, path, window, filters):
+        self.path = path
+        store = ResultStore.load(path)
+        rows = store.query(**filters)
+        ok = store.query(errors=False, **filters)
+        if not len(ok):
+            raise ValueError("{} has no successful requests matching the filters".format(path))
+        self.requests = len(rows)
+        self.failed = len(rows) - len(ok)
+        self.durations = np.asarray(store.column("duration", ok), dtype=np.float64)
+        timestamps = store.column("timestamp", ok)
+        sizes = np.asarray(store.column("size", ok), dtype=np.float64)
+
+        # whole windows only, so a partial last window doesn't drag the rate down
+        n_windows = max(1, int((timestamps[-1] - timestamps[0]) // window))
+        edges = timestamps[0] + window * np.arange(n_windows + 1)
+        self.window_ops = np.histogram(timestamps, edges)[0] / window
+        self.window_bytes = np.histogram(timestamps, edges, weights=sizes)[0] / window
+
+
+def bootstrap_means(values, resamples, rng):
+    """Means of resamples resamples (with replacement) of values."""
+    picks = rng.integers(0, len(values), size=(resamples, len(values)))
+    return values[picks].mean(axis=1)
+
+
+def log_edges(*samples):
+    """BINS log-spaced bin edges covering every sample."""
+    low = min(np.min(s[s > 0]) if np.any(s > 0) else 1e-6 for s in samples)
+    high = max(np.max(s) for s in samples)
+    return np.geomspace(low, max(high, low * 1.0001), BINS + 1)
+
+
+def bootstrap_quantiles(durations, edges, resamples, rng):
+    """QUANTILES x resamples array of bootstrapped quantiles, from the binned durations."""
+    counts = np.histogram(np.clip(durations, edges[0], edges[-1]), edges)[0]
+    draws = rng.multinomial(len(durations), counts / counts.sum(), size=resamples)
+    cumulative = np.cumsum(draws, axis=1)
+    centres = np.sqrt(edges[:-1] * edges[1:])
+    return np.array([centres[np.minimum((cumulative < q * len(durations)).sum(axis=1), BINS - 1)]
+                     for q in QUANTILES])
+
+
+def ks_test(a, b):
+    """Two-sample Kolmogorov-Smirnov statistic D and its asymptotic p-value."""
+    a = np.sort(a)
+    b = np.sort(b)
+    values = np.concatenate([a, b])
+    d = np.max(np.abs(np.searchsorted(a, values, side="right") / len(a)
+                      - np.searchsorted(b, values, side="right") / len(b)))
+    en = math.sqrt(len(a) * len(b) / (len(a) + len(b)))
+    x = (en + 0.12 + 0.11 / en) * d
+    if x < 0.2:
+        return d, 1.0
+    k = np.arange(1, 101)
+    p = 2 * np.sum((-1.0) ** (k - 1) * np.exp(-2 * k ** 2 * x ** 2))
+    return d, float(min(max(p, 0.0), 1.0))
+
+
+def mann_whitney(candidate, baseline):
+    """P(a candidate request is slower than a baseline one), ties counting half, and its p-value."""
+    baseline = np.sort(baseline)
+    below = np.searchsorted(baseline, candidate, side="left")
+    at_or_below = np.searchsorted(baseline, candidate, side="right")
+    n, m = len(candidate), len(baseline)
+    u = float(np.sum(below) + 0.5 * np.sum(at_or_below - below))
+    z = (u - n * m / 2.0) / math.sqrt(n * m * (n + m + 1) / 12.0)
+    return u / (n * m), math.erfc(abs(z) / math.sqrt(2))
+
+
+def compare(baseline, candidate, resamples, confidence, rng):
+    """
+    Rows of (metric, baseline value, candidate value, bootstrapped changes, relative): the
+    changes are candidate/baseline - 1 when relative, candidate - baseline when not.
+    """
+    rows = []
+    for name, attribute, scale in (("ok/s", "window_ops", 1.0), ("MB/s", "window_bytes", 1e-6)):
+        base_values = getattr(baseline, attribute) * scale
+        cand_values = getattr(candidate, attribute) * scale
+        ratios = bootstrap_means(cand_values, resamples, rng) / bootstrap_means(base_values, resamples, rng)
+        rows.append((name, base_values.mean(), cand_values.mean(), ratios - 1, True))
+
+    edges = log_edges(baseline.durations, candidate.durations)
+    base_quantiles = bootstrap_quantiles(baseline.durations, edges, resamples, rng)
+    cand_quantiles = bootstrap_quantiles(candidate.durations, edges, resamples, rng)
+    base_exact = np.percentile(baseline.durations, [100 * q for q in QUANTILES])
+    cand_exact = np.percentile(candidate.durations, [100 * q for q in QUANTILES])
+    for i, q in enumerate(QUANTILES):
+        rows.append(("p{:g} ms".format(100 * q), base_exact[i] * 1000, cand_exact[i] * 1000,
+                     cand_quantiles[i] / base_quantiles[i] - 1, True))
+
+    base_rate = baseline.failed / baseline.requests
+    cand_rate = candidate.failed / candidate.requests
+    base_draws = rng.binomial(baseline.requests, base_rate, resamples) / baseline.requests
+    cand_draws = rng.binomial(candidate.requests, cand_rate, resamples) / candidate.requests
+    rows.append(("error rate", base_rate, cand_rate, cand_draws - base_draws, False))
+    return rows
+
+
+def verdict(name, change, low, high, threshold):
+    if not (low > 0 or high < 0):
+        return ""
+    worse = change > 0 if name in HIGHER_IS_WORSE else change < 0
+    if not worse:
+        return "better"
+    return "REGRESSION" if abs(change) > threshold else "worse"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two runs with bootstrap confidence intervals")
+    parser.add_argument("baseline", help="results file (CSV or binary)")
+    parser.add_argument("candidate", help="results file (CSV or binary)")
+    parser.add_argument("--endpoint", help="only requests to this endpoint")
+    parser.add_argument("--hostname", help="only requests from this client host")
+    parser.add_argument("--bucket", help="only requests to this bucket")
+    parser.add_argument("--op", help="only PUT or GET requests")
+    parser.add_argument("--window", type=float, default=10.0, help="seconds per throughput window")
+    parser.add_argument("--resamples", type=int, default=2000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--threshold", type=float, default=0.05, help="smallest relative change called a regression (a difference for the error rate)")
+    parser.add_argument("--seed", type=int, help="random seed, for repeatable intervals")
+    args = parser.parse_args()
+
+    filters = {"endpoint": args.endpoint, "hostname": args.hostname, "bucket": args.bucket, "op": args.op}
+    start = time.perf_counter()
+    baseline = Run(args.baseline, args.window, filters)
+    candidate = Run(args.candidate, args.window, filters)
+    loaded = time.perf_counter() - start
+    rng = np.random.default_rng(args.seed)
+    rows = compare(baseline, candidate, args.resamples, args.confidence, rng)
+    d, ks_p = ks_test(baseline.durations, candidate.durations)
+    slower, mw_p = mann_whitney(candidate.durations, baseline.durations)
+
+    print("baseline:  {} ({} requests, {} failed)".format(args.baseline, baseline.requests, baseline.failed))
+    print("candidate: {} ({} requests, {} failed)".format(args.candidate, candidate.requests, candidate.failed))
+    print()
+    tail = 100 * (1 - args.confidence) / 2
+    print("{:12} {:>12} {:>12} {:>9}   {:^21}".format("metric", "baseline", "candidate", "change",
+                                                      "{:g}% interval".format(100 * args.confidence)))
+    regressions = 0
+    for name, base_value, cand_value, changes, relative in rows:
+        changes = changes[np.isfinite(changes)]
+        if relative:
+            change = cand_value / base_value - 1 if base_value else float("nan")
+        else:
+            change = cand_value - base_value
+        if len(changes):
+            low, high = np.percentile(changes, [tail, 100 - tail])
+        else:
+            low = high = float("nan")
+        label = verdict(name, change, low, high, args.threshold)
+        regressions += label == "REGRESSION"
+        unit = "%" if relative else "pp"
+        print("{:12} {:12.4g} {:12.4g} {:+8.1f}{:2}  [{:+7.1f}{}, {:+7.1f}{}]  {}".format(
+            name, base_value, cand_value, 100 * change, unit, 100 * low, unit, 100 * high, unit, label))
+    print()
+    print("durations: Kolmogorov-Smirnov D = {:.4f} (p = {:.3g}), P(candidate slower) = {:.3f} (p = {:.3g})".format(
+        d, ks_p, slower, mw_p))
+    print("compared in {:.1f}s (loading {:.1f}s)".format(time.perf_counter() - start, loaded))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
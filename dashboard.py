@@ -0,0 +1,298 @@
+"""
+Live dashboard for a running stress test.
+
+Listens for the per-request CSV datagrams that mkobjects2.py sends to port 5050
+(hostname,timestamp,endpoint,bucket,size,duration,error) and keeps, per endpoint, a ring
+of one-second slots covering the last --window seconds. Each slot holds the request,
+error and byte counts, a log-spaced duration histogram and an error breakdown, so memory
+stays fixed however long the run goes. Rates, p50/p90/p99 and errors are read off the
+summed slots and served as JSON on /stats, with a page on / that refreshes every second.
+
+With -o the raw lines are also appended to a CSV, so this can stand in for the collector.
+
+Usage:
+    python dashboard.py [--udp-port 5050] [--http-port 8080] [--window 60] [-o data.csv]
+    python dashboard.py --bench 1000000
+"""
+
+import argparse
+import json
+import logging
+import math
+import socket
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from results import COLUMNS
+
+logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", datefmt="%Y/%m/%d %H:%M:%S", level=logging.INFO)
+
+# Duration histogram: BINS_PER_DECADE log-spaced bins from MIN_DURATION up to 10^DECADES times that
+MIN_DURATION = 1e-4
+BINS_PER_DECADE = 20
+DECADES = 7
+NUM_BINS = BINS_PER_DECADE * DECADES
+_BIN_SCALE = BINS_PER_DECADE / math.log(10)
+_LOG_MIN = math.log(MIN_DURATION)
+
+MAX_ERROR_KINDS = 16
+ERROR_CLASS_FIELD = COLUMNS.index("error_class")
+PERCENTILES = (50, 90, 99)
+
+
+def duration_bin(duration):
+    if duration <= MIN_DURATION:
+        return 0
+    b = int((math.log(duration) - _LOG_MIN) * _BIN_SCALE)
+    return b if b < NUM_BINS else NUM_BINS - 1
+
+
+def bin_upper_edge(b):
+    return MIN_DURATION * 10 ** ((b + 1) / BINS_PER_DECADE)
+
+
+class Slot:
+    __slots__ = ("second", "requests", "errors", "bytes", "hist", "error_kinds")
+
+    def __init__(self):
+        self.reset(-1)
+
+    def reset(self, second):
+        self.second = second
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.hist = [0] * NUM_BINS
+        self.error_kinds = {}
+
+
+class WindowStats:
+    """Sliding window of one-second slots for a single endpoint."""
+
+    def __init__(self, window):
+        self.window = window
+        self.slots = [Slot() for _ in range(window)]
+
+    def slot(self, second):
+        slot = self.slots[second % self.window]
+        if slot.second != second:
+            slot.reset(second)
+        return slot
+
+    def snapshot(self, now):
+        # Rates come from the completed seconds only, the current one is still filling up
+        requests = errors = nbytes = 0
+        hist = [0] * NUM_BINS
+        error_kinds = {}
+        for slot in self.slots:
+            if not now - self.window < slot.second <= now:
+                continue
+            if slot.second < now:
+                requests += slot.requests
+                errors += slot.errors
+                nbytes += slot.bytes
+            for i, n in enumerate(slot.hist):
+                if n:
+                    hist[i] += n
+            for kind, n in slot.error_kinds.items():
+                error_kinds[kind] = error_kinds.get(kind, 0) + n
+        span = self.window - 1
+        return {"requests_per_sec": requests / span,
+                "errors_per_sec": errors / span,
+                "mb_per_sec": nbytes / span / 2**20,
+                "percentiles": percentiles(hist),
+                "error_kinds": error_kinds}
+
+
+def percentiles(hist):
+    result = {}
+    total = sum(hist)
+    if not total:
+        return {str(p): None for p in PERCENTILES}
+    targets = [(p, total * p / 100) for p in PERCENTILES]
+    seen = 0
+    for b, n in enumerate(hist):
+        seen += n
+        while targets and seen >= targets[0][1]:
+            result[str(targets.pop(0)[0])] = bin_upper_edge(b)
+        if not targets:
+            break
+    return result
+
+
+class Aggregator:
+
+    def __init__(self, window=60):
+        self.window = window
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        self.total = 0
+        self.bad_lines = 0
+
+    def add_line(self, line, second):
+        """Account one CSV line received during the given second."""
+        fields = line.split(",")
+        try:
+            endpoint = fields[2]
+            size = int(fields[4])
+            duration = float(fields[5])
+        except (IndexError, ValueError):
+            self.bad_lines += 1
+            return
+        stats = self.endpoints.get(endpoint)
+        if stats is None:
+            stats = self.endpoints[endpoint] = WindowStats(self.window)
+        slot = stats.slot(second)
+        slot.requests += 1
+        if size < 0:
+            slot.errors += 1
+            # break errors down by class where the generator sent one, else by message
+            if len(fields) > ERROR_CLASS_FIELD and fields[ERROR_CLASS_FIELD]:
+                kind = fields[ERROR_CLASS_FIELD]
+            else:
+                kind = fields[6].strip()[:80] if len(fields) > 6 else ""
+            kinds = slot.error_kinds
+            if kind not in kinds and len(kinds) >= MAX_ERROR_KINDS:
+                kind = "other"
+            kinds[kind] = kinds.get(kind, 0) + 1
+        else:
+            slot.bytes += size
+            slot.hist[duration_bin(duration)] += 1
+        self.total += 1
+
+    def snapshot(self):
+        now = int(time.time())
+        with self.lock:
+            return {"time": now,
+                    "window": self.window,
+                    "total": self.total,
+                    "bad_lines": self.bad_lines,
+                    "endpoints": {endpoint: stats.snapshot(now) for endpoint, stats in self.endpoints.items()}}
+
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>stressos</title>
+<style>body{font-family:monospace} td,th{padding:2px 10px;text-align:right} td:first-child{text-align:left}</style>
+</head><body>
+<h3>stressos live (last <span id="window"></span>s)</h3>
+<table id="stats"></table>
+<pre id="errors"></pre>
+<script>
+function fmt(x, d) { return x === null || x === undefined ? "-" : x.toFixed(d); }
+function refresh() {
+  fetch("/stats").then(r => r.json()).then(s => {
+    document.getElementById("window").textContent = s.window;
+    let rows = "<tr><th>endpoint</th><th>req/s</th><th>err/s</th><th>MB/s</th><th>p50</th><th>p90</th><th>p99</th></tr>";
+    let errors = "";
+    for (const [ep, e] of Object.entries(s.endpoints)) {
+      rows += "<tr><td>" + ep + "</td><td>" + fmt(e.requests_per_sec, 1) + "</td><td>" + fmt(e.errors_per_sec, 1) +
+              "</td><td>" + fmt(e.mb_per_sec, 2) + "</td><td>" + fmt(e.percentiles["50"], 3) +
+              "</td><td>" + fmt(e.percentiles["90"], 3) + "</td><td>" + fmt(e.percentiles["99"], 3) + "</td></tr>";
+      for (const [kind, n] of Object.entries(e.error_kinds)) errors += ep + "  " + n + "  " + kind + "\\n";
+    }
+    document.getElementById("stats").innerHTML = rows;
+    document.getElementById("errors").textContent = errors;
+  });
+}
+setInterval(refresh, 1000);
+refresh();
+</script></body></html>
+"""
+
+
+def make_handler(aggregator):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/stats":
+                body = json.dumps(aggregator.snapshot()).encode("utf-8")
+                content_type = "application/json"
+            elif self.path == "/":
+                body = PAGE.encode("utf-8")
+                content_type = "text/html"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def receive(aggregator, udp_port, output=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 2**20)
+    sock.bind(("", udp_port))
+    sock.settimeout(0.2)
+    logging.info("Listening for results on UDP port %d", udp_port)
+
+    lock = aggregator.lock
+    add_line = aggregator.add_line
+    while True:
+        try:
+            data = sock.recv(65536)
+        except socket.timeout:
+            continue
+        second = int(time.time())
+        line = data.decode("utf-8", "replace")
+        # Hold the lock per datagram; snapshots only take it once a second
+        with lock:
+            add_line(line, second)
+        if output is not None:
+            output.write(line)
+            output.write("\n")
+
+
+def bench(n):
+    aggregator = Aggregator()
+    lines = ["mkobjects-pod-{},{},{},tgh_stressos,{},{},".format(i % 500, 1.5e9 + i, "s3.echo.stfc.ac.uk" if i % 3 else "cs3.cern.ch", 1024 * (i % 64), 0.001 * (i % 997) + 0.01) for i in range(1000)]
+    lines[::50] = ["mkobjects-pod-1,1.5e9,cs3.cern.ch,tgh_stressos,-1,0.5,HTTP response 503 Slow Down"] * len(lines[::50])
+    add_line = aggregator.add_line
+    start = time.perf_counter()
+    second = int(time.time())
+    for i in range(n):
+        add_line(lines[i % 1000], second + i // 100000)
+    elapsed = time.perf_counter() - start
+    print("{} records in {:.2f}s: {:.0f} records/sec".format(n, elapsed, n / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live stress test dashboard fed from the results UDP stream")
+    parser.add_argument("--udp-port", type=int, default=5050, help="port mkobjects2.py sends results to")
+    parser.add_argument("--http-port", type=int, default=8080, help="port to serve the dashboard on")
+    parser.add_argument("--window", type=int, default=60, help="sliding window in seconds")
+    parser.add_argument("-o", "--output", help="also append every result line to this CSV")
+    parser.add_argument("--bench", type=int, metavar="N", help="time aggregating N synthetic records and exit")
+    args = parser.parse_args()
+    if args.window < 2:
+        # rates are over the window's completed seconds, of which there must be at least one
+        parser.error("--window must be at least 2 seconds")
+
+    if args.bench:
+        bench(args.bench)
+        return
+
+    aggregator = Aggregator(args.window)
+    server = ThreadingHTTPServer(("", args.http_port), make_handler(aggregator))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info("Dashboard on http://localhost:%d/", args.http_port)
+
+    output = open(args.output, "a", buffering=2**20) if args.output else None
+    try:
+        receive(aggregator, args.udp_port, output)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output is not None:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
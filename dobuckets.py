@@ -4,40 +4,20 @@ import boto
 import boto.s3.connection
 from boto.s3.key import Key
 import os
+import sys
+
+import sites
 
 """
 Bucket related unit tests
 """
 
-#access_key = ''
-#secret_key = ''
-#host_base = 'storage.datacentred.io'
-#host_port = 443
-#secure = True
-
-#access_key = ''
-#secret_key = ''
-#host_base = 'cs3.cern.ch'
-#host_port = 443
-#secure = True
-
-#access_key = ''
-#secret_key = ''
-#host_base = 'ceph-s3.mwt2.org'
-#host_port = 80
-#secure = False
-
-#access_key = ''
-#secret_key = ''
-#host_base = 'cephgw.usatlas.bnl.gov'
-#host_port = 8443
-#secure = False
-
-access_key = ''
-secret_key = ''
-host_base = 's3.echo.stfc.ac.uk'
-host_port = 443
-secure = True
+# connection details come from the site registry, e.g. python dobuckets.py ral
+site = sites.get_site(sys.argv[1] if len(sys.argv) > 1 else 'ral')
+access_key, secret_key = sites.CredentialCache().get(site)
+host_base = site.endpoint
+host_port = site.port
+secure = site.secure
 
 conn = boto.connect_s3(
         aws_access_key_id = access_key,
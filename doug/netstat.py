@@ -5,20 +5,32 @@
    http://voorloopnul.com/blog/a-python-netstat-in-less-than-100-lines-of-code/
 
    Modified for use in counting cephs3 stress testing
+
+   Counts connections to the remote object store by TCP state, for IPv4 and IPv6.
+   Rather than splitting and int()-ing every line of /proc/net/tcp, each sample reads
+   /proc/net/tcp and /proc/net/tcp6 in one go and runs a single regex over the raw bytes
+   that only matches lines whose remote address is one of the endpoint's addresses, already
+   written in the kernel's hex form. Only the state of those lines is ever decoded, so the
+   cost on a loader with tens of thousands of sockets stays small at sub-second intervals.
+
+   Every sample is written as a CSV line (epoch timestamp, host, one count per state) with
+   the same clock as the results' timestamp column, so it lines up with the load results.
+   A summary still goes to the log file once a second.
+
+   usage: netstat.py <length of time for test> <remote host> <port> [--interval 0.25]
 '''
 
 
-import pwd
-import os
+import argparse
 import re
-import glob
-import sys
 import logging
 import logging.handlers
 import socket
+import struct
 import time
+from collections import Counter
 
-PROC_TCP = "/proc/net/tcp"
+PROC_TCP = ("/proc/net/tcp", "/proc/net/tcp6")
 STATE = {
         '01':'ESTABLISHED',
         '02':'SYN_SENT',
@@ -32,112 +44,94 @@ STATE = {
         '0A':'LISTEN',
         '0B':'CLOSING'
         }
+STATES = list(STATE.values())
+
+
+def _hex_ipv4(ip):
+    ''' Address as printed in /proc/net/tcp: the 32 bit word in host byte order '''
+    return '%08X' % struct.unpack('=I', socket.inet_aton(ip))
+
+
+def _hex_ipv6(ip):
+    ''' Address as printed in /proc/net/tcp6: four 32 bit words in host byte order '''
+    return ''.join('%08X' % w for w in struct.unpack('=4I', socket.inet_pton(socket.AF_INET6, ip)))
+
+
+def proc_addresses(ip, port):
+    ''' All the ways ip:port can appear as a remote address in /proc/net/tcp{,6} '''
+    port = ':%04X' % int(port)
+    if ':' in ip:
+        return [_hex_ipv6(ip) + port]
+    # IPv4 peers of dual stack sockets show up in tcp6 as ::ffff:a.b.c.d
+    return [_hex_ipv4(ip) + port, _hex_ipv6('::ffff:' + ip) + port]
+
+
+class ConnectionSampler(object):
+    ''' Counts TCP connections by state to a fixed set of remote ip:port '''
+
+    def __init__(self, remotes):
+        patterns = []
+        for ip, port in remotes:
+            patterns.extend(proc_addresses(ip, port))
+        # "<local addr>:<local port> <remote addr>:<remote port> <state> "
+        self._regex = re.compile(br':[0-9A-F]{4} (?:' + b'|'.join(p.encode('ascii') for p in patterns) + br') ([0-9A-F]{2}) ')
+        self._files = []
+        for path in PROC_TCP:
+            try:
+                self._files.append(open(path, 'rb', buffering=0))
+            except IOError:
+                pass
+
+    def sample(self):
+        counts = Counter()
+        for f in self._files:
+            f.seek(0)
+            counts.update(self._regex.findall(f.read()))
+        result = dict.fromkeys(STATES, 0)
+        for code, n in counts.items():
+            state = STATE.get(code.decode('ascii'))
+            if state:
+                result[state] += n
+        return result
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+
+def resolve(remotehost, remoteport):
+    ''' Every IPv4 and IPv6 address of the endpoint '''
+    hosts = []
+    for socket_host in socket.getaddrinfo(remotehost, remoteport, 0, socket.SOCK_STREAM):
+        ip = socket_host[4][0]
+        if ip not in hosts:
+            hosts.append(ip)
+    return [(ip, remoteport) for ip in hosts]
+
+
+def _summary(remote_host_shortname, result):
+    message = "Ncon to %s " %(remote_host_shortname)
+    for state in STATES:
+        message = message + "(%s)= %d " %(state,result[state])
+    return message
 
-def _load():
-    ''' Read the table of tcp connections & remove header  '''
-    with open(PROC_TCP,'r') as f:
-        content = f.readlines()
-        content.pop(0)
-    return content
-
-def _hex2dec(s):
-    return str(int(s,16))
-
-def _ip(s):
-    ip = [(_hex2dec(s[6:8])),(_hex2dec(s[4:6])),(_hex2dec(s[2:4])),(_hex2dec(s[0:2]))]
-    return '.'.join(ip)
-
-def _remove_empty(array):
-    return [x for x in array if x !='']
-
-def _convert_ip_port(array):
-    host,port = array.split(':')
-    return _ip(host),_hex2dec(port)
-
-def netstat(hostslist):
-    '''
-    Function to return a list with status of tcp connections at linux systems
-    To get pid of all network process running on system, you must run this script
-    as superuser
-    '''
-    global logger
-
-    logger.debug("hostslist %s " %(hostslist))
-    content=_load()
-    result = {}
-    # initialize totals 
-    for state in STATE.values():
-        logger.debug("state %s " %(state))
-        result[state] = 0
-
-    for line in content:
-        line_array = _remove_empty(line.split(' '))     # Split lines and remove empty spaces.
-        l_host,l_port = _convert_ip_port(line_array[1]) # Convert ipaddress and port from hex to decimal.
-        r_host,r_port = _convert_ip_port(line_array[2]) 
-        r_host_port = r_host + ":" + r_port
-        # test if this connection is to remote host and port
-        logger.debug("remote host:remote port %s " %(r_host_port))
-        if r_host_port in hostslist :
-            tcp_id = line_array[0]
-            state = STATE[line_array[3]]
-            
-            #uid = pwd.getpwuid(int(line_array[7]))[0]       # Get user from UID.
-            #inode = line_array[9]                           # Need the inode to get process pid.
-            #pid = _get_pid_of_inode(inode)                  # Get pid prom inode.
-            #try:                                            # try read the process name.
-            #    exe = os.readlink('/proc/'+pid+'/exe')
-            #except:
-            #    exe = None
-
-            #nline = [tcp_id, uid, l_host+':'+l_port, r_host+':'+r_port, state, pid, exe]
-            result[state] += 1
-    return result
-
-def _get_pid_of_inode(inode):
-    '''
-    To retrieve the process pid, check every running process and look for one using
-    the given inode.
-    '''
-    for item in glob.glob('/proc/[0-9]*/fd/[0-9]*'):
-        try:
-            if re.search(inode,os.readlink(item)):
-                return item.split('/')[2]
-        except:
-            pass
-    return None
 
 if __name__ == '__main__':
-    # input parameters  1) length of time for test  2) remote host to check
-    # test the number of arguements passed to the program if less than 3 quit                                                                                                            
-    if len(sys.argv) < 3 :
-        message = "Error too few arguements passed - %s < length of time for test> <remote host> <port>" %(sys.argv[0])
-        logger.info(message)
-        try:
-            raise Exception()
-        except:
-            eprint(message)
-            sys.exit(3)
-
-    lengthoftest = int(sys.argv[1])
-    remotehost = sys.argv[2]
-    remoteport = sys.argv[3]
+    parser = argparse.ArgumentParser(description='Sample TCP connection states to an object store endpoint')
+    parser.add_argument('lengthoftest', type=int, help='length of time for test in seconds')
+    parser.add_argument('remotehost', help='remote host')
+    parser.add_argument('remoteport', type=int, help='remote port')
+    parser.add_argument('--interval', type=float, default=0.25, help='seconds between samples')
+    parser.add_argument('--csv', help='timeseries output (default multiprocessing_cephs3_tcp_connections_<submit>_<remote>.csv)')
+    args = parser.parse_args()
+
+    lengthoftest = args.lengthoftest
+    remotehost = args.remotehost
+    remoteport = args.remoteport
 
     # sort out host names
     remote_host_shortname = remotehost.split(".")[0]
-
-    balance_hosts = {}
-    hosts = []
-    hostslist = []
-    socket_hosts = socket.getaddrinfo(remotehost, remoteport)
-
-    for socket_host in socket_hosts:
-        if socket_host[4][0] not in hosts and not ':' in socket_host[4][0]:
-            hosts.append(socket_host[4][0])
-    if hosts:
-        balance_hosts[remotehost] = hosts
-
-    for host in balance_hosts[remotehost]:
-        hostslist.append("%s:%s" %(host,remoteport))
+    remotes = resolve(remotehost, remoteport)
 
     submit_host = socket.gethostname()
     submit_host = submit_host.split(".")[0]
@@ -145,9 +139,10 @@ if __name__ == '__main__':
 
     # setup for logging
     LOG_FILENAME='multiprocessing_cephs3_tcp_connections_%s_%s.log' %(submit_host,remote_host_shortname)
+    CSV_FILENAME = args.csv or 'multiprocessing_cephs3_tcp_connections_%s_%s.csv' %(submit_host,remote_host_shortname)
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.INFO)
-    # Add the log message handler to the logger                                                                                                                                          
+    # Add the log message handler to the logger
     handler = logging.handlers.RotatingFileHandler(LOG_FILENAME,
                                                    maxBytes=0,
                                                    backupCount=10,
@@ -158,25 +153,34 @@ if __name__ == '__main__':
     logger.addHandler(handler)
 
 
-    logger.info("./netstat.py %d %s" %( lengthoftest, remotehost))
-    logger.debug("hostslist - %s" %(hostslist))
+    logger.info("./netstat.py %d %s %d interval %.3f" %( lengthoftest, remotehost, remoteport, args.interval))
+    logger.info("remotes - %s" %(remotes))
+
+    sampler = ConnectionSampler(remotes)
 
     time_start = time.time()
     time_end = time.time() + lengthoftest
-
-    # start timer loop checking every second (sleep 1 seconds between checks)
-    while (time.time() < time_end):
-        # loop over the possible states
-        result = netstat(hostslist)
-        message = "Ncon to %s " %(remote_host_shortname)
-        for state in STATE.values():
-            message = message + "(%s)= %d " %(state,result[state])
-        logger.info(" %s " %(message))
-        time.sleep(1)
-
-    message = "Ncon to %s " %(remote_host_shortname)
-    for state in STATE.values():
-        message = message + "(%s)= %d " %(state,result[state])
-    logger.info(" %s " %(message))
-
-
+    next_log = time_start
+    result = dict.fromkeys(STATES, 0)
+
+    with open(CSV_FILENAME, 'w') as csv_file:
+        csv_file.write(','.join(['timestamp', 'remote_host'] + STATES) + '\n')
+        # sample on a fixed schedule so the timeseries has even spacing
+        next_sample = time.time()
+        while (time.time() < time_end):
+            now = time.time()
+            result = sampler.sample()
+            csv_file.write('%.3f,%s,%s\n' % (now, remotehost, ','.join(str(result[state]) for state in STATES)))
+            if now >= next_log:
+                logger.info(" %s " %(_summary(remote_host_shortname, result)))
+                csv_file.flush()
+                next_log = now + 1
+            next_sample += args.interval
+            delay = next_sample - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_sample = time.time()
+
+    sampler.close()
+    logger.info(" %s " %(_summary(remote_host_shortname, result)))
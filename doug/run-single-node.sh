@@ -37,6 +37,7 @@ wait $netstat_pip
 
 
 mv -v multiprocessing_cephs3_tcp_connections_*.log logs/objectstore-netstat_${remote_node_short}_${clusterid}_${processid}.log
+mv -v multiprocessing_cephs3_tcp_connections_*.csv logs/objectstore-netstat_${remote_node_short}_${clusterid}_${processid}.csv
 mv -v /dev/shm/multiprocessing_cephs3_test_${hostname_short}_${remote_node_short}.log logs/objectstore-${remote_node_short}_${clusterid}_${processid}.log && \
 rm -v /dev/shm/multiprocessing_cephs3_test_${hostname_short}_${remote_node_short}.log.?
 
@@ -1,51 +1,34 @@
 #!/usr/bin/env python3
-import os
-import requests
-import urllib
-import urllib3
+import argparse
+
+import sites
 
 """
 Retrieve object store keys from panda server
-"""
 
-def getSSLCertificate():
-    """ Return the path to the SSL certificate """ 
+Keys are cached (see sites.py), so the server is only asked again once they are
+older than a day or with --refresh:
+
+    python getkeys.py lancs
+    python getkeys.py --key AGLT2_ObjectStoreKey
+"""
 
-    if 'X509_USER_PROXY' in os.environ:
-        sslCertificate = os.environ['X509_USER_PROXY']
+def main():
+    parser = argparse.ArgumentParser(description="Print a site's object store keys from the PanDA server")
+    parser.add_argument("site", nargs="?", help="site in the registry")
+    parser.add_argument("--key", help="PanDA key name instead of a site's, e.g. LANCS_ObjectStoreKey")
+    parser.add_argument("--refresh", action="store_true", help="ask the server even if cached")
+    args = parser.parse_args()
+
+    if args.key:
+        key_name = args.key
+    elif args.site:
+        key_name = sites.get_site(args.site).panda_key
     else:
-        sslCertificate  = '/tmp/x509up_u%s' % str(os.getuid())
-
-    return sslCertificate
-
-def getKeys(node):
-    urllib3.disable_warnings()
-    r = requests.post('https://%s%s' % (host, path),
-                                  verify=False,
-                                  cert=(sslCert, sslKey),
-                                  data=urllib.parse.urlencode(node),
-                                  timeout=60)
-    if r and r.status_code == 200:
-        print(r.text)
-
-
-sslCert = getSSLCertificate()
-sslKey = sslCert
-host = 'pandaserver.cern.ch:25443'
-path = '/server/panda/getKeyPair'
-
-node={}
-node['privateKeyName'] = 'LANCS_ObjectStoreKey'
-node['publicKeyName'] = 'LANCS_ObjectStoreKey.pub'
-#node['privateKeyName'] = 'BNL_ObjectStoreKey'
-#node['publicKeyName'] = 'BNL_ObjectStoreKey.pub'
-#node['privateKeyName'] = 'RAL_ObjectStoreKey'
-#node['publicKeyName'] = 'RAL_ObjectStoreKey.pub'
-#node['privateKeyName'] = 'CERN_ObjectStoreKey'
-#node['publicKeyName'] = 'CERN_ObjectStoreKey.pub'
-#node['privateKeyName'] = 'MWT2_ObjectStoreKey'
-#node['publicKeyName'] = 'MWT2_ObjectStoreKey.pub'
-node['privateKeyName'] = 'AGLT2_ObjectStoreKey'
-node['publicKeyName'] = 'AGLT2_ObjectStoreKey.pub'
-
-getKeys(node)
+        parser.error("give a site or --key")
+    access_key, secret_key = sites.CredentialCache().panda(key_name, refresh=args.refresh)
+    print("publicKey={}&privateKey={}".format(access_key, secret_key))
+
+
+if __name__ == "__main__":
+    main()
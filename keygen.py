@@ -0,0 +1,139 @@
+"""
+Reproducible object key names for the load generators.
+
+Key names used to come from uuid4(), random.choice() per character or an MD5 of a longer
+name: each costs a syscall or a hash per object, and none can be regenerated, so a GET or
+DELETE phase had to list the bucket to find what a PUT phase wrote.
+
+KeyGenerator(seed) names key number i by running seed + i through the splitmix64
+finaliser, a bijection on 64 bit integers: every index gets a different 16 hex digit
+name and the same seed always gives the same names. With fanout=N each name also gets
+one of N hex prefixes ("3f/0123456789abcdef"), taken from the hash, to spread keys over
+index shards or gateways that partition by prefix.
+
+Writer threads that can't coordinate draw indices from a KeyStream: its 53 bit indices
+are a 33 bit stream id hashed from the writer's identity (hostname and thread) and a 20
+bit counter, moving on to a new stream id when the counter runs out. 53 bits fit exactly
+in the float64 key_index result column, so a later phase can regenerate the names of
+every successful PUT from the results file:
+
+    python keygen.py names --seed 0 --fanout 16 data_2018_09_10_15_50_12.sres
+    python keygen.py --bench
+"""
+
+import argparse
+import hashlib
+import time
+import uuid
+
+MASK64 = (1 << 64) - 1
+COUNTER_BITS = 20
+STREAM_BITS = 33
+
+
+def mix64(x):
+    """splitmix64: a well mixed 64 bit hash of x, and a bijection."""
+    z = (x + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def _hash_text(text):
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class KeyGenerator:
+
+    def __init__(self, seed=0, fanout=0):
+        """seed is an int or any string; a string of digits is taken as that int."""
+        if isinstance(seed, str) and seed.isdigit():
+            seed = int(seed)
+        self.seed = seed
+        self.fanout = fanout
+        self._base = mix64(seed if isinstance(seed, int) else _hash_text(str(seed)))
+        if fanout > 1:
+            width = len("{:x}".format(fanout - 1))
+            self._format = "{:0%dx}/{:016x}" % width
+        else:
+            self._format = None
+
+    def name(self, index):
+        h = mix64((self._base + index) & MASK64)
+        if self._format is None:
+            return "{:016x}".format(h)
+        return self._format.format((h >> 32) % self.fanout, h)
+
+    def names(self, indices):
+        return [self.name(int(index)) for index in indices]
+
+    def stream(self, *identity):
+        return KeyStream(self, identity)
+
+
+class KeyStream:
+    """Indices and names for one writer; not shared between threads."""
+
+    def __init__(self, generator, identity):
+        self.generator = generator
+        self.identity = ":".join(str(part) for part in identity)
+        self._epoch = 0
+        self._new_stream()
+
+    def _new_stream(self):
+        stream = _hash_text("{}#{}".format(self.identity, self._epoch)) >> (64 - STREAM_BITS)
+        self._next = stream << COUNTER_BITS
+        self._end = self._next + (1 << COUNTER_BITS)
+        self._epoch += 1
+
+    def next(self):
+        """(index, name) of the next key."""
+        if self._next == self._end:
+            self._new_stream()
+        index = self._next
+        self._next += 1
+        return index, self.generator.name(index)
+
+
+def bench(n):
+    start = time.perf_counter()
+    for _ in range(n):
+        uuid.uuid4().hex
+    before = n / (time.perf_counter() - start)
+    keys = KeyGenerator(0, fanout=16).stream("bench", 0)
+    start = time.perf_counter()
+    for _ in range(n):
+        keys.next()
+    after = n / (time.perf_counter() - start)
+    print("uuid4().hex:  {:9.0f} keys/sec".format(before))
+    print("KeyStream:    {:9.0f} keys/sec ({:.2f}x)".format(after, after / before))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate or benchmark object key names")
+    parser.add_argument("--bench", action="store_true", help="compare with uuid4().hex")
+    subparsers = parser.add_subparsers(dest="command")
+    names_parser = subparsers.add_parser("names", help="print the keys of the successful requests in a results file")
+    names_parser.add_argument("results_file")
+    names_parser.add_argument("--seed", default="0")
+    names_parser.add_argument("--fanout", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(500000)
+    elif args.command == "names":
+        from resultsfile import load_results
+
+        results = load_results(args.results_file)
+        if "key_index" not in results:
+            parser.error("{} has no key_index column".format(args.results_file))
+        written = results[(results["size"] >= 0) & results["key_index"].notna()]["key_index"]
+        generator = KeyGenerator(args.seed, args.fanout)
+        for index in written.unique():
+            print(generator.name(int(index)))
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Logging for the load generators' request loops.
+
+Writing a log line to a terminal or file takes longer than building it, and it holds the
+handler's lock while it does, so worker threads end up queueing on each other to log. start()
+puts a logger's handlers behind a queue: the worker threads only append the unformatted
+record and a background thread formats and writes it. Records keep their args, so a line
+that is never written is never formatted either. The queue holds at most MAX_QUEUED
+records: if the writer falls that far behind, further records are dropped and counted
+(dropped(), logged by report()) rather than piling up in memory or making the workers wait.
+
+RequestLog is for the one-line-per-request messages. Its info() and debug() let through
+only every Nth call and skip the rest before any record is made. Warnings and errors always
+get through.
+"""
+
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+import time
+
+MAX_QUEUED = 10000
+
+_handlers = []
+# (time of the next report, dropped() at the last one) for report()
+_report_state = [None, 0]
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread and drops records when full."""
+
+    def __init__(self, records):
+        logging.handlers.QueueHandler.__init__(self, records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(logging.handlers.QueueListener):
+
+    def enqueue_sentinel(self):
+        # wait for room rather than fail at exit when the queue is full
+        self.queue.put(self._sentinel)
+
+    def stop(self):
+        # both the caller and atexit may stop it
+        if self._thread is not None:
+            logging.handlers.QueueListener.stop(self)
+
+
+def dropped():
+    """Records dropped so far because the queue was full."""
+    return sum(handler.dropped for handler in _handlers)
+
+
+def report(logger=None, interval=60):
+    """
+    Log how many records were dropped, at most once per interval seconds and only when
+    more were. Cheap to call after every request.
+    """
+    now = time.monotonic()
+    next_report, reported = _report_state
+    if next_report is None:
+        _report_state[0] = now + interval
+        return
+    if now < next_report:
+        return
+    _report_state[0] = now + interval
+    count = dropped()
+    if count > reported:
+        _report_state[1] = count
+        (logger or logging.getLogger()).warning("Log: %d records dropped so far, the log queue was full", count)
+
+
+def start(logger=None):
+    """
+    Move logger's (default root) handlers onto a background thread, which is stopped and
+    flushed at exit. Call it after configuring the handlers, in the process that logs.
+
+    Returns the listener. multiprocessing children exit without running atexit, so they
+    have to call its stop() themselves or lose whatever is still queued.
+    """
+    logger = logger or logging.getLogger()
+    handlers = logger.handlers[:]
+    records = queue.Queue(MAX_QUEUED)
+    listener = _Listener(records, *handlers, respect_handler_level=True)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    queue_handler = _DeferredQueueHandler(records)
+    _handlers.append(queue_handler)
+    logger.addHandler(queue_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+class RequestLog:
+    """Logs every Nth info/debug call to logger, everything at warning and above."""
+
+    def __init__(self, logger=None, every=1):
+        self.logger = logger or logging.getLogger()
+        self.every = every
+        self._calls = itertools.count()
+
+    def _sampled(self):
+        return self.every > 0 and next(self._calls) % self.every == 0
+
+    def debug(self, msg, *args):
+        if self.logger.isEnabledFor(logging.DEBUG) and self._sampled():
+            self.logger.debug(msg, *args)
+
+    def info(self, msg, *args):
+        if self.logger.isEnabledFor(logging.INFO) and self._sampled():
+            self.logger.info(msg, *args)
+
+    def warning(self, msg, *args):
+        self.logger.warning(msg, *args)
+
+    def error(self, msg, *args):
+        self.logger.error(msg, *args)
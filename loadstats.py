@@ -0,0 +1,163 @@
+"""
+Client-side load accounting for the load generators.
+
+When NUM_THREADS is more than the pod's CPU limit can serve, request durations include
+time spent waiting for the GIL and for the CPU, which the analysis would otherwise blame
+on the object store. Every result record therefore carries:
+
+    in_flight  requests in progress in this process when the request started (itself included)
+    loop_lag   worst scheduling delay seen by a 10ms ticker thread around the request: how
+               late a runnable thread gets to run, i.e. GIL plus CPU contention
+    throttled  seconds the pod's cgroup was CPU throttled while the request was in flight,
+               from cpu.stat (cgroup v2 throttled_usec, or v1 throttled_time)
+
+process_data.py uses these to flag or drop intervals where the client was the bottleneck.
+
+OpsMeter counts completed requests per connection and reports ops/sec per connection and
+per core of client CPU used, which shows whether a small-object run was limited by the
+object store or by the client.
+"""
+
+import logging
+import threading
+import time
+
+CGROUP_CPU_STAT = [
+    ("/sys/fs/cgroup/cpu.stat", "throttled_usec", 1e-6),                   # cgroup v2
+    ("/sys/fs/cgroup/cpu,cpuacct/cpu.stat", "throttled_time", 1e-9),       # cgroup v1
+    ("/sys/fs/cgroup/cpu/cpu.stat", "throttled_time", 1e-9),
+]
+
+
+class InFlight:
+    """Count of requests currently being made, and the peak seen."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.peak = 0
+
+    def enter(self):
+        with self._lock:
+            self.count += 1
+            if self.count > self.peak:
+                self.peak = self.count
+            return self.count
+
+    def exit(self):
+        with self._lock:
+            self.count -= 1
+
+
+class OpsMeter:
+    """
+    Completed requests per connection. Each connection's thread only counts its own slot,
+    so counting takes no lock.
+    """
+
+    def __init__(self, connections):
+        self.counts = [0] * connections
+        self._lock = threading.Lock()
+        self._last = None
+        self._next_report = None
+
+    def add(self, connection, n=1):
+        self.counts[connection] += n
+
+    def _sample(self):
+        return time.monotonic(), time.process_time(), list(self.counts)
+
+    @staticmethod
+    def rates(before, after):
+        """(ops/sec, min and max ops/sec of one connection, cores busy, ops per core second) between two samples."""
+        wall = after[0] - before[0]
+        busy = (after[1] - before[1]) / wall if wall > 0 else 0.0
+        rates = [(c - c0) / wall for c, c0 in zip(after[2], before[2])] if wall > 0 else [0.0]
+        total = sum(rates)
+        return total, min(rates), max(rates), busy, total / busy if busy > 0 else 0.0
+
+    def report(self, logger=None, interval=60):
+        """Log the rates over the last interval seconds; cheap to call after every request."""
+        now = time.monotonic()
+        if self._next_report is not None and now < self._next_report:
+            return
+        with self._lock:
+            if self._next_report is None:
+                self._last = self._sample()
+                self._next_report = now + interval
+                return
+            if now < self._next_report:
+                return
+            self._next_report = now + interval
+            current = self._sample()
+            last, self._last = self._last, current
+        total, low, high, busy, per_core = self.rates(last, current)
+        (logger or logging.getLogger()).info(
+            "Ops: %.0f/s over %d connections (%.0f-%.0f/s each), %.2f client cores busy, %.0f/s per core",
+            total, len(self.counts), low, high, busy, per_core)
+
+
+def _find_cpu_stat():
+    for path, field, scale in CGROUP_CPU_STAT:
+        try:
+            with open(path) as f:
+                if any(line.split()[0] == field for line in f if line.strip()):
+                    return path, field, scale
+        except (IOError, OSError):
+            continue
+    return None
+
+
+class LagMonitor(threading.Thread):
+    """
+    Daemon thread that wakes every interval seconds. How late each wake-up is measures
+    scheduling lag; it also samples the cgroup's cumulative throttled time.
+    """
+
+    def __init__(self, interval=0.01, window=1.0):
+        threading.Thread.__init__(self, name="lag-monitor", daemon=True)
+        self.interval = interval
+        self.window = window
+        self._cpu_stat = _find_cpu_stat()
+        # max lag in the current and the previous window
+        self._lag = 0.0
+        self._previous_lag = 0.0
+        self.throttled = self._read_throttled()
+
+    def _read_throttled(self):
+        """Cumulative seconds throttled, 0 when there is no cgroup CPU limit to read."""
+        if self._cpu_stat is None:
+            return 0.0
+        path, field, scale = self._cpu_stat
+        try:
+            with open(path) as f:
+                for line in f:
+                    name, _, value = line.partition(" ")
+                    if name == field:
+                        return int(value) * scale
+        except (IOError, OSError, ValueError):
+            pass
+        return self.throttled
+
+    @property
+    def lag(self):
+        return max(self._lag, self._previous_lag)
+
+    def run(self):
+        window_end = time.monotonic() + self.window
+        next_stat = 0
+        while True:
+            before = time.monotonic()
+            time.sleep(self.interval)
+            now = time.monotonic()
+            lag = now - before - self.interval
+            if now >= window_end:
+                self._previous_lag = self._lag
+                self._lag = 0.0
+                window_end = now + self.window
+            if lag > self._lag:
+                self._lag = lag
+            next_stat += 1
+            if next_stat == 10:
+                self.throttled = self._read_throttled()
+                next_stat = 0
@@ -0,0 +1,120 @@
+"""
+Memory budget for the load generators' request buffers, with backpressure.
+
+Under the deployment's memory limit, enough threads with large objects can OOM a pod:
+boto copies every PUT body and GET bodies are read whole, so a process holds about
+threads x object size at once, on top of the shared payload buffer (payload.py).
+
+MemoryBudget caps that. A request takes its bytes from the budget before it starts and
+gives them back when it ends; when the budget is used up, new requests wait for running
+ones to finish instead of allocating. Growing the payload buffer takes its bytes for good.
+A request bigger than the whole budget still runs once nothing else holds any, so
+nothing waits forever.
+
+The default budget ("auto") is half the cgroup memory limit, leaving the rest for the
+interpreter, sockets and TLS buffers; with no limit it is unlimited. report() logs the
+peak RSS alongside what the budget saw.
+"""
+
+import logging
+import resource
+import threading
+import time
+
+from ratelimit import parse_rate
+
+CGROUP_MEMORY_LIMIT = [
+    "/sys/fs/cgroup/memory.max",                     # cgroup v2
+    "/sys/fs/cgroup/memory/memory.limit_in_bytes",   # cgroup v1
+]
+AUTO_FRACTION = 0.5
+
+
+def cgroup_memory_limit():
+    """The container's memory limit in bytes, or None if it has none."""
+    for path in CGROUP_MEMORY_LIMIT:
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except (IOError, OSError):
+            continue
+        # v1 reports "no limit" as a huge number rather than "max"
+        if value == "max" or int(value) >= 2**60:
+            return None
+        return int(value)
+    return None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes (ru_maxrss is in KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def parse_budget(text):
+    """Budget in bytes from "auto", "none" or a size such as "512Mi" or "2G"; None for unlimited."""
+    if text in ("none", "0"):
+        return None
+    if text == "auto":
+        limit = cgroup_memory_limit()
+        return int(limit * AUTO_FRACTION) if limit else None
+    return int(parse_rate(text))
+
+
+class MemoryBudget:
+    """limit bytes shared by all threads in the process; None for no limit."""
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.held = 0
+        self.peak_held = 0
+        self.waits = 0
+        self.waited = 0.0
+        self._permanent = 0
+        self._condition = threading.Condition()
+        self._next_report = None
+
+    def __bool__(self):
+        return self.limit is not None
+
+    def acquire(self, n):
+        """Wait until n more bytes fit in the budget and take them."""
+        if n <= 0:
+            return
+        with self._condition:
+            if self.limit is not None and self.held + n > self.limit and self.held > self._permanent:
+                self.waits += 1
+                start = time.monotonic()
+                while self.held + n > self.limit and self.held > self._permanent:
+                    self._condition.wait()
+                self.waited += time.monotonic() - start
+            self.held += n
+            self.peak_held = max(self.peak_held, self.held)
+
+    def release(self, n):
+        if n <= 0:
+            return
+        with self._condition:
+            self.held -= n
+            self._condition.notify_all()
+
+    def grow(self, n):
+        """Take n bytes for good, e.g. for a buffer that is never freed."""
+        self.acquire(n)
+        with self._condition:
+            self._permanent += n
+
+    def summary(self):
+        return "peak RSS {:.0f} MB, budget {}, peak held {:.0f} MB, {} waits ({:.1f}s)".format(
+            peak_rss() / 1e6, "{:.0f} MB".format(self.limit / 1e6) if self.limit else "unlimited",
+            self.peak_held / 1e6, self.waits, self.waited)
+
+    def report(self, logger=None, interval=60):
+        """Log summary() at most once per interval seconds; cheap to call every request."""
+        now = time.monotonic()
+        if self._next_report is None:
+            self._next_report = now + interval
+            return
+        if now < self._next_report:
+            return
+        self._next_report = now + interval
+        (logger or logging.getLogger()).info("Memory: %s", self.summary())
@@ -1,19 +1,187 @@
-import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
 """
-Make a histogram using csv input
+Summarise results files in one streaming pass.
+
+    python mkhisto.py data_2018_09_10_15_50_12.sres [more files ...]
+    python mkhisto.py out.csv --plot durations.png
+
+Reads CSV (any layout resultsfile.py knows) or binary results files a chunk of rows at a
+time, so memory stays bounded whatever the file size, and prints the request count, the
+throughput, mean and p50/p90/p99/p99.9 latency of successful requests, errors by class
+and bytes/sec per client host. Several files are summarised together.
+
+Percentiles come from a LatencySketch (sketch.py), within 1% of the exact values. Binary
+files only need NumPy, CSVs also pandas (for its chunked C parser), and matplotlib is only
+imported for --plot, which draws the duration histogram straight from the sketch.
 """
 
-from pandas import *
-from pandas.io.parsers import read_csv
+import argparse
+import collections
+import math
+import os.path as op
+import sys
+import time
+
+import numpy as np
+
+from resultsfile import STRING_COLUMNS, ResultsFile, csv_columns, is_results_file
+from s3errors import classify_message
+from sketch import LatencySketch
+
+CHUNK_ROWS = 262144
+FIELDS = ["hostname", "timestamp", "size", "duration", "error", "error_class"]
+QUANTILES = [0.5, 0.9, 0.99, 0.999]
+
+
+def binary_chunks(path, chunk_rows):
+    """Chunks of a binary results file as dicts of FIELDS arrays, strings decoded."""
+    with ResultsFile(path) as res:
+        dictionaries = {name: np.asarray(res.dictionary(name), dtype=object)
+                        for name in FIELDS if name in res and res.dictionary(name) is not None}
+        for lo in range(0, len(res), chunk_rows):
+            chunk = {}
+            for name in FIELDS:
+                if name in res:
+                    values = res[name][lo:lo+chunk_rows]
+                    chunk[name] = dictionaries[name][values] if name in dictionaries else values
+            yield chunk
+
+
+def csv_chunks(path, chunk_rows):
+    """Chunks of a results CSV as dicts of FIELDS arrays, without loading the whole file."""
+    # pandas' C parser is the fast way through a big CSV; binary files never need it
+    import pandas as pd
+
+    with open(path) as f:
+        first = f.readline()
+    fields = first.rstrip("\r\n").split(",")
+    names = csv_columns(len(fields))
+    if names is None:
+        raise ValueError("Don't know the layout of {} ({} columns)".format(path, len(fields)))
+    try:
+        float(fields[1] if len(fields) >= 7 else fields[0])
+        header = None
+    except (ValueError, IndexError):
+        header = 0
+    usecols = [name for name in FIELDS if name in names]
+    dtype = {name: object for name in usecols if name in STRING_COLUMNS}
+    reader = pd.read_csv(path, index_col=False, header=header, names=names, usecols=usecols, dtype=dtype,
+                         keep_default_na=False, chunksize=chunk_rows)
+    for frame in reader:
+        yield {name: frame[name].to_numpy(dtype=object if name in STRING_COLUMNS else np.float64) for name in usecols}
+
+
+class Summary:
+    """Running totals over any number of chunks."""
+
+    def __init__(self):
+        self.sketch = LatencySketch()
+        self.requests = 0
+        self.failed = 0
+        self.bytes = 0
+        self.first = math.inf
+        self.last = -math.inf
+        self.errors = collections.Counter()
+        # host -> [bytes, successes, first start, last end]
+        self.hosts = {}
+        self._classes = {}
+
+    def _classify(self, message):
+        if message not in self._classes:
+            self._classes[message] = classify_message(str(message)).value
+        return self._classes[message]
+
+    def add(self, chunk, default_host):
+        timestamps = chunk["timestamp"]
+        if not len(timestamps):
+            return
+        sizes = chunk["size"]
+        durations = chunk["duration"]
+        ok = sizes >= 0
+        ends = timestamps + durations
+        self.requests += len(timestamps)
+        self.failed += int(len(timestamps) - ok.sum())
+        self.bytes += int(sizes[ok].sum())
+        self.first = min(self.first, float(timestamps.min()))
+        self.last = max(self.last, float(ends.max()))
+        self.sketch.add_many(durations[ok])
+
+        if not ok.all():
+            classes = chunk["error_class"][~ok] if "error_class" in chunk else np.full((~ok).sum(), "", dtype=object)
+            messages = chunk["error"][~ok] if "error" in chunk else classes
+            for error_class, message in zip(classes, messages):
+                self.errors[error_class or self._classify(message)] += 1
+
+        hosts = chunk.get("hostname")
+        if hosts is None:
+            hosts = np.full(len(timestamps), default_host, dtype=object)
+        names, inverse = np.unique(hosts.astype(str), return_inverse=True)
+        host_bytes = np.bincount(inverse, weights=np.where(ok, sizes, 0), minlength=len(names))
+        host_ok = np.bincount(inverse, weights=ok, minlength=len(names))
+        for i, name in enumerate(names):
+            mask = inverse == i
+            totals = self.hosts.setdefault(name, [0, 0, math.inf, -math.inf])
+            totals[0] += host_bytes[i]
+            totals[1] += host_ok[i]
+            totals[2] = min(totals[2], float(timestamps[mask].min()))
+            totals[3] = max(totals[3], float(ends[mask].max()))
+
+    def report(self):
+        span = self.last - self.first
+        ok = self.requests - self.failed
+        print("requests:   {} ({} failed, {:.2f}%)".format(self.requests, self.failed, 100.0 * self.failed / self.requests))
+        print("span:       {:.1f}s".format(span))
+        if span > 0:
+            print("throughput: {:.1f} ok/s, {:.2f} MB/s".format(ok / span, self.bytes / span / 1e6))
+        print("latency:    mean {:.1f} ms, {} (within {:g}%)".format(
+            1000 * self.sketch.mean,
+            ", ".join("p{:g} {:.1f}".format(100 * q, 1000 * self.sketch.quantile(q)) for q in QUANTILES),
+            100 * self.sketch.alpha))
+        if self.errors:
+            print("errors by class:")
+            for error_class, n in self.errors.most_common():
+                print("  {:12} {:9d}".format(error_class, n))
+        print("per host:")
+        for name in sorted(self.hosts):
+            host_bytes, host_ok, first, last = self.hosts[name]
+            host_span = last - first
+            if host_span > 0:
+                print("  {:32} {:9.2f} MB/s {:9.1f} ok/s".format(name, host_bytes / host_span / 1e6, host_ok / host_span))
+
+
+def plot(sketch, path):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    lower, upper, counts = sketch.histogram()
+    plt.figure()
+    plt.bar(lower, counts, width=np.subtract(upper, lower), align="edge")
+    plt.xscale("log")
+    plt.xlabel("Duration (s)")
+    plt.ylabel("Successful requests")
+    plt.savefig(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming summary of results files")
+    parser.add_argument("results_files", nargs="*", default=["out.csv"], help="CSV or binary results files")
+    parser.add_argument("--plot", metavar="PNG", help="also draw the duration histogram here")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows read at a time")
+    args = parser.parse_args()
 
-path='out.csv'
-fec = read_csv(path, index_col=False)
-print(fec.describe())
+    start = time.perf_counter()
+    summary = Summary()
+    for path in args.results_files:
+        chunks = binary_chunks if is_results_file(path) else csv_chunks
+        for chunk in chunks(path, args.chunk_rows):
+            summary.add(chunk, op.basename(path))
+    if not summary.requests:
+        sys.exit("No results in {}".format(", ".join(args.results_files)))
+    summary.report()
+    print("({} rows in {:.1f}s)".format(summary.requests, time.perf_counter() - start))
+    if args.plot:
+        plot(summary.sketch, args.plot)
 
-distro = 'sizedistro.png'
 
-plt.figure();
-fec.plot.hist()
+if __name__ == "__main__":
+    main()
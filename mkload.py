@@ -7,13 +7,23 @@ import datetime
 import multiprocessing
 import logging
 import logging.handlers
+import os
 import sys
-import hashlib
 
 import boto
 from boto.s3.connection import S3Connection
 from boto.s3.key import Key
 
+import loadlog
+import s3http
+import sites
+from payload import FilePayload
+from keygen import KeyGenerator
+from membudget import peak_rss
+from profiler import SamplingProfiler
+from ratelimit import RateLimiter, parse_rate
+from s3errors import ErrorCounters, RetryPolicy, classify
+
 from queue import Queue
 from threading import Thread
 
@@ -57,17 +67,17 @@ class ThreadPool:
         """Wait for completion of all the tasks in the queue"""
         self.tasks.join()
 
-#function to connect and write to Ceph OS
+#function to connect and write to Ceph OS, returns None or the ErrorClass of the failure
 def write_thread(conn, bucket, dest_host, src_file, keyname):
     global time_end    
     global logger
 
-    ret_code = True
+    ret_code = None
 
     try:
         try:
             key = Key(bucket)
-            key.key = '%s_%s' %(hashlib.md5(keyname.encode('utf-8')).hexdigest()[0:15],keyname)
+            key.key = keyname
 #rucio?            key.md5 = "ea7a25c839be547c6bd964e015671453"
 #rucio?            key.set_metadata("md5", "ea7a25c839be547c6bd964e015671453")
 
@@ -75,22 +85,38 @@ def write_thread(conn, bucket, dest_host, src_file, keyname):
             key.set_contents_from_filename(src_file)
             stop = datetime.datetime.now()
 
-            elapsed_time_string=stop-start
-            elapsed_time=float(elapsed_time_string.seconds)+float(elapsed_time_string.microseconds)/1000000.
-            timestamp=start.strftime('[%Y-%m-%d %H:%M:%S.%f] ')
-            logger.info("Host - %s write to bucket %s elapsed time - %.3f sec at %s" %(dest_host,bucket,elapsed_time,timestamp))
+            elapsed_time = (stop-start).total_seconds()
+            request_log.info("Host - %s write to bucket %s elapsed time - %.3f sec at %s", dest_host, bucket, elapsed_time, start)
             stamp = datetime.datetime.timestamp(start)
             msg = '{},{},{},{}'.format(stamp, dest_host, key.size, elapsed_time)
             print(msg)
         except Exception as e:
-            logger.info("Thread Exception (write object) %s" %(str(e)))
-            ret_code = False
+            ret_code = classify(e)
+            request_log.error("Thread Exception (write object) %s: %s", ret_code.value, e)
     except Exception as e:
         logger.info("Thread Exception (get_bucket) %s" %(str(e)))
-        ret_code = False
+        ret_code = classify(e)
     return ret_code
 
 
+def write_thread_http(conn, bucket, dest_host, payload, keyname):
+    """write_thread for --engine http: payload is a FilePayload, mapped and hashed once."""
+    global logger
+
+    try:
+        start = datetime.datetime.now()
+        response = conn.put(bucket, keyname, payload, payload_hash=payload.sha256())
+        elapsed_time = response.timings.elapsed
+        request_log.info("Host - %s write to bucket %s elapsed time - %.3f sec at %s", dest_host, bucket, elapsed_time, start)
+        msg = '{},{},{},{}'.format(datetime.datetime.timestamp(start), dest_host, len(payload), elapsed_time)
+        print(msg)
+    except Exception as e:
+        error_class = classify(e)
+        request_log.error("Thread Exception (write object) %s: %s", error_class.value, e)
+        return error_class
+    return None
+
+
 def get_connection(access_key, secret_key, host, port, is_secure):
     
     #create the connection to the S3 server
@@ -112,54 +138,103 @@ def stress_loop_func(conn, bucket, dest_host, src_file, keyname):
     global time_end
     global site
 
+    write = write_thread_http if args.engine == "http" else write_thread
+    keys = key_generator.stream(keyname)
+
     # removed balanced_host stuff
     new_host = dest_host
     # writing loop
     iloop=0
     while (time.time() < time_end):
         try:
-            newkeyname="%s_%s" %(keyname,str(iloop))
-            logger.debug("Writing file: %s to Object %s" %(src_file,newkeyname))
-            # write to Object store
-            ret_code = write_thread(conn, bucket, new_host, src_file, newkeyname)
-            if ret_code :
+            newkeyname = keys.next()[1]
+            request_log.debug("Writing file: %s to Object %s", src_file, newkeyname)
+            # write to Object store, retrying as --retry says
+            attempt = 1
+            while True:
+                limiter.acquire(file_size)
+                error_class = write(conn, bucket, new_host, src_file, newkeyname)
+                retrying = error_class is not None and retry_policy.should_retry(error_class, attempt)
+                error_counters.attempt(attempt, error_class, retrying)
+                if not retrying:
+                    break
+                time.sleep(retry_policy.delay(attempt))
+                attempt += 1
+            if error_class is None:
                 iloop += 1
             else :
                 logger.debug("Writing to OS failed end thread")
                 #break
-            time.sleep(5)
-            # close the connection
-            conn.close()
+            if not limiter:
+                time.sleep(5)
+            # close the connection; the http engine keeps its own until the thread ends
+            if args.engine != "http":
+                conn.close()
         except Exception as e:
             logger.info("Thread Exception (boto.connect_s3) %s %s" %(new_host,str(e)))
+    if args.engine == "http":
+        conn.close()
     logger.info("Host - %s number of writes to OS %d" %(new_host,(iloop+1)))
+    logger.info("Host - %s %s", new_host, error_counters.summary())
 
 
 def worker(i, hostname, submit_host, src_file, nthreads):
     global logger
-    name = multiprocessing.current_process().name
-    logger.info('Starting: %s', multiprocessing.current_process().name)
-    thread_id = 0
-    threadpools = []
-    total_threads=0
-
-    # Init Thread pool with desired number of threads
-    logger.info('Initialize ThreadPool - num threads : %d' %(nthreads))
-    threadpool = ThreadPool(nthreads)
-
-    conn = get_connection(args.access_key,
-                          args.secret_key,
-                          args.hostname,
-                          args.port,
-                          args.is_secure)
-
-    bucket = conn.get_bucket(args.bucket)
-
-    for i in range(nthreads):
-        logger.debug("Add thread to ThreadPool thread # %d" %(thread_id))
-        threadpool.add_task(stress_loop_func, conn, bucket, hostname, src_file, "write_test_%s_%d_%d" % (submit_host,i,thread_id))
-        thread_id += 1
-    threadpool.wait_completion()
+    global request_log
+    global retry_policy
+    global error_counters
+    global limiter
+    global file_size
+    global key_generator
+    # the listener thread has to be started in the process that logs, and stopped by it:
+    # worker processes exit without running atexit
+    listener = loadlog.start(logger)
+    try:
+        request_log = loadlog.RequestLog(logger, args.log_sample)
+        retry_policy = RetryPolicy.parse(args.retry)
+        error_counters = ErrorCounters()
+        limiter = RateLimiter(args.target_ops, args.target_bytes, args.fleet_size * num_processes)
+        file_size = os.path.getsize(src_file)
+        key_generator = KeyGenerator(args.key_seed, args.key_fanout)
+        logger.info("Rate limit for this process: %s", limiter)
+        name = multiprocessing.current_process().name
+        logger.info('Starting: %s', multiprocessing.current_process().name)
+        if args.profile_seconds:
+            SamplingProfiler(args.profile_dir, args.profile_seconds, delay=args.profile_delay, logger=logger).start()
+        thread_id = 0
+        threadpools = []
+        total_threads=0
+
+        # Init Thread pool with desired number of threads
+        logger.info('Initialize ThreadPool - num threads : %d' %(nthreads))
+        threadpool = ThreadPool(nthreads)
+
+        if args.engine == "http":
+            # map and hash the source once; each thread gets its own keep-alive connection
+            src_file = FilePayload(src_file)
+            logger.info("Mapped %s, %d bytes", src_file.path, len(src_file))
+            src_file.sha256()
+        else:
+            conn = get_connection(args.access_key,
+                                  args.secret_key,
+                                  args.hostname,
+                                  args.port,
+                                  args.is_secure)
+
+            bucket = conn.get_bucket(args.bucket)
+
+        for i in range(nthreads):
+            logger.debug("Add thread to ThreadPool thread # %d" %(thread_id))
+            if args.engine == "http":
+                conn = s3http.S3Connection(args.hostname, args.port, args.is_secure, args.access_key, args.secret_key,
+                                           address=address)
+                bucket = args.bucket
+            threadpool.add_task(stress_loop_func, conn, bucket, hostname, src_file, "write_test_%s_%d_%d" % (submit_host,i,thread_id))
+            thread_id += 1
+        threadpool.wait_completion()
+        logger.info("Peak RSS %.0f MB, %d log records dropped", peak_rss() / 1e6, loadlog.dropped())
+    finally:
+        listener.stop()
     sys.stdout.flush()
     sys.stderr.flush()
 
@@ -177,7 +252,43 @@ if __name__ == '__main__':
     parser.add_argument("-p", "--port", dest="port", type=int, default=443, help="port number")
     parser.add_argument("--profile", dest="profile", default='default', help="profile name")
     parser.add_argument("--debug", action="store_true", help="debug messages")
+    parser.add_argument("--log-sample", type=int, default=1, metavar="N",
+                        help="log one in N successful writes (0 for none), errors are always logged")
+    parser.add_argument("--retry", default="none",
+                        help="retry policy: none, standard or attempts=N,base=S,cap=S,on=slowdown+5xx+... (see s3errors.py)")
+    parser.add_argument("--target-ops", type=parse_rate, help="PUTs/sec for the whole fleet, instead of a 5s pause between PUTs")
+    parser.add_argument("--target-bytes", type=parse_rate, help="bytes/sec for the whole fleet, e.g. 2G")
+    parser.add_argument("--fleet-size", type=int, default=1, help="number of hosts running mkload.py with the same targets")
+    parser.add_argument("--key-seed", default="0", help="key names are reproducible from this seed, see keygen.py")
+    parser.add_argument("--key-fanout", type=int, default=16, help="spread key names over this many hex prefixes")
+    parser.add_argument("--engine", choices=["boto", "http"], default="boto",
+                        help="http memory-maps source_file once and sends it with sendfile on plain HTTP")
+    parser.add_argument("--site", help="take the endpoint, bucket (unless -b) and keys from this site of the registry, see sites.py")
+    parser.add_argument("--sites-file", default=sites.SITES_FILE, help="site registry")
+    parser.add_argument("--profile-seconds", type=int, default=0, help="run the sampling profiler in each worker for this long")
+    parser.add_argument("--profile-delay", type=int, default=0, help="seconds to wait before profiling")
+    parser.add_argument("--profile-dir", default="/tmp", help="where to write the profiles")
     args = parser.parse_args()
+    try:
+        RetryPolicy.parse(args.retry)
+    except ValueError as e:
+        parser.error("--retry: {}".format(e))
+
+    # resolve the endpoint, get the keys and check the bucket once, before forking
+    address = None
+    if args.site:
+        try:
+            site = sites.get_site(args.site, args.sites_file)
+            site.bucket = args.bucket or site.bucket
+            endpoint = sites.preflight(site)
+        except Exception as e:
+            parser.error("--site {}: {}".format(args.site, e))
+        args.hostname, args.port, args.is_secure, args.bucket = site.endpoint, site.port, site.secure, site.bucket
+        args.access_key, args.secret_key = endpoint.access_key, endpoint.secret_key
+        address = endpoint.address
+    elif args.engine == "http" and not (args.access_key and args.secret_key):
+        # boto can find keys in its own config, the http engine only has these
+        parser.error("--engine http needs -k and -s, or --site")
 
     submit_host = socket.gethostname()
     submit_host = submit_host.split(".")[0]
@@ -208,6 +319,8 @@ if __name__ == '__main__':
 
     logger.info('submit host - %s' %(submit_host))
     logger.info('number of subprocesses - %d' %(num_processes))
+    if address is not None:
+        logger.info('site %s resolved to %s', args.site, address[1][0])
 
     jobs = []
     try:
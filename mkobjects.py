@@ -14,6 +14,9 @@ import io
 from boto.s3.connection import S3Connection
 from boto.s3.key import Key
 
+from bucketset import bucket_names, keyset_bucket
+from keygen import KeyGenerator
+
 # from google.cloud import pubsub_v1
 
 #publisher = pubsub_v1.PublisherClient()
@@ -42,11 +45,16 @@ def getargs():
     parser.add_argument("--profile", dest="profile", default='default', help="profile name")
     parser.add_argument('-p', '--port', dest='port', type=int, default=443, help='port number')
     parser.add_argument("-c", "--insecure", dest="is_secure", default=True, action="store_false", help="use http")
+    parser.add_argument('--fanout', type=int, default=0, help='spread key names over this many hex prefixes')
+    parser.add_argument('--bucket-count', type=int, default=1,
+                        help='spread the objects over this many buckets, as mkobjects2.py BUCKET_COUNT reads them')
     parser.add_argument("-f", "--filename", dest="filename", help='[csv file name].csv')
     return parser.parse_args()
 
 def main():
     args = getargs()
+    # log lines go to stderr, away from the CSV on stdout
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", datefmt="%Y/%m/%d %H:%M:%S", level=logging.INFO)
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     
@@ -64,6 +72,10 @@ def main():
 
     # If --seed not given value is None - defaults to using system time
     random.seed(args.seed)
+    # Object i is always named keys.name(i) for a given --seed, see keygen.py
+    seed = args.seed if args.seed is not None else random.getrandbits(32)
+    keys = KeyGenerator(seed, args.fanout)
+    logging.info('Key seed %s, pass --seed %s to write or read the same keys', seed, seed)
 
     conn = S3Connection(aws_access_key_id = args.access_key,
                         aws_secret_access_key = args.secret_key,
@@ -73,19 +85,25 @@ def main():
                         calling_format = boto.s3.connection.OrdinaryCallingFormat(),
                         profile_name = args.profile)
 
-    bucket = conn.create_bucket(args.bucket)
-    bucket.set_acl('public-read')
+    # object i goes in keyset_bucket(names, i), where mkobjects2.py looks for it
+    names = bucket_names(args.bucket, args.bucket_count)
+    buckets = []
+    for name in names:
+        bucket = conn.create_bucket(name)
+        bucket.set_acl('public-read')
+        buckets.append(bucket)
 
     for i in range(args.num):
         output = io.StringIO()
         stringwriter = csv.writer(output)
 
         size = int(random.normalvariate(args.mean, args.stddev))
-        randname = ''.join(random.choice(string.ascii_lowercase) for _ in range(20))
+        randname = keys.name(i)
         randfile = ''.join(random.choice(string.ascii_lowercase) for _ in range(size))
 
         starttime = datetime.datetime.now()
 
+        bucket = keyset_bucket(buckets, i)
         key = Key(bucket, randname)
 
         try:
@@ -97,7 +115,7 @@ def main():
             timestamp = datetime.datetime.timestamp(starttime)
 
             outputwriter = csv.writer(sys.stdout)
-            msg = [timestamp, args.hostname, args.bucket, size, elapsed_time]
+            msg = [timestamp, args.hostname, bucket.name, size, elapsed_time]
             outputwriter.writerow(msg)
             stringwriter.writerow(msg)
 
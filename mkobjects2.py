@@ -1,4 +1,5 @@
 import argparse
+import io
 import random
 import logging
 import os
@@ -9,15 +10,25 @@ import time
 import platform
 import sys
 import threading
-import uuid
 
 from multiprocessing.pool import ThreadPool
 from datetime import datetime
 
-import boto
-from boto.s3.connection import S3Connection
-from boto.s3.key import Key
-from boto.exception import S3ResponseError
+import loadlog
+import s3http
+import sites
+import startup
+from loadstats import InFlight, LagMonitor, OpsMeter
+from bucketset import BucketChooser, bucket_names, create_buckets, keyset_bucket, parse_skew
+from keygen import KeyGenerator
+from membudget import MemoryBudget, parse_budget
+from payload import PayloadPool
+from popularity import KeyPopularity
+from presign import PresignedURLs
+from ratelimit import RateLimiter, parse_rate
+from s3errors import ErrorCounters, RetryPolicy, classify
+from profiler import SamplingProfiler
+from results import PHASE_COLUMNS, format_record
 
 logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", datefmt="%Y/%m/%d %H:%M:%S", level=logging.INFO)
 
@@ -46,101 +57,466 @@ def getenv(name, is_int=False, default=None):
     return value
     
 
-ENDPOINT_HOSTNAME = getenv("ENDPOINT_HOSTNAME")
-ENDPOINT_PORT = getenv("ENDPOINT_PORT", is_int=True)
-IS_SECURE = getenv("IS_SECURE", is_int=True, default=1)
-BUCKET_NAME = getenv("BUCKET_NAME")
+# SITE=<name> takes the endpoint, bucket and keys from the site registry (SITES_FILE, see
+# sites.py); the variables below still override the registry's values
+SITE = None
+if os.environ.get("SITE"):
+    try:
+        SITE = sites.get_site(os.environ["SITE"], os.environ.get("SITES_FILE", sites.SITES_FILE))
+    except (OSError, ImportError, ValueError) as e:
+        logging.critical("Bad SITE: {}".format(e))
+        bad_env_var = True
+
+ENDPOINT_HOSTNAME = getenv("ENDPOINT_HOSTNAME", default=SITE and SITE.endpoint)
+ENDPOINT_PORT = getenv("ENDPOINT_PORT", is_int=True, default=SITE and SITE.port)
+IS_SECURE = getenv("IS_SECURE", is_int=True, default=int(SITE.secure) if SITE else 1)
+BUCKET_NAME = getenv("BUCKET_NAME", default=SITE and SITE.bucket)
 NUM_THREADS = getenv("NUM_THREADS", is_int=True)
 
 OBJ_MEAN_KB = getenv("OBJ_MEAN_KB", is_int=True)
 OBJ_STDDEV_KB = getenv("OBJ_STDDEV_KB", is_int=True)
 
+# "boto", "http" (s3http.py, which also records per-phase timings) or "presigned" (the
+# http client sending URLs presigned up front, see presign.py; needs a key set WORKLOAD)
+ENGINE = getenv("ENGINE", default="boto")
+if ENGINE not in ("boto", "http", "presigned"):
+    logging.critical("ENGINE must be boto, http or presigned, not {}".format(ENGINE))
+    bad_env_var = True
+elif ENGINE == "boto":
+    # boto takes most of the start-up time to import, so only its engine loads it
+    import boto
+    import boto.s3.connection
+    from boto.s3.connection import S3Connection
+    from boto.s3.key import Key
+
+# Keys come from the site when there is one (env or the PanDA key cache), otherwise boto
+# finds its own and the http engines need them set
+AWS_ACCESS_KEY_ID = AWS_SECRET_ACCESS_KEY = None
+if SITE is not None:
+    try:
+        AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY = sites.CredentialCache().get(SITE)
+    except Exception as e:
+        logging.critical("No keys for site {}: {}".format(SITE.name, e))
+        bad_env_var = True
+elif ENGINE in ("http", "presigned"):
+    AWS_ACCESS_KEY_ID = getenv("AWS_ACCESS_KEY_ID")
+    AWS_SECRET_ACCESS_KEY = getenv("AWS_SECRET_ACCESS_KEY")
+
+# How the body's integrity is sent:
+#   hash         the client hashes every body (boto MD5, http SHA-256), as before
+#   precomputed  digests are computed once per payload size and reused
+#   unsigned     http only, UNSIGNED-PAYLOAD: the body is never hashed
+#   streaming    http only, aws-chunked with each chunk signed as it is sent
+PAYLOAD_INTEGRITY = getenv("PAYLOAD_INTEGRITY", default="hash")
+if PAYLOAD_INTEGRITY not in ("hash", "precomputed", "unsigned", "streaming"):
+    logging.critical("PAYLOAD_INTEGRITY must be hash, precomputed, unsigned or streaming, not {}".format(PAYLOAD_INTEGRITY))
+    bad_env_var = True
+elif PAYLOAD_INTEGRITY in ("unsigned", "streaming") and ENGINE != "http":
+    logging.critical("PAYLOAD_INTEGRITY={} needs ENGINE=http".format(PAYLOAD_INTEGRITY))
+    bad_env_var = True
+
+# Offered load for the whole deployment, e.g. TARGET_OPS=5000 or TARGET_BYTES=2G, split
+# evenly over FLEET_SIZE pods (set it to replicas). Unset means as fast as the threads go.
+FLEET_SIZE = getenv("FLEET_SIZE", is_int=True, default=1)
+try:
+    LIMITER = RateLimiter(parse_rate(getenv("TARGET_OPS", default="0")),
+                          parse_rate(getenv("TARGET_BYTES", default="0")),
+                          FLEET_SIZE or 1)
+except ValueError as e:
+    logging.critical("Bad TARGET_OPS or TARGET_BYTES: {}".format(e))
+    bad_env_var = True
+
+# Spread writes over BUCKET_COUNT buckets named BUCKET_NAME-NNNN, picked per request with
+# BUCKET_SKEW (uniform or zipf:S), see bucketset.py
+BUCKET_COUNT = getenv("BUCKET_COUNT", is_int=True, default=1)
+BUCKET_SKEW = getenv("BUCKET_SKEW", default="uniform")
+try:
+    parse_skew(BUCKET_SKEW, 1)
+except ValueError as e:
+    logging.critical("Bad BUCKET_SKEW: {}".format(e))
+    bad_env_var = True
+
+# Key names are reproducible from KEY_SEED, see keygen.py; KEY_FANOUT > 1 adds hex prefixes
+KEY_SEED = getenv("KEY_SEED", default="0")
+KEY_FANOUT = getenv("KEY_FANOUT", is_int=True, default=0)
+
+# What each request does:
+#   put          PUT a new key every time (the default)
+#   get          GET keys of an existing key set, the first KEYSET_SIZE keys of KEY_SEED
+#                (written by e.g. mkobjects.py --seed KEY_SEED --num KEYSET_SIZE)
+#   overwrite    PUT over keys of the key set
+#   mixed:F      a fraction F of GETs, the rest overwrites
+# POPULARITY picks the key set keys: uniform, zipf:S or latest:N, see popularity.py
+WORKLOAD = getenv("WORKLOAD", default="put")
+KEYSET_SIZE = getenv("KEYSET_SIZE", is_int=True, default=0)
+POPULARITY = getenv("POPULARITY", default="uniform")
+GET_FRACTION = {"put": 0.0, "get": 1.0, "overwrite": 0.0}.get(WORKLOAD)
+if GET_FRACTION is None and WORKLOAD.startswith("mixed:"):
+    try:
+        GET_FRACTION = float(WORKLOAD[6:])
+    except ValueError:
+        pass
+if GET_FRACTION is None:
+    logging.critical("WORKLOAD must be put, get, overwrite or mixed:F, not {}".format(WORKLOAD))
+    bad_env_var = True
+elif not 0 <= GET_FRACTION <= 1:
+    logging.critical("WORKLOAD=mixed:F needs F between 0 and 1, not {}".format(GET_FRACTION))
+    bad_env_var = True
+elif WORKLOAD != "put":
+    try:
+        POPULARITY = KeyPopularity(POPULARITY, KEYSET_SIZE)
+    except ValueError as e:
+        logging.critical("WORKLOAD={} needs KEYSET_SIZE and a valid POPULARITY: {}".format(WORKLOAD, e))
+        bad_env_var = True
+if ENGINE == "presigned" and WORKLOAD == "put":
+    logging.critical("ENGINE=presigned needs a key set: WORKLOAD get, overwrite or mixed:F")
+    bad_env_var = True
+
+# URLs are valid for PRESIGN_EXPIRES seconds; the first PRESIGN_PREFILL keys of the key set
+# (the hottest under zipf) are signed before the run, others when first used
+PRESIGN_EXPIRES = getenv("PRESIGN_EXPIRES", is_int=True, default=3600)
+PRESIGN_PREFILL = getenv("PRESIGN_PREFILL", is_int=True, default=100000)
+
+# Which failures to retry and how to back off, see s3errors.py
+RETRY_POLICY = getenv("RETRY_POLICY", default="none")
+try:
+    RETRY_POLICY = RetryPolicy.parse(RETRY_POLICY)
+except ValueError as e:
+    logging.critical("Bad RETRY_POLICY: {}".format(e))
+    bad_env_var = True
+
+# Log one in LOG_SAMPLE successful requests (0 for none); errors are always logged
+LOG_SAMPLE = getenv("LOG_SAMPLE", is_int=True, default=1)
+
+# Bytes of request buffers the pod may hold at once, e.g. 512Mi; requests wait for room
+# rather than allocate past it. auto is half the container's memory limit, see membudget.py
+MEMORY_BUDGET = getenv("MEMORY_BUDGET", default="auto")
+try:
+    MEMORY_BUDGET = parse_budget(MEMORY_BUDGET)
+except ValueError as e:
+    logging.critical("Bad MEMORY_BUDGET: {}".format(e))
+    bad_env_var = True
+
+# Small-object mode: with PIPELINE_DEPTH > 0 each thread keeps that many PUTs in flight
+# on its connection, back to back (s3http.PipelinedPuts), to find the request rate ceiling
+# of the endpoint. Needs ENGINE=http and WORKLOAD=put; bodies are capped at 64KB, signed
+# with their cached digests unless unsigned, and failed requests aren't retried.
+# Ops/sec per connection and per client core are logged every minute in either mode.
+PIPELINE_DEPTH = getenv("PIPELINE_DEPTH", is_int=True, default=0)
+if PIPELINE_DEPTH and (ENGINE != "http" or WORKLOAD != "put" or PAYLOAD_INTEGRITY == "streaming"):
+    logging.critical("PIPELINE_DEPTH needs ENGINE=http, WORKLOAD=put and no streaming PAYLOAD_INTEGRITY")
+    bad_env_var = True
+
+# Opt-in sampling profiler: profile PROFILE_SECONDS seconds starting PROFILE_DELAY seconds in
+PROFILE_SECONDS = getenv("PROFILE_SECONDS", is_int=True, default=0)
+PROFILE_DELAY = getenv("PROFILE_DELAY", is_int=True, default=0)
+PROFILE_DIR = getenv("PROFILE_DIR", default="/tmp")
+PROFILE_FORMAT = getenv("PROFILE_FORMAT", default="collapsed")
 
 if bad_env_var:
     logging.critical("Exiting early")
     sys.exit(1)
 
 logging.info("VERSION 1.11")
+STARTUP = startup.StartupClock()
+STARTUP.mark("configured")
+
+loadlog.start()
+REQUEST_LOG = loadlog.RequestLog(every=LOG_SAMPLE)
+
+IN_FLIGHT = InFlight()
+LAG_MONITOR = LagMonitor()
+MEMORY = MemoryBudget(MEMORY_BUDGET)
+PAYLOADS = PayloadPool(budget=MEMORY)
+ERROR_COUNTERS = ErrorCounters()
+OPS_METER = OpsMeter(NUM_THREADS)
+KEYS = KeyGenerator(KEY_SEED, KEY_FANOUT)
+BUCKETS = BucketChooser(bucket_names(BUCKET_NAME, BUCKET_COUNT), BUCKET_SKEW)
+# The endpoint's address, resolved once by preflight() and used by every http connection
+ADDRESS = None
+if ENGINE == "presigned":
+    URLS = PresignedURLs(AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,
+                         s3http.host_header(ENDPOINT_HOSTNAME, ENDPOINT_PORT, IS_SECURE), expires=PRESIGN_EXPIRES)
+
+def fake_should_retry(response, chunked_transfer=False):
+    REQUEST_LOG.debug("Got response status %d", response.status)
+    if 200 <= response.status <= 299:
+        return True # doesn't retry, just finishes normally (I think)
+    raise s3http.HTTPError(response.status, response.reason)
+    return False
+
+
+def http_connection(integrity="sha256"):
+    return s3http.S3Connection(ENDPOINT_HOSTNAME, ENDPOINT_PORT, IS_SECURE,
+                               AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, integrity=integrity, address=ADDRESS)
+
+
+def boto_connection():
+    return S3Connection(aws_access_key_id=AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                        host=ENDPOINT_HOSTNAME,
+                        port=ENDPOINT_PORT,
+                        is_secure=IS_SECURE,
+                        calling_format=boto.s3.connection.OrdinaryCallingFormat())
+
 
 def run_stress_test(thread_num):
     logging.info("Thread %d starting", thread_num)
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 
-    s3conn = S3Connection(host=ENDPOINT_HOSTNAME,
-                          port=ENDPOINT_PORT,
-                          is_secure=IS_SECURE,
-                          calling_format=boto.s3.connection.OrdinaryCallingFormat())
-    
-    logging.info("Thread %d made connection", thread_num)
+    # the buckets were checked once by preflight(), so threads don't validate them again
+    if ENGINE == "presigned":
+        # requests go to URLS targets, the connection doesn't sign anything
+        s3conn = http_connection()
+    elif ENGINE == "http":
+        integrity = PAYLOAD_INTEGRITY if PAYLOAD_INTEGRITY in ("unsigned", "streaming") else "sha256"
+        s3conn = http_connection(integrity)
+    else:
+        s3conn = boto_connection()
 
-    #bucket = s3conn.create_bucket(BUCKET_NAME)
-    #bucket.set_acl("public-read")
-    bucket = s3conn.get_bucket(BUCKET_NAME)
+        #bucket = s3conn.create_bucket(BUCKET_NAME)
+        #bucket.set_acl("public-read")
+        buckets = {name: s3conn.get_bucket(name, validate=False) for name in BUCKETS.names}
 
+    keys = KEYS.stream(NODE, thread_num)
     logging.info("Thread %d starting loop", thread_num)
     while True:
         st = datetime.now()
-        obj_name = uuid.uuid4().hex
+        if WORKLOAD == "put":
+            op = "PUT"
+            key_index, obj_name = keys.next()
+            bucket_name = BUCKETS.choose()
+        else:
+            op = "GET" if random.random() < GET_FRACTION else "PUT"
+            key_index = POPULARITY.draw()
+            obj_name = KEYS.name(key_index)
+            bucket_name = keyset_bucket(BUCKETS.names, key_index)
         if OBJ_MEAN_KB == 0:
             size_in_kb = 0
-            object_contents = b""
         else:
-            size_in_kb = int(random.normalvariate(OBJ_MEAN_KB, OBJ_STDDEV_KB))
-            object_contents = os.urandom(1024)*size_in_kb
+            size_in_kb = max(0, int(random.normalvariate(OBJ_MEAN_KB, OBJ_STDDEV_KB)))
+        payload = PAYLOADS.get(size_in_kb*1024)
         obj_create_time = (datetime.now()-st).total_seconds()
 
-        key = Key(bucket, obj_name)
-
-        def fake_should_retry(response, chunked_transfer=False):
-            logging.info("Got response status %d", response.status)
-            if 200 <= response.status <= 299:
-                return True # doesn't retry, just finishes normally (I think)
-            raise Exception("HTTP response %d %s" % (response.status, response.reason))
-            return False
-        key.should_retry = fake_should_retry
+        attempt = 1
+        while True:
+            LIMITER.acquire(size_in_kb*1024 if op == "PUT" else 0)
+            # what the attempt allocates: boto copies PUT bodies and GET bodies are read
+            # whole (expected to be about the size drawn); http PUTs send the shared buffer
+            held = 0 if op == "PUT" and ENGINE != "boto" else size_in_kb*1024
+            MEMORY.acquire(held)
+            phases = [None] * len(PHASE_COLUMNS)
+            size = size_in_kb*1024
+            error = ""
+            error_class = None
+            in_flight = IN_FLIGHT.enter()
+            throttled_start = LAG_MONITOR.throttled
+            start_time = datetime.now()
+            try:
+                if ENGINE == "presigned":
+                    target = URLS.get(op, bucket_name, obj_name)
+                    response = s3conn.presigned(op, target, payload.data if op == "PUT" else b"")
+                    elapsed = response.timings.elapsed
+                    phases = response.timings.durations()
+                    if op == "GET":
+                        size = len(response.body)
+                elif op == "GET" and ENGINE == "http":
+                    response = s3conn.get(bucket_name, obj_name)
+                    elapsed = response.timings.elapsed
+                    phases = response.timings.durations()
+                    size = len(response.body)
+                elif op == "GET":
+                    key = Key(buckets[bucket_name], obj_name)
+                    key.should_retry = fake_should_retry
+                    size = len(key.get_contents_as_string())
+                    end_time = datetime.now()
+                    elapsed = (end_time-start_time).total_seconds()
+                elif ENGINE == "http":
+                    payload_hash = payload.sha256() if PAYLOAD_INTEGRITY == "precomputed" else None
+                    response = s3conn.put(bucket_name, obj_name, payload.data, payload_hash=payload_hash)
+                    elapsed = response.timings.elapsed
+                    phases = response.timings.durations()
+                else:
+                    key = Key(buckets[bucket_name], obj_name)
+                    key.should_retry = fake_should_retry
+                    if PAYLOAD_INTEGRITY == "precomputed":
+                        key.set_contents_from_file(io.BytesIO(payload.data), md5=payload.md5())
+                    else:
+                        key.set_contents_from_string(bytes(payload.data))
+                    end_time = datetime.now()
+                    elapsed = (end_time-start_time).total_seconds()
+            except Exception as e:
+                end_time = datetime.now()
+                elapsed = (end_time-start_time).total_seconds()
+                if hasattr(e, "timings"):
+                    phases = e.timings.durations()
+                error_class = classify(e)
+                REQUEST_LOG.error("Thread %d: attempt %d: %s: %s", thread_num, attempt, error_class.value, e)
+                size = -1
+                error = str(e).strip("\n")
+            finally:
+                IN_FLIGHT.exit()
+                MEMORY.release(held)
+            if op == "GET" and size > 0:
+                LIMITER.acquire(size, ops=0)
 
-        start_time = datetime.now()
-        try:
-            key.set_contents_from_string(object_contents)
-            end_time = datetime.now()
-            elapsed = (end_time-start_time).total_seconds()
+            retrying = error_class is not None and RETRY_POLICY.should_retry(error_class, attempt)
+            ERROR_COUNTERS.attempt(attempt, error_class, retrying)
+            STARTUP.first_request()
 
             msg = [NODE,
                    datetime.timestamp(start_time),
                    ENDPOINT_HOSTNAME,
-                   BUCKET_NAME,
-                   size_in_kb*1024,
+                   bucket_name,
+                   size,
                    elapsed,
-                   ""]
+                   error] + phases + [in_flight, LAG_MONITOR.lag, LAG_MONITOR.throttled-throttled_start,
+                                      error_class.value if error_class else "", attempt, key_index, op]
 
-            csv_data = ",".join(map(str, msg))
+            csv_data = format_record(msg)
 
-            logging.info("Thread %d: %s obj_create:%s", thread_num, csv_data, str(obj_create_time))
+            if not error:
+                REQUEST_LOG.info("Thread %d: %s obj_create:%s", thread_num, csv_data, obj_create_time)
 
-            sock.sendto(csv_data.encode("utf-8"), (LOG_SERVER_ADDR, LOG_SERVER_PORT))
+            try:
+                sock.sendto(csv_data.encode("utf-8"), (LOG_SERVER_ADDR, LOG_SERVER_PORT))
+            except Exception as e:
+                REQUEST_LOG.error("Thread %d: sending result failed: %s", thread_num, e)
 
-        except Exception as e:
-            end_time = datetime.now()
-            elapsed = (end_time-start_time).total_seconds()
-            logging.error("Thread %d: %s", thread_num, str(e))
-            msg = [NODE,
-                   datetime.timestamp(start_time),
-                   ENDPOINT_HOSTNAME,
-                   BUCKET_NAME,
-                   -1,
-                   elapsed,
-                   str(e).strip("\n")]
-            csv_data = ",".join(map(str, msg))
+            if not retrying:
+                break
+            time.sleep(RETRY_POLICY.delay(attempt))
+            attempt += 1
+
+        ERROR_COUNTERS.report(logging.getLogger())
+        MEMORY.report()
+        loadlog.report()
+        OPS_METER.add(thread_num)
+        OPS_METER.report()
+
+
+def run_pipelined(thread_num):
+    """Like run_stress_test, with PIPELINE_DEPTH PUTs in flight at once on one connection."""
+    logging.info("Thread %d starting, %d requests in flight", thread_num, PIPELINE_DEPTH)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s3conn = http_connection("unsigned" if PAYLOAD_INTEGRITY == "unsigned" else "sha256")
+    pipeline = s3http.PipelinedPuts(s3conn, PIPELINE_DEPTH)
+    max_kb = s3http.PIPELINE_MAX_BODY // 1024
+
+    def requests():
+        keys = KEYS.stream(NODE, thread_num)
+        while True:
+            key_index, obj_name = keys.next()
+            size_in_kb = 0
+            if OBJ_MEAN_KB:
+                size_in_kb = min(max_kb, max(0, int(random.normalvariate(OBJ_MEAN_KB, OBJ_STDDEV_KB))))
+            payload = PAYLOADS.get(size_in_kb*1024)
+            LIMITER.acquire(len(payload))
+            yield (BUCKETS.choose(), obj_name, payload.data, payload.sha256(),
+                   key_index, time.time(), IN_FLIGHT.enter(), LAG_MONITOR.throttled)
+
+    def done(request, timings, error):
+        bucket_name, _, body, _, key_index, start_time, in_flight, throttled_start = request
+        IN_FLIGHT.exit()
+        size = len(body)
+        elapsed = timings.elapsed
+        error_class = None
+        if error is not None:
+            elapsed = time.monotonic() - timings.start
+            error_class = classify(error)
+            REQUEST_LOG.error("Thread %d: %s: %s", thread_num, error_class.value, error)
+            size = -1
+        ERROR_COUNTERS.attempt(1, error_class)
+        STARTUP.first_request()
+        OPS_METER.add(thread_num)
+
+        csv_data = format_record([NODE, start_time, ENDPOINT_HOSTNAME, bucket_name, size, elapsed,
+                                  str(error).strip("\n") if error is not None else ""]
+                                 + timings.durations() + [in_flight, LAG_MONITOR.lag, LAG_MONITOR.throttled-throttled_start,
+                                                          error_class.value if error_class else "", 1, key_index, "PUT"])
+        if error is None:
+            REQUEST_LOG.info("Thread %d: %s", thread_num, csv_data)
+        try:
             sock.sendto(csv_data.encode("utf-8"), (LOG_SERVER_ADDR, LOG_SERVER_PORT))
+        except Exception as e:
+            REQUEST_LOG.error("Thread %d: sending result failed: %s", thread_num, e)
+        ERROR_COUNTERS.report(logging.getLogger())
+        OPS_METER.report()
+        loadlog.report()
 
+    pipeline.run(requests(), done)
 
 
+def create_bucket(name):
+    if ENGINE in ("http", "presigned"):
+        s3conn = http_connection()
+        try:
+            s3conn.create_bucket(name)
+        finally:
+            s3conn.close()
+    else:
+        boto_connection().create_bucket(name)
 
 
+def preflight():
+    """
+    Resolve the endpoint and check the first bucket once per pod, before any thread
+    starts. boto resolves the host itself, once per thread's connection.
+    """
+    global ADDRESS
+    start = time.monotonic()
+    try:
+        ADDRESS = sites.resolve(ENDPOINT_HOSTNAME, ENDPOINT_PORT)[0]
+        if ENGINE == "boto":
+            boto_connection().get_bucket(BUCKETS.names[0])
+        else:
+            s3conn = http_connection()
+            try:
+                s3conn.head_bucket(BUCKETS.names[0])
+            finally:
+                s3conn.close()
+    except Exception as e:
+        logging.critical("Exiting early, pre-flight check of %s/%s failed: %s", ENDPOINT_HOSTNAME, BUCKETS.names[0], e)
+        sys.exit(1)
+    logging.info("%s resolved to %s, bucket %s checked in %.3fs", ENDPOINT_HOSTNAME, ADDRESS[1][0],
+                 BUCKETS.names[0], time.monotonic() - start)
+
 
 def main():
+    if SITE is not None:
+        logging.info("Site %s", SITE)
+    if BUCKET_COUNT > 1:
+        logging.info("Writing to %d buckets %s..%s, skew %s", BUCKET_COUNT, BUCKETS.names[0], BUCKETS.names[-1], BUCKET_SKEW)
+        if create_buckets(BUCKETS.names, create_bucket):
+            logging.critical("Exiting early, not all buckets could be created")
+            sys.exit(1)
+    if WORKLOAD != "put":
+        logging.info("Workload %s over %d keys of seed %s, popularity %s", WORKLOAD, KEYSET_SIZE, KEY_SEED, POPULARITY.model)
+    if ENGINE == "presigned":
+        prefill = []
+        for index in range(min(KEYSET_SIZE, PRESIGN_PREFILL)):
+            name = KEYS.name(index)
+            bucket_name = keyset_bucket(BUCKETS.names, index)
+            if GET_FRACTION > 0:
+                prefill.append(("GET", bucket_name, name))
+            if GET_FRACTION < 1:
+                prefill.append(("PUT", bucket_name, name))
+        start = time.monotonic()
+        URLS.prefill(prefill)
+        logging.info("Presigned %d URLs in %.1fs, valid for %ds", len(URLS), time.monotonic()-start, PRESIGN_EXPIRES)
+        URLS.start()
+    preflight()
+    STARTUP.mark("pre-flight")
+    logging.info("Retry policy: %s", RETRY_POLICY)
+    logging.info("Rate limit for this pod: %s", LIMITER)
+    logging.info("Memory budget for request buffers: %s", "{:.0f} MB".format(MEMORY_BUDGET / 1e6) if MEMORY_BUDGET else "unlimited")
+    LAG_MONITOR.start()
+    if PROFILE_SECONDS:
+        SamplingProfiler(PROFILE_DIR, PROFILE_SECONDS, delay=PROFILE_DELAY, fmt=PROFILE_FORMAT).start()
+    if PIPELINE_DEPTH:
+        logging.info("Small-object mode: %d PUTs in flight per connection", PIPELINE_DEPTH)
     pool = ThreadPool(processes=NUM_THREADS)
-    pool.map(run_stress_test, range(0, NUM_THREADS))
+    pool.map(run_pipelined if PIPELINE_DEPTH else run_stress_test, range(0, NUM_THREADS))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,338 @@
+"""
+Drive several sites at once from one process tree and compare them side by side.
+
+Sites used to be tested with one mkobjects-<site>.yaml Deployment each, launched by hand
+and merged afterwards in process_data.py. Here each site of the registry (sites.py) gets
+its own worker process with its own pre-flight check, its own threads and keep-alive
+connections (s3http.py, one per thread, never shared between sites) and its own rate
+budget, so a slow or throttling site can't hold the others back or use up their budget.
+
+Workers send their result records (results.COLUMNS, endpoint being the site's endpoint)
+back to the parent in batches. The parent writes each batch out as it arrives and keeps
+only running totals per site, so its memory doesn't grow with the length of the run. The
+results go to one file (resultsfile.py format through its ResultsWriter, or CSV if the
+name ends in .csv). At the end it prints throughput, latency percentiles
+(within 1%, from sketch.py) and error rates per site:
+
+    python multisite.py ral cern bnl --threads 8 --duration 600 --size-kb 1024 \\
+        --target-ops ral=200,cern=200 --out multisite.sres
+    python multisite.py --summary multisite.sres
+
+Rates are ops/sec (--target-ops) or bytes/sec (--target-bytes) per site, one value for
+every site ("500") or site=rate pairs ("ral=500,cern=2G").
+"""
+
+import argparse
+import collections
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+import sites
+from keygen import KeyGenerator
+from loadstats import InFlight
+from membudget import peak_rss
+from payload import PayloadPool
+from ratelimit import RateLimiter, parse_rate
+from results import COLUMNS, PHASE_COLUMNS, format_record
+from resultsfile import STRING_COLUMNS, ResultsWriter, load_results
+from s3errors import RetryPolicy, classify
+from sketch import LatencySketch
+
+NODE = platform.node()
+# records are sent to the parent in batches of this many, or every BATCH_SECONDS
+BATCH_SIZE = 500
+BATCH_SECONDS = 1.0
+
+
+def parse_budgets(text, names):
+    """Rate per site name from "500" (every site) or "ral=500,cern=2G"; None for no limit."""
+    budgets = dict.fromkeys(names)
+    if not text:
+        return budgets
+    if "=" not in text:
+        return dict.fromkeys(names, parse_rate(text))
+    for part in text.split(","):
+        name, _, rate = part.partition("=")
+        name = name.strip()
+        if name not in budgets:
+            raise ValueError("{} is not one of the sites being run".format(name))
+        budgets[name] = parse_rate(rate)
+    return budgets
+
+
+class Batcher:
+    """Collects records from a site's threads and puts them on the queue in batches."""
+
+    def __init__(self, results, site_name):
+        self.results = results
+        self.site_name = site_name
+        self._records = []
+        self._lock = threading.Lock()
+        self._sent = time.monotonic()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+            if len(self._records) < BATCH_SIZE and time.monotonic() - self._sent < BATCH_SECONDS:
+                return
+            records, self._records = self._records, []
+            self._sent = time.monotonic()
+        self.results.put(("records", self.site_name, records))
+
+    def flush(self):
+        with self._lock:
+            records, self._records = self._records, []
+        if records:
+            self.results.put(("records", self.site_name, records))
+
+
+def run_site(site, options, ops_budget, bytes_budget, results):
+    """Worker process for one site: pre-flight, then PUT from options.threads threads until the end."""
+    try:
+        endpoint = sites.preflight(site)
+    except Exception as e:
+        results.put(("failed", site.name, "pre-flight check failed: {}".format(e)))
+        return
+    limiter = RateLimiter(ops_budget, bytes_budget)
+    retry_policy = RetryPolicy.parse(options.retry)
+    payloads = PayloadPool()
+    keys = KeyGenerator(options.key_seed, options.key_fanout)
+    in_flight_counter = InFlight()
+    batcher = Batcher(results, site.name)
+    end = time.monotonic() + options.duration
+    logging.info("Site %s: %d threads, rate limit %s", site.name, options.threads, limiter)
+
+    def run_thread(thread_num):
+        s3conn = endpoint.connection()
+        stream = keys.stream(NODE, site.name, thread_num)
+        while time.monotonic() < end:
+            key_index, obj_name = stream.next()
+            size_in_kb = options.size_kb
+            if options.stddev_kb:
+                size_in_kb = max(0, int(random.normalvariate(options.size_kb, options.stddev_kb)))
+            payload = payloads.get(size_in_kb*1024)
+            attempt = 1
+            while True:
+                limiter.acquire(len(payload))
+                size = len(payload)
+                error = ""
+                error_class = None
+                in_flight = in_flight_counter.enter()
+                start_time = datetime.now()
+                try:
+                    response = s3conn.put(site.bucket, obj_name, payload.data, payload_hash=payload.sha256())
+                    elapsed = response.timings.elapsed
+                    phases = response.timings.durations()
+                except Exception as e:
+                    elapsed = (datetime.now()-start_time).total_seconds()
+                    phases = e.timings.durations() if hasattr(e, "timings") else [None] * len(PHASE_COLUMNS)
+                    error_class = classify(e)
+                    size = -1
+                    error = str(e).strip("\n")
+                finally:
+                    in_flight_counter.exit()
+                retrying = error_class is not None and retry_policy.should_retry(error_class, attempt)
+                batcher.add([NODE, datetime.timestamp(start_time), site.endpoint, site.bucket, size, elapsed, error]
+                            + phases + [in_flight, None, None, error_class.value if error_class else "",
+                                        attempt, key_index, "PUT"])
+                if not retrying:
+                    break
+                time.sleep(retry_policy.delay(attempt))
+                attempt += 1
+        s3conn.close()
+
+    threads = [threading.Thread(target=run_thread, args=(i,), name="{}-{}".format(site.name, i))
+               for i in range(options.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.flush()
+    results.put(("done", site.name, peak_rss()))
+
+
+def records_to_columns(records, names=COLUMNS):
+    """Arrays of the names columns of result records, None being NaN or ""."""
+    columns = {}
+    for name in names:
+        i = COLUMNS.index(name)
+        values = [record[i] for record in records]
+        if name in STRING_COLUMNS:
+            columns[name] = np.array(["" if v is None else str(v) for v in values], dtype=object)
+        else:
+            columns[name] = np.array([np.nan if v is None else v for v in values], dtype=float)
+    return columns
+
+
+class SiteTotals:
+    """Running totals of one site's results for the summary, so no records need keeping."""
+
+    def __init__(self):
+        self.requests = 0
+        self.failed = 0
+        self.bytes = 0
+        self.first = math.inf
+        self.last = -math.inf
+        self.sketch = LatencySketch()
+        self.errors = collections.Counter()
+
+    def add(self, timestamps, sizes, durations, error_classes):
+        if not len(timestamps):
+            return
+        ok = sizes >= 0
+        self.requests += len(timestamps)
+        self.failed += int(len(timestamps) - ok.sum())
+        self.bytes += int(sizes[ok].sum())
+        self.first = min(self.first, float(timestamps.min()))
+        self.last = max(self.last, float((timestamps + durations).max()))
+        self.sketch.add_many(durations[ok])
+        self.errors.update(error_classes[~ok])
+
+    def row(self, label):
+        """(site, requests, ok/s, MB/s, p50, p90, p99 ms, error %, top error class); rates over the site's own span."""
+        span = self.last - self.first
+        span = span if span > 0 else float("nan")
+        p50, p90, p99 = (1000 * self.sketch.quantile(q) for q in (0.5, 0.9, 0.99))
+        top = self.errors.most_common(1)
+        return [label, self.requests, (self.requests - self.failed) / span, self.bytes / span / 1e6, p50, p90, p99,
+                100.0 * self.failed / self.requests, "{} ({})".format(*top[0]) if top else ""]
+
+
+def summarise(groups, timestamps, sizes, durations, error_classes):
+    """Summary rows per group, e.g. endpoint and bucket."""
+    rows = []
+    for group in sorted(set(groups)):
+        mask = groups == group
+        totals = SiteTotals()
+        totals.add(timestamps[mask], sizes[mask], durations[mask], error_classes[mask])
+        rows.append(totals.row(group))
+    return rows
+
+
+def print_summary(rows):
+    print("{:24} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9} {:>8}  {}".format(
+        "site", "requests", "ok/s", "MB/s", "p50 ms", "p90 ms", "p99 ms", "errors", "most common error"))
+    for row in rows:
+        print("{:24} {:9d} {:9.1f} {:9.2f} {:9.1f} {:9.1f} {:9.1f} {:7.2f}%  {}".format(*row))
+
+
+def summarise_file(path):
+    """Summary of a results file, which has no site names: sites are told apart by endpoint and bucket."""
+    results = load_results(path)
+    error_classes = results["error_class"].fillna("") if "error_class" in results else np.full(len(results), "")
+    groups = results["endpoint"].astype(str) + "/" + results["bucket"].fillna("").astype(str)
+    print_summary(summarise(np.asarray(groups), np.asarray(results["timestamp"]),
+                            np.asarray(results["size"]), np.asarray(results["duration"]),
+                            np.asarray(error_classes)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the load against several sites at once and compare them")
+    parser.add_argument("sites", nargs="*", help="sites from the registry")
+    parser.add_argument("--sites-file", default=sites.SITES_FILE, help="site registry")
+    parser.add_argument("--bucket", help="bucket to use at every site instead of the registry's")
+    parser.add_argument("-n", "--threads", type=int, default=4, help="threads (and connections) per site")
+    parser.add_argument("-t", "--duration", type=float, default=60, help="seconds to run for")
+    parser.add_argument("--size-kb", type=int, default=1024, help="mean object size")
+    parser.add_argument("--stddev-kb", type=int, default=0, help="standard deviation of the object size")
+    parser.add_argument("--target-ops", help="ops/sec per site: RATE or site=RATE,...")
+    parser.add_argument("--target-bytes", help="bytes/sec per site: RATE or site=RATE,... e.g. 2G")
+    parser.add_argument("--retry", default="none", help="retry policy, see s3errors.py")
+    parser.add_argument("--key-seed", default="0", help="key names are reproducible from this seed, see keygen.py")
+    parser.add_argument("--key-fanout", type=int, default=0, help="spread key names over this many hex prefixes")
+    parser.add_argument("--out", help="results file, .csv for CSV (default multisite_<time>.sres)")
+    parser.add_argument("--summary", metavar="RESULTS_FILE", help="only print the summary of an earlier run")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(processName)s %(levelname)s %(message)s",
+                        datefmt="%Y/%m/%d %H:%M:%S", level=logging.INFO)
+    if args.summary:
+        summarise_file(args.summary)
+        return 0
+    if not args.sites:
+        parser.error("give at least one site, or --summary")
+    try:
+        registry = sites.load_sites(args.sites_file)
+        run_sites = [registry[name] for name in args.sites]
+        ops_budgets = parse_budgets(args.target_ops, args.sites)
+        bytes_budgets = parse_budgets(args.target_bytes, args.sites)
+        RetryPolicy.parse(args.retry)
+    except KeyError as e:
+        parser.error("Unknown site {}".format(e))
+    except ValueError as e:
+        parser.error(str(e))
+    for site in run_sites:
+        site.bucket = args.bucket or site.bucket
+        if not site.bucket:
+            parser.error("site {} has no bucket, give --bucket".format(site.name))
+    out = args.out or datetime.now().strftime("multisite_%Y_%m_%d_%H_%M_%S.sres")
+
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_site, name=site.name,
+                                       args=(site, args, ops_budgets[site.name], bytes_budgets[site.name], results))
+               for site in run_sites]
+    for worker in workers:
+        worker.start()
+
+    csv_file = open(out, "w") if out.endswith(".csv") else None
+    writer = ResultsWriter(out) if csv_file is None else None
+    totals = {site.name: SiteTotals() for site in run_sites}
+    written = 0
+    running = {site.name for site in run_sites}
+    failed = {}
+    try:
+        while running:
+            try:
+                kind, name, payload = results.get(timeout=5)
+            except queue.Empty:
+                for worker in workers:
+                    if worker.name in running and not worker.is_alive():
+                        failed[worker.name] = "worker exited with {}".format(worker.exitcode)
+                        running.discard(worker.name)
+                continue
+            if kind == "records":
+                columns = records_to_columns(payload)
+                if writer is not None:
+                    writer.append(columns)
+                else:
+                    for record in payload:
+                        csv_file.write(format_record(record) + "\n")
+                written += len(payload)
+                totals[name].add(columns["timestamp"], columns["size"], columns["duration"],
+                                 columns["error_class"].astype(str))
+            else:
+                running.discard(name)
+                if kind == "failed":
+                    failed[name] = payload
+                else:
+                    logging.info("Site %s: finished, peak RSS %.0f MB", name, payload / 1e6)
+    finally:
+        (writer or csv_file).close()
+    for worker in workers:
+        worker.join()
+
+    for name, reason in sorted(failed.items()):
+        logging.error("Site %s: %s", name, reason)
+    if not written:
+        os.remove(out)
+        logging.error("No results")
+        return 1
+    logging.info("Wrote %d results to %s", written, out)
+
+    print_summary([totals[site.name].row("{} ({})".format(site.name, site.endpoint))
+                   for site in run_sites if totals[site.name].requests])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
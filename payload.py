@@ -0,0 +1,104 @@
+"""
+Reusable upload payloads with cached digests.
+
+mkobjects2.py used to build every body with os.urandom(1024)*size_in_kb and let the client
+hash it again before sending. PayloadPool keeps one buffer made the same way (a random 1KB
+block repeated) and hands out read-only views of its first n bytes, so a body of a given
+size is always the same bytes and its SHA-256 (for SigV4) and MD5 (for boto's Content-MD5)
+only ever need computing once per size.
+
+FilePayload is the same for uploading one existing file over and over (mkload.py): the file
+is memory-mapped once, and the http engine sends it with sendfile on plain HTTP so the body
+goes from the page cache to the socket without passing through Python.
+"""
+
+import base64
+import collections
+import hashlib
+import mmap
+import os
+import threading
+
+BLOCK = 1024
+
+
+class Payload:
+    """A body to upload: a memoryview into the pool's buffer plus its cached digests."""
+
+    __slots__ = ("data", "_sha256", "_md5")
+
+    def __init__(self, data):
+        self.data = data
+        self._sha256 = None
+        self._md5 = None
+
+    def __len__(self):
+        return len(self.data)
+
+    def sha256(self):
+        """Hex SHA-256, as x-amz-content-sha256 wants it."""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    def md5(self):
+        """(hex, base64) MD5, as boto's set_contents_from_file(md5=...) wants it."""
+        if self._md5 is None:
+            digest = hashlib.md5(self.data)
+            self._md5 = (digest.hexdigest(), base64.b64encode(digest.digest()).decode("ascii"))
+        return self._md5
+
+
+class PayloadPool:
+    """
+    Payloads of any size cut from one shared buffer, the most recent max_cached kept. With a
+    budget (membudget.MemoryBudget), growing the buffer waits for and takes its bytes.
+    """
+
+    def __init__(self, max_cached=4096, budget=None):
+        self.max_cached = max_cached
+        self.budget = budget
+        self._block = os.urandom(BLOCK)
+        self._buffer = b""
+        self._payloads = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, size):
+        with self._lock:
+            payload = self._payloads.get(size)
+            if payload is not None:
+                self._payloads.move_to_end(size)
+                return payload
+            if size > len(self._buffer):
+                # Growing keeps the existing prefix, so cached digests stay valid. Cached
+                # payloads move to the new buffer; views already handed out keep the old
+                # one alive only until their requests finish.
+                blocks = -(-size * 5 // 4 // BLOCK)
+                if self.budget is not None:
+                    self.budget.grow(blocks * BLOCK - len(self._buffer))
+                self._buffer = self._block * blocks
+                for cached in self._payloads.values():
+                    cached.data = memoryview(self._buffer)[:len(cached.data)]
+            payload = self._payloads[size] = Payload(memoryview(self._buffer)[:size])
+            if len(self._payloads) > self.max_cached:
+                self._payloads.popitem(last=False)
+            return payload
+
+
+class FilePayload(Payload):
+    """The whole of one file, memory-mapped once and shared by all threads."""
+
+    __slots__ = ("path", "file", "_mmap")
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size:
+            self._mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            Payload.__init__(self, memoryview(self._mmap))
+        else:
+            self._mmap = None
+            Payload.__init__(self, memoryview(b""))
+
+    def fileno(self):
+        return self.file.fileno()
@@ -0,0 +1,111 @@
+"""
+Key popularity models for read and overwrite workloads.
+
+A fresh key per PUT never touches the same object twice, so it says nothing about how
+the object store caches hot objects. A key set is the first count keys of a
+keygen.KeyGenerator (written earlier by mkobjects.py --seed S --num N, or by an overwrite
+run). KeyPopularity picks which of them each GET or overwrite goes to:
+
+    uniform     every key equally likely
+    zipf:S      key i (from 0) with weight 1/(i+1)**S; S around 1 is typical of real reads
+    latest:N    only the N most recently written keys (the highest indices), uniformly
+
+Draws use Vose's alias table, built once: one random index and one coin flip per draw
+whatever the distribution or the number of keys.
+
+    python popularity.py zipf:1.1 1000000 --draws 1000000
+"""
+
+import argparse
+import collections
+import random
+import time
+from array import array
+
+
+class AliasTable:
+    """Sample index i with probability weights[i] / sum(weights) in constant time."""
+
+    def __init__(self, weights):
+        n = len(weights)
+        if n == 0:
+            raise ValueError("AliasTable needs at least one weight")
+        total = float(sum(weights))
+        scaled = [w * n / total for w in weights]
+        self.n = n
+        self.probability = array("d", [1.0]) * n
+        self.alias = array("l", range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large[-1]
+            self.probability[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            if scaled[l] < 1.0:
+                small.append(large.pop())
+        # whatever is left is 1 up to rounding
+        for i in small + large:
+            self.probability[i] = 1.0
+
+    def sample(self, rand=random.random):
+        u = rand() * self.n
+        i = int(u)
+        return i if u - i < self.probability[i] else self.alias[i]
+
+
+def model_weights(model, count):
+    """(first index, weights) for model over a key set of count keys."""
+    name, _, parameter = model.partition(":")
+    if name == "uniform":
+        return 0, None
+    if name == "zipf":
+        s = float(parameter or 1.0)
+        return 0, [1.0 / (i + 1) ** s for i in range(count)]
+    if name == "latest":
+        n = int(parameter)
+        if n < 1:
+            raise ValueError("latest:N needs N of at least 1, not {}".format(n))
+        return count - min(n, count), None
+    raise ValueError("Unknown popularity model {!r}, expected uniform, zipf:S or latest:N".format(model))
+
+
+class KeyPopularity:
+    """Draw key indices in [0, count) following model. Safe to share between threads."""
+
+    def __init__(self, model, count):
+        if count <= 0:
+            raise ValueError("The key set must have at least one key")
+        self.model = model
+        self.count = count
+        self.first, weights = model_weights(model, count)
+        # uniform models don't need a table, just a random index in [first, count)
+        self._table = AliasTable(weights) if weights is not None else None
+
+    def draw(self):
+        if self._table is None:
+            return self.first + int(random.random() * (self.count - self.first))
+        return self.first + self._table.sample()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a popularity model: build time, draw rate and the hottest keys")
+    parser.add_argument("model", help="uniform, zipf:S or latest:N")
+    parser.add_argument("count", type=int, help="keys in the key set")
+    parser.add_argument("--draws", type=int, default=1000000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    popularity = KeyPopularity(args.model, args.count)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    counts = collections.Counter(popularity.draw() for _ in range(args.draws))
+    drawn = time.perf_counter() - start
+    print("built in {:.2f}s, {:.0f} draws/sec, {} distinct keys drawn".format(built, args.draws / drawn, len(counts)))
+    for index, n in counts.most_common(10):
+        print("  key {:>10}  {:6.2f}%".format(index, 100.0 * n / args.draws))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Presigned URL cache for the "presigned" engine.
+
+Grid jobs don't sign requests: they are handed presigned URLs and upload or download
+with a plain HTTP client. To measure that data path, mkobjects2.py signs URLs for the key
+set up front (Signer.presign) and the worker threads only look them up and send them with
+S3Connection.presigned(), so no signing happens per request.
+
+A URL is used for at most the first half of its lifetime. A daemon thread re-signs URLs
+while they are between 30% and 50% of the way through it, so workers never find one
+stale; one that is (a key that wasn't signed up front, or a refresher that fell behind)
+is signed on the spot.
+"""
+
+import threading
+import time
+
+from s3sign import Signer
+
+# Fraction of a URL's lifetime it is used for, and how often (also as a fraction of the
+# lifetime) the refresher looks for URLs coming up to that point
+USE_FRACTION = 0.5
+REFRESH_FRACTION = 0.1
+
+
+class PresignedURLs:
+    """Presigned targets per (method, bucket, key). Safe to share between threads."""
+
+    def __init__(self, access_key, secret_key, host, region="us-east-1", expires=3600):
+        self.signer = Signer(access_key, secret_key, region)
+        self.host = host
+        self.expires = expires
+        self.signed = 0
+        self._urls = {}
+        self._lock = threading.Lock()
+
+    def _sign(self, method, bucket, key, now):
+        self.signed += 1
+        target = self.signer.presign(method, self.host, "/{}/{}".format(bucket, key), self.expires, now)
+        return target, now + self.expires * USE_FRACTION
+
+    def prefill(self, requests):
+        """Sign (method, bucket, key) for every entry of requests now."""
+        now = time.time()
+        with self._lock:
+            for request in requests:
+                self._urls[request] = self._sign(*request, now=now)
+
+    def get(self, method, bucket, key):
+        request = (method, bucket, key)
+        entry = self._urls.get(request)
+        if entry is None or entry[1] <= time.time():
+            with self._lock:
+                entry = self._urls[request] = self._sign(method, bucket, key, time.time())
+        return entry[0]
+
+    def start(self):
+        threading.Thread(target=self._refresh, name="presign-refresh", daemon=True).start()
+
+    def _refresh(self):
+        while True:
+            time.sleep(self.expires * REFRESH_FRACTION)
+            now = time.time()
+            horizon = now + self.expires * 2 * REFRESH_FRACTION
+            with self._lock:
+                for request, (_, use_until) in list(self._urls.items()):
+                    if use_until <= horizon:
+                        self._urls[request] = self._sign(*request, now=now)
+
+    def __len__(self):
+        return len(self._urls)
@@ -5,127 +5,214 @@ Those CSV files should have the .yaml deployment file used to generate that stre
 copied next to it with the same file name but keeping the .yaml extension.
 
 i.e data_2018_09_10_15_50_12.csv should have an associated data_2018_09_10_15_50_12.yaml
+
+Results from the http engine also carry per-phase timings (dns, connect, tls, send, headers,
+body), which get a histogram per host. Intervals where the load generators themselves were
+the bottleneck (scheduling lag or CPU throttling, see loadstats.py) are shaded on the request
+rate plot, or dropped entirely with --exclude-client-bound.
+
+Binary results files made with `python resultsfile.py convert` can be given in place of the
+CSVs (data_2018_09_10_15_50_12.sres next to data_2018_09_10_15_50_12.yaml).
+
+Plots are rendered headless with the Agg backend. All the number crunching happens once in
+the parent process, then every figure is drawn from those precomputed aggregates in its own
+worker process and closed as soon as it has been saved.
 """
 
+import argparse
 import os
 import os.path as op
 import sys
 from operator import itemgetter
+from multiprocessing import Pool
 import datetime
 
 import yaml
 import numpy as np
-import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
-if len(sys.argv) < 2:
-    print("python process_data.py [DATA_FILENAME_1] [DATA_FILENAME_2] [...]")
-    sys.exit(0)
-
-if not op.isdir("plots"):
-    os.mkdir("plots")
+from results import CLIENT_COLUMNS, PHASE_COLUMNS
+from s3errors import classify_message
+from resultsfile import load_results
 
 
-data_files = sys.argv[1:]
-
-for data_file in data_files:
-    if not op.isfile(data_file):
-        print("File does not exist: {}".format(data_file))
-        sys.exit(0)
-
 data = {}
 data_metadata = {}
+client_bound_intervals = {}
+plot_output_prefix = ""
+
+# A request is client-bound if the generator's threads were this late to be scheduled
+# around it, or the pod was CPU throttled while it was in flight. An interval is flagged
+# when more than CLIENT_BOUND_FRACTION of its requests were client-bound.
+CLIENT_LAG_THRESHOLD = 0.05 # seconds
+CLIENT_BOUND_FRACTION = 0.1
+CLIENT_BOUND_PRECISION = 10 # seconds
+
+
+def find_client_bound(csv_data):
+    """
+    Seconds-into-test (start, end) intervals where the load generators rather than the
+    object store limited the results, and a mask of the records inside them.
+    """
+    if not all(name in csv_data for name in CLIENT_COLUMNS) or csv_data["loop_lag"].isna().all():
+        return [], np.zeros(len(csv_data), dtype=bool)
+    bound = (csv_data["loop_lag"] > CLIENT_LAG_THRESHOLD) | (csv_data["throttled"] > 0)
+    start_time = int(csv_data["timestamp"].min())
+    window = ((csv_data["timestamp"] - start_time) // CLIENT_BOUND_PRECISION).astype(int)
+    fraction = bound.groupby(window).mean()
+    flagged = fraction.index[fraction > CLIENT_BOUND_FRACTION]
+    intervals = [(w*CLIENT_BOUND_PRECISION, (w+1)*CLIENT_BOUND_PRECISION) for w in flagged]
+    return intervals, window.isin(flagged).values
+
+
+def load_data(data_files, exclude_client_bound=False):
+    global plot_output_prefix
+
+    just_filename = op.basename(data_files[0])
+    just_name = op.splitext(just_filename)[0]
+    plot_output_prefix = op.join("plots", just_name)
+
+    for data_file in data_files:
+        basename = op.basename(data_file)
+        name, ext = op.splitext(basename)
+        directory = op.split(data_file)[0]
+
+        metadata_file = op.join(directory, name+".yaml")
+        with open(metadata_file, "r") as meta:
+            metadata = yaml.safe_load(meta)
+
+        hostname = ""
+        yaml_env = metadata["spec"]["template"]["spec"]["containers"][0]["env"]
+        pods = metadata["spec"]["replicas"]
+        threads = 0
+        for env_var in yaml_env:
+            if env_var["name"] == "ENDPOINT_HOSTNAME":
+                hostname = env_var["value"]
+            if env_var["name"] == "NUM_THREADS":
+                threads = env_var["value"]
+
+        if hostname in data:
+            # another run against the same endpoint, e.g. a different bucket count
+            hostname = "{} ({})".format(hostname, name)
+        data_metadata[hostname] = {"pods": pods, "threads": threads}
+
+        csv_data = load_results(data_file)
+
+        print("Errors in {} ({}): {}".format(basename, hostname, sum(csv_data["size"] < 0)))
+
+        intervals, mask = find_client_bound(csv_data)
+        client_bound_intervals[hostname] = intervals
+        if intervals:
+            print("Client-bound intervals in {} ({}): {} ({} requests){}".format(
+                basename, hostname, ", ".join("{}-{}s".format(*i) for i in intervals), mask.sum(),
+                ", excluded" if exclude_client_bound else ""))
+            if exclude_client_bound:
+                csv_data = csv_data[~mask]
+        data[hostname] = csv_data
+
+
+def _label(hostname):
+    return "{} {}p*{}t".format(hostname, data_metadata[hostname]["pods"], data_metadata[hostname]["threads"])
+
+
+def _window_counts(timestamps, precision):
+    """
+    Count entries in each [t, t+precision] window from the first to the last timestamp.
+    Windows are inclusive at both ends, the same as pandas' Series.between.
+    """
+    timestamps = np.sort(np.asarray(timestamps, dtype=float))
+    start_time = int(timestamps[0])
+    end_time = int(timestamps[-1])
+    starts = np.arange(start_time, end_time, precision)
+    counts = np.searchsorted(timestamps, starts+precision, side="right") - np.searchsorted(timestamps, starts, side="left")
+    return starts-start_time, counts
+
+
+def _step_hist(ax, counts, edges, **kwargs):
+    """Draw an already binned histogram, looking the same as ax.hist on the raw values."""
+    ax.hist(edges[:-1], bins=edges, weights=counts, **kwargs)
+
+
+def _save(fig, filename):
+    fig.tight_layout()
+    fig.savefig(filename)
+    plt.close(fig)
 
-just_filename = op.basename(data_files[0])
-just_name = op.splitext(just_filename)[0]
-plot_output_prefix = op.join("plots", just_name)
-
-
-for data_file in data_files:
-    basename = op.basename(data_file)
-    name, ext = op.splitext(basename)
-    directory = op.split(data_file)[0]
-
-    metadata_file = op.join(directory, name+".yaml")
-    with open(metadata_file, "r") as meta:
-        metadata = yaml.load(meta)
-
-    hostname = ""
-    yaml_env = metadata["spec"]["template"]["spec"]["containers"][0]["env"]
-    pods = metadata["spec"]["replicas"]
-    threads = 0
-    for env_var in yaml_env:
-        if env_var["name"] == "ENDPOINT_HOSTNAME":
-            hostname = env_var["value"]
-        if env_var["name"] == "NUM_THREADS":
-            threads = env_var["value"]
-
-    data_metadata[hostname] = {"pods": pods, "threads": threads}
-
-    csv_data = pd.read_csv(data_file, index_col=False, header=0)
-    csv_data.columns = ["hostname", "timestamp", "endpoint", "bucket", "size", "duration", "error"]
-
-    print("Errors in {} ({}): {}".format(basename, hostname, sum(csv_data["size"] < 0)))
-    data[hostname] = csv_data
 
-def plot_durations():
+def aggregate_durations():
     ax_max = 5
     for hostname, csv_data in data.items():
         if "mwt" in hostname: continue
         ax_max = max(ax_max, int(max(csv_data["duration"])+2))
-    fig, ax = plt.subplots()
-    ax.grid(True)
     bins = 100
     xaxis_range = (0, ax_max)
 
+    hists = []
     for hostname, csv_data in data.items():
         csv_data = csv_data[csv_data["size"] >= 0]
-        ax.hist(csv_data["duration"], bins=bins, range=xaxis_range, histtype="step", linewidth=2, fill=False, log=True, label="{} {}p*{}t".format(hostname, data_metadata[hostname]["pods"], data_metadata[hostname]["threads"]))
-        
+        counts, edges = np.histogram(csv_data["duration"], bins=bins, range=xaxis_range)
+        hists.append((_label(hostname), counts, edges))
+
+    return render_durations, {"hists": hists,
+                              "xaxis_range": xaxis_range,
+                              "filename": "{}_durhist.png".format(plot_output_prefix)}
+
+
+def render_durations(hists, xaxis_range, filename):
+    fig, ax = plt.subplots()
+    ax.grid(True)
+    for label, counts, edges in hists:
+        _step_hist(ax, counts, edges, histtype="step", linewidth=2, fill=False, log=True, label=label)
 
     ax.set_xlabel("Transfer duration for successes (seconds)")
     ax.set_ylabel("Number of transfers")
     ax.set_xlim(xaxis_range)
     ax.legend()
-    fig.tight_layout()
-    plt.savefig("{}_durhist.png".format(plot_output_prefix))
-
+    _save(fig, filename)
 
 
-def plot_separated_durations():
+def aggregate_separated_durations():
     ax_max = 5
     for hostname, csv_data in data.items():
         ax_max = max(ax_max, int(max(csv_data["duration"])+2))
-    fig, ax = plt.subplots()
-    ax.grid(True)
     bins = 40
     xaxis_range = (0, ax_max)
 
     precision = 90
-    hists = {}
+    hists = []
     for hostname, csv_data in data.items():
-        start_time = int(csv_data["timestamp"].min())
-        end_time = int(csv_data["timestamp"].max())
-        hists[hostname] = {}
+        csv_data = csv_data.sort_values("timestamp")
+        timestamps = csv_data["timestamp"].values
+        durations = csv_data["duration"].values
+        start_time = int(timestamps.min())
+        end_time = int(timestamps.max())
+        windows = []
         for t in range(0, end_time-start_time, precision):
-            d = csv_data[csv_data["timestamp"].between(start_time+t, start_time+t+precision)]
-            hists[hostname][(t, t+precision)] = d
-
-    for hostname, times in hists.items():
-        for (t_s, t_e), d in reversed(list(times.items())):
-        #for (t_s, t_e), d in times.items():
-            if len(d) == 0: continue
-            ax.hist(d["duration"], bins=bins, range=xaxis_range, histtype="barstacked", stacked=True, log=True, label="{}-{}s {} {}p*{}t".format(t_s, t_e, hostname, data_metadata[hostname]["pods"], data_metadata[hostname]["threads"]))
-    #for hostname, csv_data in data.items():
-    #    ax.hist(csv_data["duration"], bins=bins, range=xaxis_range, histtype="step", linewidth=2, fill=False, log=True, label="{} {}p*{}t".format(hostname, data_metadata[hostname]["pods"], data_metadata[hostname]["threads"]))
-        
+            lo = np.searchsorted(timestamps, start_time+t, side="left")
+            hi = np.searchsorted(timestamps, start_time+t+precision, side="right")
+            if hi == lo: continue
+            counts, edges = np.histogram(durations[lo:hi], bins=bins, range=xaxis_range)
+            windows.append(("{}-{}s {}".format(t, t+precision, _label(hostname)), counts, edges))
+        hists.extend(reversed(windows))
+
+    return render_separated_durations, {"hists": hists,
+                                        "xaxis_range": xaxis_range,
+                                        "filename": "{}_sep_durhist.png".format(plot_output_prefix)}
+
+
+def render_separated_durations(hists, xaxis_range, filename):
+    fig, ax = plt.subplots()
+    ax.grid(True)
+    for label, counts, edges in hists:
+        _step_hist(ax, counts, edges, histtype="barstacked", stacked=True, log=True, label=label)
 
     ax.set_xlabel("Transfer duration (seconds)")
     ax.set_ylabel("Number of transfers")
     ax.set_xlim(xaxis_range)
     ax.legend()
-    fig.tight_layout()
-    plt.savefig("{}_sep_durhist.png".format(plot_output_prefix))
+    _save(fig, filename)
 
 
 def plot_rate():
@@ -217,103 +304,285 @@ def transfer_speed_per_pod():
 
 
 
-def requests_per_second():
-    fig, ax = plt.subplots()
-
+def aggregate_requests_per_second():
+    precision = 10 # seconds
+    lines = []
     for hostname, csv_data in data.items():
-        start_time = csv_data["timestamp"].min()
-        end_time = csv_data["timestamp"].max()
-        precision = 10 # seconds
-        reqsps = []
-
-        for t in range(int(start_time), int(end_time), precision):
-            time_into_test = t-int(start_time)
-            filtered_data = csv_data[csv_data["timestamp"].between(t, t+precision)]
-            total_requests = len(filtered_data)
-            reqs_per_s = total_requests/precision
-            reqsps.append((time_into_test, reqs_per_s))
-        
-        ax.plot(*zip(*reqsps), label="{} {}p*{}t".format(hostname, data_metadata[hostname]["pods"], data_metadata[hostname]["threads"]))
+        offsets, counts = _window_counts(csv_data["timestamp"], precision)
+        lines.append((_label(hostname), offsets, counts/precision))
+
+    client_bound = sorted(set(i for intervals in client_bound_intervals.values() for i in intervals))
+    return render_requests_per_second, {"lines": lines,
+                                        "client_bound": client_bound,
+                                        "filename": "{}_reqsps.png".format(plot_output_prefix)}
+
+
+def render_requests_per_second(lines, client_bound, filename):
+    fig, ax = plt.subplots()
+    for label, offsets, reqs_per_s in lines:
+        ax.plot(offsets, reqs_per_s, label=label)
+    for i, (t_s, t_e) in enumerate(client_bound):
+        ax.axvspan(t_s, t_e, color="red", alpha=0.15, linewidth=0, label="client-bound" if i == 0 else None)
 
     ax.set_xlabel("Time into stress test (seconds)")
     ax.set_ylabel("Requests handled per second")
     ax.grid(True)
     ax.set_ylim(bottom=0)
     ax.legend()
-    fig.tight_layout()    
-    plt.savefig("{}_reqsps.png".format(plot_output_prefix))
-
-
-def plot_errors():
+    _save(fig, filename)
+
+
+def error_classes(csv_data):
+    """
+    Series of error class per request, "Success" for successes. Files from before the
+    error_class column get classes from the error messages.
+    """
+    failed = csv_data["size"] < 0
+    if "error_class" in csv_data and csv_data["error_class"].notna().any():
+        classes = csv_data["error_class"].where(failed)
+    else:
+        classes = csv_data["error"].where(failed).dropna().astype(str).map(lambda e: classify_message(e).value)
+        classes = classes.reindex(csv_data.index)
+    return classes.fillna("Success")
+
+
+def aggregate_errors():
+    jobs = []
+    precision = 10
     for hostname in data:
-        fig, ax = plt.subplots()
         csv_data = data[hostname]
-        csv_data = csv_data.replace(np.nan, "Success", regex=True)
-        #if len(csv_data[csv_data["size"] < 0]) == 0:
-        #    print("Skipping {}, no errors".format(hostname))
-        #    continue
+        classes = error_classes(csv_data).values
 
         start_time = csv_data["timestamp"].min()
         end_time = csv_data["timestamp"].max()
-        precision = 10
-
-        print(hostname, set(csv_data["error"]))
-        errs = list(set(csv_data["error"]))
-        errs = sorted(errs, key=lambda x: (x!="Success", x))
+        starts = np.arange(int(start_time), int(end_time), precision)
+
+        errs = sorted(set(classes), key=lambda x: (x!="Success", x))
+        print(hostname, {errtype: int(np.sum(classes == errtype)) for errtype in errs})
+        if "attempt" in csv_data and csv_data["attempt"].notna().any():
+            succeeded = np.sum(classes == "Success")
+            print(hostname, "{} attempts for {} requests, {} succeeded ({:.2f} attempts per success)".format(
+                len(csv_data), int(np.sum(csv_data["attempt"] == 1)), succeeded, len(csv_data) / max(succeeded, 1)))
+        lines = []
         for errtype in errs:
-            errsps = []
-            csv_err = csv_data[csv_data["error"] == errtype]
-
-            for t in range(int(start_time), int(end_time), precision):
-                time_into_test = t-int(start_time)
-                filtered_data = csv_err[csv_err["timestamp"].between(t, t+precision)]
-                #filtered_data = filtered_data[filtered_data["size"] < 0]
-                total_errs = len(filtered_data)
-                errs_per_s = total_errs/precision
-                errsps.append((time_into_test, errs_per_s))
-
-            ax.plot(*zip(*errsps), label="{} {}p*{}t {}".format(hostname, data_metadata[hostname]["pods"], data_metadata[hostname]["threads"], errtype))
-
-        ax.set_xlabel("Time into stress test (seconds)")
-        ax.set_ylabel("Requests per second")
-        ax.grid(True)
-        ax.set_ylim(bottom=0)
-        ax.legend()
-        ax.text(0, 1.01, "{} - {} (UTC)".format(datetime.datetime.utcfromtimestamp(start_time), datetime.datetime.utcfromtimestamp(end_time)), transform=ax.transAxes)
-        fig.tight_layout()
-        plt.savefig("{}_{}_errsps.png".format(plot_output_prefix, hostname.replace(".", "_")))
-
-
-def plot_error_durations():
+            err_times = np.sort(csv_data["timestamp"].values[classes == errtype].astype(float))
+            counts = np.searchsorted(err_times, starts+precision, side="right") - np.searchsorted(err_times, starts, side="left")
+            lines.append(("{} {}".format(_label(hostname), errtype), starts-int(start_time), counts/precision))
+
+        jobs.append((render_errors, {"lines": lines,
+                                     "start_time": start_time,
+                                     "end_time": end_time,
+                                     "filename": "{}_{}_errsps.png".format(plot_output_prefix, hostname.replace(".", "_"))}))
+    return jobs
+
+
+def render_errors(lines, start_time, end_time, filename):
+    fig, ax = plt.subplots()
+    for label, offsets, errs_per_s in lines:
+        ax.plot(offsets, errs_per_s, label=label)
+
+    ax.set_xlabel("Time into stress test (seconds)")
+    ax.set_ylabel("Requests per second")
+    ax.grid(True)
+    ax.set_ylim(bottom=0)
+    ax.legend()
+    ax.text(0, 1.01, "{} - {} (UTC)".format(datetime.datetime.utcfromtimestamp(start_time), datetime.datetime.utcfromtimestamp(end_time)), transform=ax.transAxes)
+    _save(fig, filename)
+
+
+def aggregate_error_durations():
     ax_max = 5
     for hostname, csv_data in data.items():
         if len(csv_data[csv_data["size"] < 0]) == 0:
             continue
         fil = csv_data[csv_data["size"] < 0]
         ax_max = max(ax_max, int(max(fil["duration"])+2))
-    fig, ax = plt.subplots()
-    ax.grid(True)
     bins = 100
     xaxis_range = (0, ax_max)
 
+    hists = []
     for hostname, csv_data in data.items():
         filtered_data = csv_data[csv_data["size"] < 0]
-        ax.hist(filtered_data["duration"], bins=bins, range=xaxis_range, histtype="step", linewidth=2, fill=False, log=True, label="{} {}p*{}t".format(hostname, data_metadata[hostname]["pods"], data_metadata[hostname]["threads"]))
-        
+        counts, edges = np.histogram(filtered_data["duration"], bins=bins, range=xaxis_range)
+        hists.append((_label(hostname), counts, edges))
+
+    return render_error_durations, {"hists": hists,
+                                    "xaxis_range": xaxis_range,
+                                    "filename": "{}_errdurhist.png".format(plot_output_prefix)}
+
+
+def render_error_durations(hists, xaxis_range, filename):
+    fig, ax = plt.subplots()
+    ax.grid(True)
+    for label, counts, edges in hists:
+        _step_hist(ax, counts, edges, histtype="step", linewidth=2, fill=False, log=True, label=label)
 
     ax.set_xlabel("Transfer duration for errors (seconds)")
     ax.set_ylabel("Number of error transfers")
     ax.set_xlim(xaxis_range)
     ax.legend()
-    fig.tight_layout()
-    plt.savefig("{}_errdurhist.png".format(plot_output_prefix))
-
-plot_durations()
-#plot_rate()
-#plot_separate_durations()
-#speed_over_time()
-#transfer_speed_per_pod()
-requests_per_second()
-plot_separated_durations()
-plot_errors()
-plot_error_durations()
+    _save(fig, filename)
+
+
+def aggregate_phases():
+    """One figure per host with a duration histogram for each request phase (http engine only)."""
+    jobs = []
+    bins = 100
+    for hostname, csv_data in data.items():
+        phases = [phase for phase in PHASE_COLUMNS if phase in csv_data and csv_data[phase].notna().any()]
+        if not phases:
+            continue
+        csv_data = csv_data[csv_data["size"] >= 0]
+        ax_max = max(float(np.nanpercentile(csv_data[phase], 99.9)) for phase in phases) * 1.1 or 1.0
+        xaxis_range = (0, ax_max)
+        hists = []
+        for phase in phases:
+            counts, edges = np.histogram(csv_data[phase].dropna(), bins=bins, range=xaxis_range)
+            hists.append((phase, counts, edges))
+        jobs.append((render_phases, {"hists": hists,
+                                     "title": _label(hostname),
+                                     "xaxis_range": xaxis_range,
+                                     "filename": "{}_{}_phases.png".format(plot_output_prefix, hostname.replace(".", "_"))}))
+    return jobs
+
+
+def render_phases(hists, title, xaxis_range, filename):
+    fig, ax = plt.subplots()
+    ax.grid(True)
+    for label, counts, edges in hists:
+        _step_hist(ax, counts, edges, histtype="step", linewidth=2, fill=False, log=True, label=label)
+
+    ax.set_xlabel("Time spent in request phase for successes (seconds)")
+    ax.set_ylabel("Number of transfers")
+    ax.set_xlim(xaxis_range)
+    ax.set_title(title)
+    ax.legend()
+    _save(fig, filename)
+
+
+def aggregate_operations():
+    """One figure per host with a duration histogram per request type, for runs with GETs."""
+    jobs = []
+    bins = 100
+    for hostname, csv_data in data.items():
+        if "op" not in csv_data or not (csv_data["op"] == "GET").any():
+            continue
+        csv_data = csv_data[csv_data["size"] >= 0]
+        ops = csv_data["op"].fillna("PUT")
+        ax_max = float(np.nanpercentile(csv_data["duration"], 99.9)) * 1.1 or 1.0
+        xaxis_range = (0, ax_max)
+        hists = []
+        for op in sorted(ops.unique()):
+            durations = csv_data["duration"][ops == op]
+            counts, edges = np.histogram(durations, bins=bins, range=xaxis_range)
+            hists.append(("{} ({} requests)".format(op, len(durations)), counts, edges))
+        jobs.append((render_operations, {"hists": hists,
+                                         "title": _label(hostname),
+                                         "xaxis_range": xaxis_range,
+                                         "filename": "{}_{}_ops.png".format(plot_output_prefix, hostname.replace(".", "_"))}))
+    return jobs
+
+
+def render_operations(hists, title, xaxis_range, filename):
+    fig, ax = plt.subplots()
+    ax.grid(True)
+    for label, counts, edges in hists:
+        _step_hist(ax, counts, edges, histtype="step", linewidth=2, fill=False, log=True, label=label)
+
+    ax.set_xlabel("Transfer duration for successes (seconds)")
+    ax.set_ylabel("Number of transfers")
+    ax.set_xlim(xaxis_range)
+    ax.set_title(title)
+    ax.legend()
+    _save(fig, filename)
+
+
+def aggregate_buckets():
+    """
+    Successful requests per second against the number of buckets written, one point per
+    data file, when any run spread its writes over more than one bucket (BUCKET_COUNT).
+    """
+    points = []
+    for hostname, csv_data in data.items():
+        successes = csv_data[csv_data["size"] >= 0]
+        duration = csv_data["timestamp"].max() - csv_data["timestamp"].min()
+        if len(successes) == 0 or duration <= 0:
+            continue
+        points.append((successes["bucket"].nunique(), len(successes) / duration, _label(hostname)))
+    if not any(n > 1 for n, _, _ in points):
+        return None
+    points.sort()
+    for n, rate, label in points:
+        print("{}: {} buckets, {:.1f} successful requests/s".format(label, n, rate))
+    return render_buckets, {"points": points,
+                            "filename": "{}_buckets.png".format(plot_output_prefix)}
+
+
+def render_buckets(points, filename):
+    fig, ax = plt.subplots()
+    ax.plot([n for n, _, _ in points], [rate for _, rate, _ in points], marker="o")
+    for n, rate, label in points:
+        ax.annotate(label, (n, rate), fontsize="small")
+    ax.set_xscale("log")
+    ax.set_xlabel("Number of buckets written")
+    ax.set_ylabel("Successful requests per second")
+    ax.grid(True)
+    ax.set_ylim(bottom=0)
+    _save(fig, filename)
+
+
+def _render(job):
+    render, kwargs = job
+    render(**kwargs)
+    return kwargs["filename"]
+
+
+def render_all(jobs, processes=None):
+    """Render each (render_function, kwargs) job in its own worker process."""
+    if processes is None:
+        processes = min(len(jobs), os.cpu_count() or 1)
+    with Pool(processes=max(processes, 1), maxtasksperchild=1) as pool:
+        for filename in pool.imap_unordered(_render, jobs):
+            print("Saved {}".format(filename))
+
+
+def main():
+    parser = argparse.ArgumentParser(usage="python process_data.py [--exclude-client-bound] [DATA_FILENAME_1] [DATA_FILENAME_2] [...]")
+    parser.add_argument("data_files", nargs="+")
+    parser.add_argument("--exclude-client-bound", action="store_true",
+                        help="drop intervals where the load generators were CPU or GIL bound")
+    args = parser.parse_args()
+
+    if not op.isdir("plots"):
+        os.mkdir("plots")
+
+    data_files = args.data_files
+
+    for data_file in data_files:
+        if not op.isfile(data_file):
+            print("File does not exist: {}".format(data_file))
+            sys.exit(0)
+
+    load_data(data_files, args.exclude_client_bound)
+
+    jobs = []
+    jobs.append(aggregate_durations())
+    #plot_rate()
+    #plot_separate_durations()
+    #speed_over_time()
+    #transfer_speed_per_pod()
+    jobs.append(aggregate_requests_per_second())
+    jobs.append(aggregate_separated_durations())
+    jobs.extend(aggregate_errors())
+    jobs.append(aggregate_error_durations())
+    jobs.extend(aggregate_phases())
+    jobs.extend(aggregate_operations())
+    buckets_job = aggregate_buckets()
+    if buckets_job is not None:
+        jobs.append(buckets_job)
+
+    render_all(jobs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Low-overhead sampling profiler for the load generators.
+
+A daemon thread wakes every interval seconds during a configurable window, walks the
+stack of every other thread with sys._current_frames() and counts identical stacks. No
+tracing hooks are installed, so the workers run at full speed and the profile reflects
+real load rather than a restart under cProfile.
+
+Samples are wall-clock: a thread blocked in a socket call shows up under that call, which
+is how to tell waiting on the endpoint apart from CPU spent on payloads, signing, logging
+or CSV formatting.
+
+Output, for <prefix> = <dir>/profile-<host>-<pid>:
+    <prefix>.collapsed     "thread;outer (file:line);...;inner (file:line) count" lines for
+                           flamegraph.pl / speedscope, or <prefix>.speedscope.json
+    <prefix>.summary.txt   self and total samples per function, busiest first
+"""
+
+import collections
+import json
+import logging
+import os
+import os.path as op
+import platform
+import re
+import sys
+import threading
+import time
+
+# Helper threads that only ever sleep, left out of the profile
+IGNORED_THREADS = ("lag-monitor", "presign-refresh")
+
+
+class SamplingProfiler(threading.Thread):
+
+    def __init__(self, directory, duration, delay=0, interval=0.005, fmt="collapsed", logger=None):
+        threading.Thread.__init__(self, name="sampling-profiler", daemon=True)
+        self.prefix = op.join(directory, "profile-{}-{}".format(platform.node(), os.getpid()))
+        self.duration = duration
+        self.delay = delay
+        self.interval = interval
+        self.fmt = fmt
+        self.logger = logger or logging.getLogger()
+        self.stacks = collections.Counter()
+        self.samples = 0
+
+    def run(self):
+        time.sleep(self.delay)
+        self.logger.info("Profiling for %ds, writing %s.*", self.duration, self.prefix)
+        me = threading.get_ident()
+        names = {}
+        end = time.monotonic() + self.duration
+        while time.monotonic() < end:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                name = names.get(ident)
+                if name is None:
+                    # worker threads differ only by number, fold them together
+                    names.update((t.ident, re.sub(r"\d+", "N", t.name)) for t in threading.enumerate())
+                    name = names.get(ident, "unknown")
+                if name in IGNORED_THREADS:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("{} ({}:{})".format(code.co_name, op.basename(code.co_filename), code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+        self.write()
+
+    def summary(self):
+        """(function, self samples, total samples) sorted by self samples."""
+        self_counts = collections.Counter()
+        total_counts = collections.Counter()
+        for stack, n in self.stacks.items():
+            self_counts[stack[-1]] += n
+            for function in set(stack[1:]):
+                total_counts[function] += n
+        return sorted(((f, self_counts[f], total_counts[f]) for f in total_counts), key=lambda x: (-x[1], -x[2]))
+
+    def write(self):
+        if self.fmt == "speedscope":
+            self._write_speedscope(self.prefix + ".speedscope.json")
+        else:
+            with open(self.prefix + ".collapsed", "w") as f:
+                for stack, n in self.stacks.most_common():
+                    f.write("{} {}\n".format(";".join(stack), n))
+
+        total = sum(self.stacks.values()) or 1
+        summary = self.summary()
+        with open(self.prefix + ".summary.txt", "w") as f:
+            f.write("{} stack samples over {} ticks\n".format(total, self.samples))
+            f.write("{:>8} {:>7} {:>8} {:>7}  function\n".format("self", "self%", "total", "total%"))
+            for function, self_n, total_n in summary:
+                f.write("{:>8} {:>6.1f}% {:>8} {:>6.1f}%  {}\n".format(self_n, 100.0*self_n/total, total_n, 100.0*total_n/total, function))
+
+        self.logger.info("Profile written to %s.*, top functions by self samples:", self.prefix)
+        for function, self_n, total_n in summary[:15]:
+            self.logger.info("  %5.1f%% self %5.1f%% total  %s", 100.0*self_n/total, 100.0*total_n/total, function)
+
+    def _write_speedscope(self, path):
+        frames = []
+        index = {}
+        samples = []
+        weights = []
+        for stack, n in self.stacks.items():
+            sample = []
+            for function in stack:
+                if function not in index:
+                    index[function] = len(frames)
+                    frames.append({"name": function})
+                sample.append(index[function])
+            samples.append(sample)
+            weights.append(n)
+        profile = {"$schema": "https://www.speedscope.app/file-format-schema.json",
+                   "shared": {"frames": frames},
+                   "profiles": [{"type": "sampled",
+                                 "name": op.basename(self.prefix),
+                                 "unit": "none",
+                                 "startValue": 0,
+                                 "endValue": sum(weights),
+                                 "samples": samples,
+                                 "weights": weights}]}
+        with open(path, "w") as f:
+            json.dump(profile, f)
@@ -7,6 +7,8 @@ import random
 import string
 import argparse
 
+import sites
+
 # np.random.normal()
 
 """
@@ -18,13 +20,22 @@ parser.add_argument("-p", "--profile", help="boto credential profile")
 parser.add_argument("-k", "--key", dest="accesskey", help="access key")
 parser.add_argument("-s", "--secret", dest="secretkey", help="access secret")
 parser.add_argument("-j", "--hostname", dest="hostname", help="hostname of endpoint")
+parser.add_argument("--site", help="take the endpoint and keys from this site of the registry, see sites.py")
 args = parser.parse_args()
 
+port = None
+is_secure = True
+if args.site:
+    site = sites.get_site(args.site)
+    args.accesskey, args.secretkey = sites.CredentialCache().get(site)
+    args.hostname, port, is_secure = site.endpoint, site.port, site.secure
+
 conn = boto.connect_s3(
         aws_access_key_id = args.accesskey,
         aws_secret_access_key = args.secretkey,
         host = args.hostname,
-        is_secure = True,
+        port = port,
+        is_secure = is_secure,
         calling_format = boto.s3.connection.OrdinaryCallingFormat(),
         )
 
@@ -0,0 +1,123 @@
+"""
+Token-bucket pacing of the load generators' offered load.
+
+Without it the only knobs are the number of threads and pods, which give whatever rate
+the endpoint happens to allow. RateLimiter holds an operations budget and a bytes budget,
+shared by all threads in the process; each request takes one op and its size in bytes
+before it starts.
+
+A request that finds a bucket short takes its tokens anyway, leaving the bucket in debt,
+and sleeps until the debt would have been paid off. Waits are worked out against the
+bucket rather than the clock after the last sleep, so sleep overshoot doesn't add up and
+the long-run rate stays on target at tens of thousands of requests per second.
+
+Targets are for the whole fleet: with the rate divided by the fleet size (the number of
+pods in the deployment), "2G" bytes/sec over 20 pods gives each pod 100 MB/s.
+
+    python ratelimit.py --bench 20000 --threads 8
+"""
+
+import argparse
+import re
+import threading
+import time
+
+_RATE = re.compile(r"\s*([0-9.]+(?:e[0-9]+)?)\s*([kKMGT]i?)?B?(?:/s)?\s*\Z")
+_MULTIPLIERS = {None: 1, "k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9, "T": 1e12,
+                "ki": 2**10, "Ki": 2**10, "Mi": 2**20, "Gi": 2**30, "Ti": 2**40}
+
+
+def parse_rate(text):
+    """Rate per second from e.g. "500", "2G", "2GB/s", "100Mi". Decimal unless the suffix has an i."""
+    match = _RATE.match(str(text))
+    if match is None:
+        raise ValueError("Can't read {!r} as a rate".format(text))
+    return float(match.group(1)) * _MULTIPLIERS[match.group(2)]
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(1.0, self.rate * 0.1)
+        self._lock = threading.Lock()
+        # start empty so a run doesn't open with a burst above the target
+        self._tokens = 0.0
+        self._last = time.monotonic()
+
+    def reserve(self, n=1):
+        """Take n tokens, going into debt if short, and return how long to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class RateLimiter:
+    """
+    Ops and bytes per second budgets for one process. Either can be None for no limit.
+    fleet_size divides both between that many processes running the same target.
+    """
+
+    def __init__(self, ops_per_sec=None, bytes_per_sec=None, fleet_size=1):
+        self.ops = TokenBucket(ops_per_sec / fleet_size) if ops_per_sec else None
+        # a burst of 0.1s worth of bytes, but at least one large object
+        self.bytes = TokenBucket(bytes_per_sec / fleet_size, max(bytes_per_sec / fleet_size * 0.1, 2**26)) if bytes_per_sec else None
+
+    def __bool__(self):
+        return self.ops is not None or self.bytes is not None
+
+    def acquire(self, nbytes=0, ops=1):
+        """
+        Block until a request of nbytes may start; returns the seconds waited. A GET whose
+        size isn't known in advance takes its op first and its bytes afterwards, with ops=0.
+        """
+        wait = 0.0
+        if self.ops is not None and ops:
+            wait = self.ops.reserve(ops)
+        if self.bytes is not None and nbytes > 0:
+            wait = max(wait, self.bytes.reserve(nbytes))
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def __str__(self):
+        parts = []
+        if self.ops is not None:
+            parts.append("{:.1f} ops/sec".format(self.ops.rate))
+        if self.bytes is not None:
+            parts.append("{:.1f} MB/sec".format(self.bytes.rate / 1e6))
+        return ", ".join(parts) or "unlimited"
+
+
+def bench(rate, threads, seconds):
+    """Achieved rate with threads all acquiring as fast as they can."""
+    limiter = RateLimiter(ops_per_sec=rate)
+    counts = [0] * threads
+    end = time.monotonic() + seconds
+
+    def run(i):
+        while time.monotonic() < end:
+            limiter.acquire()
+            counts[i] += 1
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    achieved = sum(counts) / (time.monotonic() - start)
+    print("target {:.0f} ops/sec, achieved {:.0f} ops/sec ({:+.2f}%)".format(rate, achieved, 100.0 * (achieved / rate - 1)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token bucket accuracy check")
+    parser.add_argument("--bench", type=parse_rate, default=20000, metavar="RATE", help="ops/sec to aim for")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+    bench(args.bench, args.threads, args.seconds)
@@ -0,0 +1,39 @@
+"""
+Layout of the per-request result records sent by the load generators.
+
+mkobjects2.py sends one CSV line per request over UDP to the collector (see dashboard.py).
+The first seven columns are the original layout. Later columns are only ever appended, so
+a line with N fields always holds the first N names of COLUMNS and older files stay
+readable by resultsfile.py and process_data.py.
+
+This module is imported by the load generators, so keep it free of anything but the
+standard library.
+"""
+
+BASE_COLUMNS = ["hostname", "timestamp", "endpoint", "bucket", "size", "duration", "error"]
+
+# Seconds spent in each phase of a request made by the http engine (s3http.py): name
+# resolution, TCP connect, TLS handshake, sending the request and body, waiting for the
+# response headers and reading the response body. Empty for the boto engine.
+PHASE_COLUMNS = ["dns", "connect", "tls", "send", "headers", "body"]
+
+# Client-side load when the request was made (loadstats.py): requests in flight in the
+# process, worst thread scheduling lag in seconds and seconds of cgroup CPU throttling.
+CLIENT_COLUMNS = ["in_flight", "loop_lag", "throttled"]
+
+# Failure class from s3errors.py (empty on success) and which attempt at the request this
+# was, from 1; each retry is sent as its own record.
+RETRY_COLUMNS = ["error_class", "attempt"]
+
+# Index of the object's key from keygen.py, for regenerating its name without a listing.
+KEY_COLUMNS = ["key_index"]
+
+# Request type, PUT or GET (popularity.py workloads); empty in older records means PUT.
+OP_COLUMNS = ["op"]
+
+COLUMNS = BASE_COLUMNS + PHASE_COLUMNS + CLIENT_COLUMNS + RETRY_COLUMNS + KEY_COLUMNS + OP_COLUMNS
+
+
+def format_record(values):
+    """CSV line for one result; None becomes an empty field and commas are kept out of strings."""
+    return ",".join("" if v is None else str(v).replace(",", ";").replace("\n", " ") for v in values)
@@ -0,0 +1,363 @@
+"""
+Compact columnar binary format for stress test results.
+
+The text CSVs written from the port 5050 feed (hostname, timestamp, endpoint, bucket,
+size, duration, error) are re-parsed on every analysis pass. This format stores each
+column as one contiguous fixed-width array: timestamps as float64, durations as float32,
+sizes as int64, and hostname/endpoint/bucket/error as small integer codes into a string
+dictionary. The reader memory-maps the file so every column comes back as a read-only
+NumPy array with no copy and no parsing.
+
+File layout (little endian):
+    8 bytes   magic "SOSRES01"
+    4 bytes   uint32 length of the JSON header
+    N bytes   JSON header: row count plus name, dtype, offset and dictionary per column
+    ...       column arrays, each starting on an 8 byte boundary
+
+Usage:
+    python resultsfile.py convert data_2018_09_10_15_50_12.csv [out.sres]
+    python resultsfile.py info data_2018_09_10_15_50_12.sres
+
+From Python (process_data.py, the notebooks):
+    from resultsfile import load_results, ResultsFile
+    df = load_results("data_2018_09_10_15_50_12.sres")   # also accepts the CSV
+    with ResultsFile("data_2018_09_10_15_50_12.sres") as res:
+        durations = res["duration"]                        # zero-copy np.ndarray
+"""
+
+import argparse
+import json
+import mmap
+import os.path as op
+import struct
+import sys
+import tempfile
+
+import numpy as np
+
+from results import CLIENT_COLUMNS, COLUMNS, PHASE_COLUMNS
+
+MAGIC = b"SOSRES01"
+EXTENSION = ".sres"
+
+NUMERIC_DTYPES = {"timestamp": "<f8", "size": "<i8", "duration": "<f4"}
+NUMERIC_DTYPES.update((name, "<f4") for name in PHASE_COLUMNS + CLIENT_COLUMNS + ["attempt"])
+# key indices are below 2**53, so float64 holds them exactly and can still be NaN
+NUMERIC_DTYPES["key_index"] = "<f8"
+STRING_COLUMNS = ["hostname", "endpoint", "bucket", "error", "error_class", "op"]
+
+# Older CSV layouts, keyed by column count. Anything with 7 or more columns is the
+# mkobjects2.py layout, see results.py.
+LEGACY_SCHEMAS = {
+    5: ["timestamp", "endpoint", "bucket", "size", "duration"],  # mkobjects.py
+    4: ["timestamp", "endpoint", "size", "duration"],            # mkload.py, notebooks
+}
+
+
+def csv_columns(n):
+    """Column names for a CSV line with n fields."""
+    if 7 <= n <= len(COLUMNS):
+        return COLUMNS[:n]
+    return LEGACY_SCHEMAS.get(n)
+
+
+def _code_dtype(n):
+    if n <= 2**8:
+        return "<u1"
+    if n <= 2**16:
+        return "<u2"
+    return "<u4"
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def encode_strings(values):
+    """Dictionary-encode a sequence of strings, returning (dictionary, codes)."""
+    dictionary, codes = np.unique(np.asarray(values, dtype=object).astype(str), return_inverse=True)
+    dictionary = [str(s) for s in dictionary]
+    return dictionary, codes.astype(_code_dtype(len(dictionary)))
+
+
+def write_results(path, columns):
+    """
+    Write a dict of column name -> array-like to path.
+
+    Numeric columns are stored with the dtype from NUMERIC_DTYPES (or their own dtype if
+    unknown), anything else is dictionary-encoded as strings. Missing values in the error
+    column should be given as empty strings.
+    """
+    rows = None
+    descs = []
+    arrays = []
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if name in STRING_COLUMNS or values.dtype.kind not in "iuf":
+            dictionary, array = encode_strings(values)
+        else:
+            array = np.ascontiguousarray(values, dtype=NUMERIC_DTYPES.get(name, values.dtype))
+            dictionary = None
+        if rows is None:
+            rows = len(array)
+        elif len(array) != rows:
+            raise ValueError("Column {} has {} rows, expected {}".format(name, len(array), rows))
+        descs.append({"name": name, "dtype": array.dtype.str, "dictionary": dictionary})
+        arrays.append(array)
+
+    header = _header(rows or 0, descs, [array.nbytes for array in arrays])
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header)))
+        f.write(header)
+        for desc, array in zip(descs, arrays):
+            f.write(b"\0" * (desc["offset"] - f.tell()))
+            f.write(array.tobytes())
+
+
+def _header(rows, descs, sizes):
+    """Encoded JSON header, after filling in each column's offset from its size in bytes."""
+    # Offsets depend on the header length, which depends on the offsets. Grow the reserved
+    # header space until the encoded header fits, padding any slack with spaces.
+    header_len = 0
+    while True:
+        offset = _align(len(MAGIC) + 4 + header_len)
+        for desc, size in zip(descs, sizes):
+            desc["offset"] = offset
+            offset = _align(offset + size)
+        header = json.dumps({"rows": rows, "columns": descs}, separators=(",", ":")).encode("utf-8")
+        if len(header) <= header_len:
+            break
+        header_len = len(header)
+    return header.ljust(header_len)
+
+
+class ResultsWriter:
+    """
+    Writes a results file a batch of rows at a time, for when the rows don't all fit in
+    memory at once. Each column is spooled to its own temporary file (string columns as
+    codes into a dictionary that grows as new strings come in) and close() assembles the
+    file from them, so memory is bounded by the string dictionaries, not the row count.
+
+        with ResultsWriter("run.sres") as writer:
+            for batch in batches:
+                writer.append(batch)    # dict of column name -> array-like, like write_results
+    """
+
+    def __init__(self, path, names=COLUMNS, chunk_rows=1 << 20):
+        self.path = path
+        self.names = list(names)
+        self.chunk_rows = chunk_rows
+        self.rows = 0
+        self._dictionaries = {name: {} for name in self.names if name in STRING_COLUMNS}
+        for name in self.names:
+            if name not in STRING_COLUMNS and name not in NUMERIC_DTYPES:
+                raise ValueError("Don't know how to store column {}".format(name))
+        self._spools = {name: tempfile.TemporaryFile(dir=op.dirname(op.abspath(path))) for name in self.names}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def append(self, columns):
+        lengths = {len(columns[name]) for name in self.names}
+        if len(lengths) != 1:
+            raise ValueError("Columns have different lengths: {}".format(sorted(lengths)))
+        for name in self.names:
+            values = columns[name]
+            dictionary = self._dictionaries.get(name)
+            if dictionary is not None:
+                array = np.fromiter((dictionary.setdefault(str(value), len(dictionary)) for value in values),
+                                    dtype="<u4", count=len(values))
+            else:
+                array = np.ascontiguousarray(values, dtype=NUMERIC_DTYPES[name])
+            self._spools[name].write(array.tobytes())
+        self.rows += lengths.pop()
+
+    def close(self):
+        descs = []
+        sizes = []
+        for name in self.names:
+            dictionary = self._dictionaries.get(name)
+            if dictionary is None:
+                dtype, strings = np.dtype(NUMERIC_DTYPES[name]), None
+            else:
+                dtype, strings = np.dtype(_code_dtype(len(dictionary))), sorted(dictionary, key=dictionary.get)
+            descs.append({"name": name, "dtype": dtype.str, "dictionary": strings})
+            sizes.append(self.rows * dtype.itemsize)
+        header = _header(self.rows, descs, sizes)
+        with open(self.path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            for desc in descs:
+                f.write(b"\0" * (desc["offset"] - f.tell()))
+                spool = self._spools[desc["name"]]
+                spool.seek(0)
+                spool_dtype = np.dtype("<u4" if desc["dictionary"] is not None else desc["dtype"])
+                while True:
+                    chunk = spool.read(self.chunk_rows * spool_dtype.itemsize)
+                    if not chunk:
+                        break
+                    f.write(np.frombuffer(chunk, dtype=spool_dtype).astype(desc["dtype"]).tobytes())
+        self._discard()
+
+    def _discard(self):
+        for spool in self._spools.values():
+            spool.close()
+        self._spools = {}
+
+
+class ResultsFile:
+    """Memory-mapped reader. Indexing by column name returns a zero-copy NumPy array."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError("{} is not a results file".format(path))
+            header_len, = struct.unpack("<I", f.read(4))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+            if header["rows"]:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._mmap = None
+        self.rows = header["rows"]
+        self._columns = {desc["name"]: desc for desc in header["columns"]}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # Arrays handed out keep their own reference to the mapping, so it is only
+        # unmapped once the last of them is garbage collected.
+        self._mmap = None
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def __contains__(self, name):
+        return name in self._columns
+
+    def __getitem__(self, name):
+        """Raw column: values for numeric columns, dictionary codes for string columns."""
+        desc = self._columns[name]
+        if self._mmap is None:
+            return np.empty(0, dtype=desc["dtype"])
+        return np.frombuffer(self._mmap, dtype=desc["dtype"], count=self.rows, offset=desc["offset"])
+
+    def dictionary(self, name):
+        return self._columns[name]["dictionary"]
+
+    def strings(self, name):
+        """Decode a string column into an object array."""
+        dictionary = np.asarray(self.dictionary(name), dtype=object)
+        # empty means missing, as it reads from a CSV
+        if name in ("error", "error_class", "op"):
+            dictionary[dictionary == ""] = np.nan
+        return dictionary[self[name]]
+
+    def to_dataframe(self, columns=None):
+        import pandas as pd
+
+        frame = {}
+        for name in columns or self.columns:
+            if self.dictionary(name) is None:
+                frame[name] = self[name]
+            else:
+                frame[name] = self.strings(name)
+        return pd.DataFrame(frame)
+
+
+def read_csv(path):
+    """Read any of the results CSV layouts into a DataFrame with COLUMNS names."""
+    import pandas as pd
+
+    with open(path) as f:
+        first = f.readline()
+    fields = first.rstrip("\r\n").split(",")
+    try:
+        float(fields[1] if len(fields) >= 7 else fields[0])
+        header = None
+    except (ValueError, IndexError):
+        header = 0
+    names = csv_columns(len(fields))
+    if names is None:
+        raise ValueError("Don't know the layout of {} ({} columns)".format(path, len(fields)))
+    dtype = {name: object for name in STRING_COLUMNS if name in names}
+    return pd.read_csv(path, index_col=False, header=header, names=names, dtype=dtype)
+
+
+def load_results(path, columns=None):
+    """Load a results file (CSV or binary) as a DataFrame with COLUMNS names."""
+    if is_results_file(path):
+        with ResultsFile(path) as res:
+            return res.to_dataframe(columns)
+    csv_data = read_csv(path)
+    return csv_data[columns] if columns else csv_data
+
+
+def is_results_file(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def convert_csv(csv_path, out_path=None):
+    """Convert a results CSV to the binary format, returning the output path."""
+    if out_path is None:
+        out_path = op.splitext(csv_path)[0] + EXTENSION
+    csv_data = read_csv(csv_path)
+    columns = {}
+    for name in COLUMNS:
+        if name in csv_data:
+            values = csv_data[name]
+        elif name in STRING_COLUMNS:
+            values = [""] * len(csv_data)
+        else:
+            continue
+        if name in STRING_COLUMNS:
+            values = values.fillna("") if hasattr(values, "fillna") else values
+        columns[name] = np.asarray(values)
+    write_results(out_path, columns)
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and inspect binary results files")
+    subparsers = parser.add_subparsers(dest="command")
+    convert_parser = subparsers.add_parser("convert", help=convert_csv.__doc__)
+    convert_parser.add_argument("csv_file")
+    convert_parser.add_argument("out_file", nargs="?")
+    info_parser = subparsers.add_parser("info", help="Print the columns of a results file")
+    info_parser.add_argument("results_file")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        out_path = convert_csv(args.csv_file, args.out_file)
+        print("{} -> {} ({} -> {} bytes)".format(args.csv_file, out_path, op.getsize(args.csv_file), op.getsize(out_path)))
+    elif args.command == "info":
+        with ResultsFile(args.results_file) as res:
+            print("{}: {} rows".format(args.results_file, len(res)))
+            for name in res.columns:
+                dictionary = res.dictionary(name)
+                extra = " ({} distinct)".format(len(dictionary)) if dictionary is not None else ""
+                print("  {:<10} {}{}".format(name, res[name].dtype, extra))
+    else:
+        parser.print_help()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
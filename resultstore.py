@@ -0,0 +1,203 @@
+"""
+Time-indexed store over stress test results for fast window and host slicing.
+
+Records are kept sorted by timestamp. A sparse block index (the first timestamp of every
+BLOCK_SIZE rows) narrows a time window down to a couple of blocks before the final binary
+search, and every dictionary-encoded column (hostname, endpoint, bucket, error) has a
+posting list of row numbers per value. A query such as
+
+    store = ResultStore.load("data_2018_09_10_15_50_12.sres")
+    store.select(endpoint="s3.echo.stfc.ac.uk", start="14:00", end="14:10", errors=True)
+
+binary searches the window, trims each posting list to it and intersects them, touching
+only the matching rows rather than scanning every column.
+
+Times can be epoch seconds, datetimes, ISO strings or "HH:MM[:SS]" (UTC, on the day the
+run started). A store built from a CSV can be saved sorted in the binary format so later
+loads come straight off the memory map without re-sorting.
+"""
+
+import datetime
+
+import numpy as np
+
+from resultsfile import ResultsFile, STRING_COLUMNS, encode_strings, is_results_file, load_results, write_results
+
+BLOCK_SIZE = 4096
+
+
+class ResultStore:
+
+    def __init__(self, columns, dictionaries=None, block_size=BLOCK_SIZE):
+        """
+        columns maps name -> array. String columns are either given as dictionary codes with
+        their dictionary in dictionaries, or as plain strings and encoded here.
+        """
+        dictionaries = dict(dictionaries or {})
+        self.columns = {}
+        for name, values in columns.items():
+            values = np.asarray(values)
+            if name in STRING_COLUMNS and name not in dictionaries:
+                if name == "error":
+                    values = np.where(values == values, values, "")  # NaN -> ""
+                dictionaries[name], values = encode_strings(values)
+            self.columns[name] = values
+        self.dictionaries = dictionaries
+
+        timestamps = self.columns["timestamp"]
+        if len(timestamps) and np.any(timestamps[1:] < timestamps[:-1]):
+            order = np.argsort(timestamps, kind="stable")
+            self.columns = {name: values[order] for name, values in self.columns.items()}
+            timestamps = self.columns["timestamp"]
+        self.timestamps = timestamps
+
+        self.block_size = block_size
+        self._block_index = timestamps[::block_size]
+
+        self._postings = {}
+        for name, dictionary in self.dictionaries.items():
+            codes = self.columns[name]
+            order = np.argsort(codes, kind="stable")
+            bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(dictionary)))))
+            self._postings[name] = {value: order[bounds[i]:bounds[i+1]] for i, value in enumerate(dictionary)}
+
+        if "size" in self.columns:
+            self._errors = np.flatnonzero(self.columns["size"] < 0)
+        else:
+            self._errors = self._postings["error"].get("", np.empty(0, dtype=np.intp))
+            self._errors = np.setdiff1d(np.arange(len(self)), self._errors, assume_unique=True)
+
+    @classmethod
+    def load(cls, path, block_size=BLOCK_SIZE):
+        """Build a store from a results CSV or binary results file."""
+        if is_results_file(path):
+            res = ResultsFile(path)
+            return cls({name: res[name] for name in res.columns},
+                       {name: res.dictionary(name) for name in res.columns if res.dictionary(name) is not None},
+                       block_size=block_size)
+        csv_data = load_results(path)
+        return cls({name: csv_data[name].values for name in csv_data.columns}, block_size=block_size)
+
+    def save(self, path):
+        """Write the records, sorted by time, as a binary results file."""
+        columns = {}
+        for name, values in self.columns.items():
+            if name in self.dictionaries:
+                values = np.asarray(self.dictionaries[name], dtype=object)[values]
+            columns[name] = values
+        write_results(path, columns)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def values(self, name):
+        """Distinct values of a string column."""
+        return list(self.dictionaries[name])
+
+    @property
+    def start_time(self):
+        return float(self.timestamps[0])
+
+    @property
+    def end_time(self):
+        return float(self.timestamps[-1])
+
+    def to_epoch(self, when):
+        if when is None or isinstance(when, (int, float, np.integer, np.floating)):
+            return when
+        if isinstance(when, datetime.datetime):
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=datetime.timezone.utc)
+            return when.timestamp()
+        if isinstance(when, str) and "T" not in when and "-" not in when:
+            parts = [int(p) for p in when.split(":")]
+            day = datetime.datetime.fromtimestamp(self.start_time, datetime.timezone.utc).date()
+            when = datetime.datetime(day.year, day.month, day.day, *parts, tzinfo=datetime.timezone.utc)
+            return when.timestamp()
+        return self.to_epoch(datetime.datetime.fromisoformat(when))
+
+    def _search(self, t, side):
+        """Row number for time t, binary searching the block index then a single block."""
+        block = np.searchsorted(self._block_index, t, side=side)
+        lo = max(block-1, 0) * self.block_size
+        hi = min(block * self.block_size + 1, len(self))
+        return lo + int(np.searchsorted(self.timestamps[lo:hi], t, side=side))
+
+    def row_range(self, start=None, end=None):
+        """Rows [lo, hi) with start <= timestamp < end."""
+        start = self.to_epoch(start)
+        end = self.to_epoch(end)
+        lo = 0 if start is None else self._search(start, "left")
+        hi = len(self) if end is None else self._search(end, "left")
+        return lo, max(lo, hi)
+
+    def query(self, start=None, end=None, errors=None, **filters):
+        """
+        Row numbers matching a time window and column filters, in time order.
+
+        filters are column=value (or column=[values]) for the string columns. errors=True
+        keeps only failed requests, errors=False only successes.
+        """
+        lo, hi = self.row_range(start, end)
+        lists = []
+        for name, wanted in filters.items():
+            if wanted is None:
+                continue
+            if isinstance(wanted, str):
+                wanted = [wanted]
+            postings = [self._trim(self._postings[name].get(value), lo, hi) for value in wanted]
+            postings = [p for p in postings if len(p)]
+            lists.append(np.sort(np.concatenate(postings)) if len(postings) > 1 else (postings[0] if postings else np.empty(0, dtype=np.intp)))
+
+        if errors is not None:
+            error_rows = self._trim(self._errors, lo, hi)
+            if errors:
+                lists.append(error_rows)
+            elif not lists:
+                return np.setdiff1d(np.arange(lo, hi), error_rows, assume_unique=True)
+            else:
+                lists[0] = np.setdiff1d(lists[0], error_rows, assume_unique=True)
+
+        if not lists:
+            return np.arange(lo, hi)
+
+        lists.sort(key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if not len(rows):
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    @staticmethod
+    def _trim(posting, lo, hi):
+        if posting is None:
+            return np.empty(0, dtype=np.intp)
+        return posting[np.searchsorted(posting, lo):np.searchsorted(posting, hi)]
+
+    def count(self, start=None, end=None, errors=None, **filters):
+        return len(self.query(start, end, errors, **filters))
+
+    def column(self, name, rows):
+        """Values of one column for the given rows, with strings decoded."""
+        values = self.columns[name][rows]
+        if name in self.dictionaries:
+            values = np.asarray(self.dictionaries[name], dtype=object)[values]
+        return values
+
+    def select(self, start=None, end=None, errors=None, columns=None, **filters):
+        """query() as a pandas DataFrame."""
+        import pandas as pd
+
+        rows = self.query(start, end, errors, **filters)
+        return pd.DataFrame({name: self.column(name, rows) for name in columns or self.columns})
+
+    def rate(self, precision=10, start=None, end=None, errors=None, **filters):
+        """(seconds into window, requests per second) over fixed windows of the matching rows."""
+        rows = self.query(start, end, errors, **filters)
+        timestamps = self.timestamps[rows]
+        t0 = self.to_epoch(start) if start is not None else self.start_time
+        t1 = self.to_epoch(end) if end is not None else self.end_time
+        edges = np.arange(t0, t1 + precision, precision)
+        counts = np.diff(np.searchsorted(timestamps, edges))
+        return edges[:-1] - t0, counts / precision
@@ -0,0 +1,183 @@
+"""
+Error classes and retry policies for the load generators.
+
+A failed request used to be recorded only as str(e), which differs between boto, s3http
+and Python versions. classify() maps an exception to one of a fixed set of ErrorClass
+values, which go in the error_class result column (results.py) alongside the message.
+
+RetryPolicy decides whether a failure of a given class is retried and how long to wait:
+full-jitter exponential backoff, a random delay in [0, min(cap, base * 2**(attempt-1))]
+after failed attempt number attempt (from 1), so the first retry waits up to base. Every
+attempt is recorded as its own result line with its attempt number, so the analysis can
+tell goodput (successful first attempts and retries) from retry amplification (attempts
+per successful request) when an endpoint is overloaded.
+
+Policies are given as a preset name or comma separated settings:
+
+    none                                   no retries (the default)
+    standard                               3 attempts on slowdown, 5xx, timeout, connection
+    attempts=5,base=0.05,cap=2,on=slowdown+5xx
+
+This module is imported by the load generators, so keep it free of anything but the
+standard library.
+"""
+
+import enum
+import random
+import re
+import socket
+import ssl
+import threading
+import time
+
+
+class ErrorClass(enum.Enum):
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"   # reset, refused, broken pipe, DNS failure
+    TLS = "tls"
+    SLOWDOWN = "slowdown"       # 503 Slow Down
+    SERVER = "5xx"
+    CLIENT = "4xx"
+    OTHER = "other"
+
+
+def classify_status(status, body=b""):
+    if status == 503 or b"SlowDown" in (body or b""):
+        return ErrorClass.SLOWDOWN
+    if 500 <= status <= 599:
+        return ErrorClass.SERVER
+    if 400 <= status <= 499:
+        return ErrorClass.CLIENT
+    return ErrorClass.OTHER
+
+
+def classify(error):
+    """ErrorClass of an exception raised by s3http or boto."""
+    status = getattr(error, "status", None)
+    if isinstance(status, int):
+        # s3http.HTTPError and boto's S3ResponseError
+        body = getattr(error, "body", b"")
+        return classify_status(status, body if isinstance(body, bytes) else (body or "").encode("utf-8", "replace"))
+    if isinstance(error, socket.timeout):
+        return ErrorClass.TIMEOUT
+    if isinstance(error, ssl.SSLError):
+        return ErrorClass.TLS
+    if isinstance(error, (ConnectionError, socket.gaierror)):
+        return ErrorClass.CONNECTION
+    return classify_message(str(error))
+
+
+_MESSAGE_CLASSES = [
+    (re.compile(r"HTTP response 503|SlowDown"), ErrorClass.SLOWDOWN),
+    (re.compile(r"HTTP response 5\d\d"), ErrorClass.SERVER),
+    (re.compile(r"HTTP response 4\d\d"), ErrorClass.CLIENT),
+    (re.compile(r"timed out|[Tt]imeout"), ErrorClass.TIMEOUT),
+    (re.compile(r"SSL|TLS|[Cc]ertificate"), ErrorClass.TLS),
+    (re.compile(r"[Cc]onnection|[Bb]roken pipe|[Nn]ame or service|[Nn]ame resolution|closed by"), ErrorClass.CONNECTION),
+]
+
+
+def classify_message(message):
+    """ErrorClass from an error message, for results recorded before error_class existed."""
+    for pattern, error_class in _MESSAGE_CLASSES:
+        if pattern.search(message):
+            return error_class
+    return ErrorClass.OTHER
+
+
+class RetryPolicy:
+
+    PRESETS = {
+        "none": "attempts=1",
+        "standard": "attempts=3,base=0.1,cap=20,on=slowdown+5xx+timeout+connection",
+    }
+
+    def __init__(self, attempts=1, base=0.1, cap=20.0, retry_on=(ErrorClass.SLOWDOWN, ErrorClass.SERVER,
+                                                                  ErrorClass.TIMEOUT, ErrorClass.CONNECTION)):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+        self.retry_on = frozenset(retry_on)
+
+    @classmethod
+    def parse(cls, spec):
+        """RetryPolicy from a preset name or "attempts=N,base=S,cap=S,on=class+class"."""
+        spec = cls.PRESETS.get(spec, spec)
+        kwargs = {}
+        for item in filter(None, spec.split(",")):
+            name, _, value = item.partition("=")
+            name = name.strip()
+            if name == "attempts":
+                kwargs["attempts"] = int(value)
+            elif name in ("base", "cap"):
+                kwargs[name] = float(value)
+            elif name == "on":
+                kwargs["retry_on"] = [ErrorClass(v) for v in value.split("+") if v]
+            else:
+                raise ValueError("Unknown retry setting {!r} in {!r}".format(name, spec))
+        return cls(**kwargs)
+
+    def should_retry(self, error_class, attempt):
+        """attempt is the number of the attempt that just failed, from 1."""
+        return attempt < self.attempts and error_class in self.retry_on
+
+    def delay(self, attempt):
+        """Seconds to wait after failed attempt number attempt, from 1."""
+        return random.uniform(0, min(self.cap, self.base * 2 ** (attempt - 1)))
+
+    def __str__(self):
+        return "attempts={},base={},cap={},on={}".format(self.attempts, self.base, self.cap,
+                                                         "+".join(sorted(c.value for c in self.retry_on)))
+
+
+class ErrorCounters:
+    """Per-process totals of requests, attempts, retries and failures per ErrorClass."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.succeeded = 0
+        self.attempts = 0
+        self.errors = dict.fromkeys(ErrorClass, 0)
+        self.retried = dict.fromkeys(ErrorClass, 0)
+        self.gave_up = dict.fromkeys(ErrorClass, 0)
+        self._next_report = None
+
+    def attempt(self, attempt, error_class=None, retrying=False):
+        """Count one attempt: error_class is None for a success."""
+        with self._lock:
+            self.attempts += 1
+            if attempt == 1:
+                self.requests += 1
+            if error_class is None:
+                self.succeeded += 1
+            else:
+                self.errors[error_class] += 1
+                if retrying:
+                    self.retried[error_class] += 1
+                else:
+                    self.gave_up[error_class] += 1
+
+    def summary(self):
+        amplification = self.attempts / self.succeeded if self.succeeded else float("nan")
+        parts = ["{} requests, {} succeeded, {} attempts ({:.2f} per success)".format(
+            self.requests, self.succeeded, self.attempts, amplification)]
+        for error_class in ErrorClass:
+            if self.errors[error_class]:
+                parts.append("{}: {} errors, {} retried, {} gave up".format(
+                    error_class.value, self.errors[error_class], self.retried[error_class], self.gave_up[error_class]))
+        return "; ".join(parts)
+
+    def report(self, logger, interval=60):
+        """Log summary() at most once per interval seconds; cheap to call every request."""
+        now = time.monotonic()
+        if self._next_report is not None and now < self._next_report:
+            return
+        with self._lock:
+            first = self._next_report is None
+            if not first and now < self._next_report:
+                return
+            self._next_report = now + interval
+        if first:
+            return
+        logger.info("Requests: %s", self.summary())
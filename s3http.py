@@ -0,0 +1,469 @@
+"""
+Minimal S3 client over a raw socket for the load generators (the "http" engine).
+
+boto hides the socket, so a request can only be timed as a whole. Here each request
+records a monotonic timestamp at the end of every phase:
+
+    dns      name resolution (only when a new connection is made)
+    connect  TCP connect
+    tls      TLS handshake
+    send     request line, headers and body written to the socket
+    headers  response status line and headers received (time to first byte and more)
+    body     response body read
+
+Connections are kept alive between requests, so dns/connect/tls are zero unless the
+previous request closed the connection. A connection given an address resolved once up
+front (sites.resolve) never looks the host up, so dns is always zero.
+
+The body's integrity can be sent three ways (S3Connection integrity=):
+
+    sha256     x-amz-content-sha256 is the body's SHA-256, computed here unless the caller
+               passes one it already has (payload.py caches them per reusable buffer)
+    unsigned   UNSIGNED-PAYLOAD, the body is never hashed
+    streaming  aws-chunked upload where each 64KB chunk is hashed and signed as it is
+               written, so the body is only read once
+
+A FilePayload (payload.py) can be given as the body; on plain HTTP it is sent with
+sendfile(2) straight from the page cache, over TLS from its memory map.
+
+PipelinedPuts keeps up to depth small PUTs in flight on one connection (HTTP/1.1
+pipelining), so the connection never sits idle for a round trip between requests. Their
+heads are filled into a template formatted once and written from one reused buffer.
+
+Only the standard library is used, so the generator image doesn't need boto for this path.
+"""
+
+import collections
+import socket
+import ssl
+import time
+
+from s3sign import EMPTY_SHA256, STREAMING_PAYLOAD, UNSIGNED_PAYLOAD, Signer, payload_sha256
+
+PHASES = ["dns", "connect", "tls", "send", "headers", "body"]
+INTEGRITY_MODES = ("sha256", "unsigned", "streaming")
+STREAM_CHUNK = 65536
+# bodies PipelinedPuts takes: a whole window has to fit in the socket buffers, as nothing
+# reads responses while a window is being written
+PIPELINE_MAX_BODY = 65536
+
+
+def _chunk_header(size, signature):
+    return b"%x;chunk-signature=%s\r\n" % (size, signature.encode("ascii"))
+
+
+def streamed_length(size, chunk=STREAM_CHUNK):
+    """Content-Length of an aws-chunked body carrying size bytes."""
+    full, rest = divmod(size, chunk)
+    length = full * (len(_chunk_header(chunk, EMPTY_SHA256)) + chunk + 2)
+    if rest:
+        length += len(_chunk_header(rest, EMPTY_SHA256)) + rest + 2
+    return length + len(_chunk_header(0, EMPTY_SHA256)) + 2
+
+
+def host_header(host, port, is_secure):
+    """Host header value, which presigned URLs are also signed for."""
+    if (is_secure and port == 443) or (not is_secure and port == 80):
+        return host
+    return "{}:{}".format(host, port)
+
+
+class HTTPError(Exception):
+    """Non-2xx response. The message matches what mkobjects2.py has always recorded."""
+
+    def __init__(self, status, reason, body=b""):
+        Exception.__init__(self, "HTTP response %d %s" % (status, reason))
+        self.status = status
+        self.reason = reason
+        self.body = body
+
+
+class Timings:
+    """Monotonic timestamps taken at the end of each phase of one request."""
+
+    __slots__ = ["start"] + PHASES
+
+    def __init__(self):
+        self.start = time.monotonic()
+        for phase in PHASES:
+            setattr(self, phase, None)
+
+    def durations(self):
+        """Seconds spent in each phase, in PHASES order. Skipped phases take 0."""
+        result = []
+        last = self.start
+        for phase in PHASES:
+            t = getattr(self, phase)
+            if t is None:
+                result.append(0.0 if phase in ("dns", "connect", "tls") else None)
+            else:
+                result.append(t - last)
+                last = t
+        return result
+
+    @property
+    def elapsed(self):
+        end = self.body or self.headers or self.send or self.start
+        return end - self.start
+
+
+class Response:
+
+    def __init__(self, status, reason, headers, body, timings):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.timings = timings
+
+
+class S3Connection:
+    """One persistent HTTP/1.1 connection to an S3 endpoint, path-style addressing."""
+
+    def __init__(self, host, port, is_secure, access_key, secret_key, region="us-east-1", timeout=60, integrity="sha256",
+                 address=None):
+        """address is a (family, sockaddr) to connect to instead of resolving host each time."""
+        if integrity not in INTEGRITY_MODES:
+            raise ValueError("integrity must be one of {}".format(", ".join(INTEGRITY_MODES)))
+        self.integrity = integrity
+        self.host = host
+        self.port = port
+        self.is_secure = is_secure
+        self.timeout = timeout
+        self.address = address
+        self.signer = Signer(access_key, secret_key, region)
+        self.host_header = host_header(host, port, is_secure)
+        self.ssl_context = ssl.create_default_context() if is_secure else None
+        self.sock = None
+        self._buffer = b""
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+        self.sock = None
+        self._buffer = b""
+
+    def _connect(self, timings):
+        if self.address is not None:
+            family, address = self.address
+        else:
+            family, _, _, _, address = socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_STREAM)[0]
+        timings.dns = time.monotonic()
+
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            sock.connect(address)
+            timings.connect = time.monotonic()
+            if self.ssl_context is not None:
+                sock = self.ssl_context.wrap_socket(sock, server_hostname=self.host, do_handshake_on_connect=False)
+                sock.do_handshake()
+                timings.tls = time.monotonic()
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+        self._buffer = b""
+
+    def _send(self, head, body, source=None):
+        if source is not None and self.ssl_context is None and len(body) > 65536:
+            self.sock.sendall(head)
+            # Offsets are explicit, so threads can share the file object
+            self.sock.sendfile(source.file, 0, len(body))
+        elif len(body) <= 65536:
+            self.sock.sendall(head + bytes(body))
+        else:
+            self.sock.sendall(head)
+            self.sock.sendall(memoryview(body))
+
+    def _send_streaming(self, head, body, amz_date, seed_signature):
+        """Write body aws-chunked, hashing and signing each chunk just before it goes out."""
+        self.sock.sendall(head)
+        view = memoryview(body)
+        signature = seed_signature
+        for offset in range(0, len(view), STREAM_CHUNK):
+            chunk = view[offset:offset+STREAM_CHUNK]
+            signature = self.signer.sign_chunk(amz_date, signature, payload_sha256(chunk))
+            self.sock.sendall(b"".join((_chunk_header(len(chunk), signature), chunk, b"\r\n")))
+        signature = self.signer.sign_chunk(amz_date, signature, EMPTY_SHA256)
+        self.sock.sendall(_chunk_header(0, signature) + b"\r\n")
+
+    def _recv(self):
+        data = self.sock.recv(262144)
+        if not data:
+            raise ConnectionResetError("Connection closed by {}".format(self.host))
+        return data
+
+    def _read_head(self):
+        while b"\r\n\r\n" not in self._buffer:
+            self._buffer += self._recv()
+        head, self._buffer = self._buffer.split(b"\r\n\r\n", 1)
+        lines = head.decode("iso-8859-1").split("\r\n")
+        _, status, reason = (lines[0].split(" ", 2) + [""])[:3]
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return int(status), reason, headers
+
+    def _read_exact(self, n):
+        while len(self._buffer) < n:
+            self._buffer += self._recv()
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def _read_line(self):
+        while b"\r\n" not in self._buffer:
+            self._buffer += self._recv()
+        line, self._buffer = self._buffer.split(b"\r\n", 1)
+        return line
+
+    def _read_body(self, method, status, headers):
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            return b""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int(self._read_line().split(b";")[0], 16)
+                if size == 0:
+                    while self._read_line():
+                        pass
+                    return b"".join(chunks)
+                chunks.append(self._read_exact(size))
+                self._read_exact(2)
+        if "content-length" in headers:
+            return self._read_exact(int(headers["content-length"]))
+        # No length: body runs until the server closes the connection
+        chunks = [self._buffer]
+        self._buffer = b""
+        while True:
+            data = self.sock.recv(262144)
+            if not data:
+                break
+            chunks.append(data)
+        headers["connection"] = "close"
+        return b"".join(chunks)
+
+    def request(self, method, bucket, key="", body=b"", headers=None, payload_hash=None):
+        """
+        Make one request, reconnecting if needed. Raises HTTPError for a non-2xx status,
+        with the timings of the failed request attached as .timings.
+
+        body can be bytes, a memoryview or a FilePayload. payload_hash is its hex SHA-256 if
+        already known.
+        """
+        source = None
+        if hasattr(body, "fileno"):
+            source, body = body, body.data
+        timings = Timings()
+        path = "/{}/{}".format(bucket, key) if key else "/{}".format(bucket)
+        headers = dict(headers or {})
+        streaming = self.integrity == "streaming" and len(body) > 0
+        if streaming:
+            headers["Content-Encoding"] = "aws-chunked"
+            headers["x-amz-decoded-content-length"] = len(body)
+            content_length = streamed_length(len(body))
+            payload_hash = STREAMING_PAYLOAD
+        else:
+            content_length = len(body)
+            if self.integrity == "unsigned":
+                payload_hash = UNSIGNED_PAYLOAD
+            elif payload_hash is None:
+                payload_hash = payload_sha256(body)
+        self.signer.sign(method, self.host_header, path, headers, payload_hash)
+        head = ["{} {} HTTP/1.1".format(method, path), "Host: {}".format(self.host_header)]
+        if body or method in ("PUT", "POST"):
+            head.append("Content-Length: {}".format(content_length))
+        head.extend("{}: {}".format(name, value) for name, value in headers.items())
+        head = ("\r\n".join(head) + "\r\n\r\n").encode("utf-8")
+        if streaming:
+            send = lambda: self._send_streaming(head, body, headers["x-amz-date"], headers["Authorization"][-64:])
+        else:
+            send = lambda: self._send(head, body, source)
+        return self._exchange(method, send, timings)
+
+    def presigned(self, method, target, body=b""):
+        """
+        Send a request to a presigned target (path and query string from Signer.presign)
+        with no signing at all, as a grid job's plain HTTP client would.
+        """
+        timings = Timings()
+        head = ["{} {} HTTP/1.1".format(method, target), "Host: {}".format(self.host_header)]
+        if body or method in ("PUT", "POST"):
+            head.append("Content-Length: {}".format(len(body)))
+        head = ("\r\n".join(head) + "\r\n\r\n").encode("utf-8")
+        return self._exchange(method, lambda: self._send(head, body), timings)
+
+    def _exchange(self, method, send, timings):
+        """Connect if needed, send() the request and read the response."""
+        reused = self.sock is not None
+        try:
+            if not reused:
+                self._connect(timings)
+            try:
+                send()
+                timings.send = time.monotonic()
+                status, reason, response_headers = self._read_head()
+            except (ConnectionError, BrokenPipeError, ssl.SSLError):
+                # The server dropped the idle keep-alive connection, which shows up on the
+                # send or on the first read; retry once on a new one if no response came back
+                if not reused or self._buffer:
+                    raise
+                self.close()
+                timings = Timings()
+                self._connect(timings)
+                send()
+                timings.send = time.monotonic()
+                status, reason, response_headers = self._read_head()
+            timings.headers = time.monotonic()
+            response_body = self._read_body(method, status, response_headers)
+            timings.body = time.monotonic()
+        except Exception as e:
+            self.close()
+            e.timings = timings
+            raise
+
+        if response_headers.get("connection", "").lower() == "close":
+            self.close()
+
+        if not 200 <= status <= 299:
+            error = HTTPError(status, reason, response_body)
+            error.timings = timings
+            raise error
+        return Response(status, reason, response_headers, response_body, timings)
+
+    def put(self, bucket, key, body, headers=None, payload_hash=None):
+        return self.request("PUT", bucket, key, body, headers, payload_hash)
+
+    def get(self, bucket, key, headers=None):
+        return self.request("GET", bucket, key, headers=headers)
+
+    def head_bucket(self, bucket):
+        return self.request("HEAD", bucket)
+
+    def create_bucket(self, bucket):
+        return self.request("PUT", bucket)
+
+
+class PipelinedPuts:
+    """
+    Small PUTs sent back to back over one S3Connection, up to depth of them unanswered.
+
+    Responses come back in order, so each one completes the oldest request in flight and
+    the next request goes out straight away. Non-2xx responses fail only their own request;
+    a broken connection fails every request in flight and the next ones go on a new one.
+    When the server closes the connection after a response, the requests it didn't answer
+    are sent again on the new connection.
+
+    Integrity is the connection's: UNSIGNED-PAYLOAD, or the payload_hash given (streaming
+    isn't supported). Timings of a request run from when it is queued, so its headers
+    phase includes waiting behind the responses ahead of it.
+    """
+
+    def __init__(self, conn, depth=8):
+        if conn.integrity == "streaming":
+            raise ValueError("pipelined PUTs can't use streaming integrity")
+        self.conn = conn
+        self.depth = depth
+        # x-amz-content-sha256 and the other signed headers are always these, in this order
+        self._template = ("PUT /%s/%s HTTP/1.1\r\nHost: " + conn.host_header + "\r\nContent-Length: %d\r\n"
+                          "x-amz-date: %s\r\nx-amz-content-sha256: %s\r\nAuthorization: %s\r\n\r\n")
+        self._headers = {}
+        self._out = bytearray()
+        # [request, timings] in the order sent; the first unsent ones are at the end
+        self._pending = collections.deque()
+        self._unsent = 0
+        self._retry = collections.deque()
+
+    def _queue(self, request):
+        bucket, key, body, payload_hash = request[:4]
+        if len(body) > PIPELINE_MAX_BODY:
+            raise ValueError("pipelined PUT bodies are at most {} bytes, not {}".format(PIPELINE_MAX_BODY, len(body)))
+        if self.conn.integrity == "unsigned":
+            payload_hash = UNSIGNED_PAYLOAD
+        elif payload_hash is None:
+            payload_hash = payload_sha256(body)
+        headers = self._headers
+        headers.clear()
+        self.conn.signer.sign("PUT", self.conn.host_header, "/{}/{}".format(bucket, key), headers, payload_hash)
+        self._out += (self._template % (bucket, key, len(body), headers["x-amz-date"], payload_hash,
+                                        headers["Authorization"])).encode("utf-8")
+        self._out += body
+        self._pending.append([request, Timings()])
+        self._unsent += 1
+
+    def _flush(self):
+        conn = self.conn
+        if conn.sock is None:
+            conn._connect(self._pending[-self._unsent][1])
+        conn.sock.sendall(self._out)
+        del self._out[:]
+        now = time.monotonic()
+        for i in range(len(self._pending) - self._unsent, len(self._pending)):
+            self._pending[i][1].send = now
+        self._unsent = 0
+
+    def _fail_all(self, error, done):
+        self.conn.close()
+        del self._out[:]
+        self._unsent = 0
+        while self._pending:
+            request, timings = self._pending.popleft()
+            done(request, timings, error)
+
+    def _receive(self, done):
+        """Read the oldest request's response and call done for it."""
+        conn = self.conn
+        request, timings = self._pending[0]
+        status, reason, headers = conn._read_head()
+        timings.headers = time.monotonic()
+        body = conn._read_body("PUT", status, headers)
+        timings.body = time.monotonic()
+        self._pending.popleft()
+        if headers.get("connection", "").lower() == "close":
+            conn.close()
+            while self._pending:
+                self._retry.append(self._pending.popleft()[0])
+        if 200 <= status <= 299:
+            done(request, timings, None)
+        else:
+            error = HTTPError(status, reason, body)
+            error.timings = timings
+            done(request, timings, error)
+
+    def run(self, requests, done):
+        """
+        Send every (bucket, key, body, payload_hash, ...) tuple from the iterable requests,
+        and call done(request, timings, error) as each completes, error None on success.
+        Fields after the first four are the caller's, passed back to done as they are.
+        """
+        requests = iter(requests)
+        exhausted = False
+        while True:
+            while len(self._pending) < self.depth:
+                if self._retry:
+                    request = self._retry.popleft()
+                elif exhausted:
+                    break
+                else:
+                    request = next(requests, None)
+                    if request is None:
+                        exhausted = True
+                        break
+                self._queue(request)
+            if not self._pending:
+                return
+            try:
+                if self._unsent:
+                    self._flush()
+                self._receive(done)
+                # take every response that has already arrived before sending more
+                while self._pending and b"\r\n\r\n" in self.conn._buffer:
+                    self._receive(done)
+            except (OSError, ValueError) as e:
+                # ValueError is a response that couldn't be parsed
+                self._fail_all(e, done)
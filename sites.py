@@ -0,0 +1,265 @@
+"""
+Site registry, credential cache and pre-flight checks.
+
+Connection details for the object stores we test live in sites.yaml, one entry per site:
+
+    python sites.py list
+    python sites.py check ral cern      # resolve, get the keys and HEAD the bucket of each
+
+A site's keys come from the environment (credentials: env), as in the pods, or from the
+PanDA server's getKeyPair with the grid proxy (credentials: panda). PanDA keys are fetched
+once and kept in CREDENTIAL_CACHE, readable by the owner only, for CREDENTIAL_TTL seconds,
+so scripts started together don't each POST to the server (getkeys.py prints them).
+
+preflight() does what a load generator needs before its threads start, once per process:
+resolve the endpoint, get the keys and check the bucket with one HEAD. Threads are handed
+the resulting Endpoint and connect to its resolved address (s3http.S3Connection address=),
+so starting hundreds of threads doesn't mean hundreds of lookups and bucket validations.
+
+PyYAML (for the registry) and requests (for PanDA) are only imported when used, so the
+load generator image needs neither unless it uses them.
+"""
+
+import argparse
+import json
+import logging
+import os
+import os.path as op
+import socket
+import threading
+import time
+import urllib.parse
+
+import s3http
+
+SITES_FILE = op.join(op.dirname(op.abspath(__file__)), "sites.yaml")
+CREDENTIAL_CACHE = op.expanduser("~/.cache/stressos/credentials.json")
+CREDENTIAL_TTL = 24 * 3600
+PANDA_URL = "https://pandaserver.cern.ch:25443/server/panda/getKeyPair"
+
+
+class Site:
+    """One entry of the registry."""
+
+    def __init__(self, name, endpoint, port=443, secure=True, bucket=None, region="us-east-1",
+                 credentials="env", panda_key=None):
+        if credentials not in ("env", "panda"):
+            raise ValueError("credentials must be env or panda, not {!r}".format(credentials))
+        if credentials == "panda" and not panda_key:
+            raise ValueError("credentials: panda needs a panda_key")
+        self.name = name
+        self.endpoint = endpoint
+        self.port = int(port)
+        self.secure = bool(secure)
+        self.bucket = bucket
+        self.region = region
+        self.credentials = credentials
+        self.panda_key = panda_key
+
+    def __str__(self):
+        return "{} ({}://{}:{}/{})".format(self.name, "https" if self.secure else "http",
+                                          self.endpoint, self.port, self.bucket or "")
+
+
+def load_sites(path=SITES_FILE):
+    """Site per name from the registry file."""
+    import yaml
+
+    with open(path) as f:
+        entries = yaml.safe_load(f) or {}
+    sites = {}
+    for name, entry in entries.items():
+        try:
+            sites[name] = Site(name, **entry)
+        except (TypeError, ValueError) as e:
+            raise ValueError("Bad entry for site {} in {}: {}".format(name, path, e))
+    return sites
+
+
+def get_site(name, path=SITES_FILE):
+    sites = load_sites(path)
+    if name not in sites:
+        raise ValueError("Unknown site {!r}, {} has {}".format(name, path, ", ".join(sorted(sites))))
+    return sites[name]
+
+
+def ssl_certificate():
+    """ Return the path to the SSL certificate (the grid proxy) """
+    if "X509_USER_PROXY" in os.environ:
+        return os.environ["X509_USER_PROXY"]
+    return "/tmp/x509up_u%s" % str(os.getuid())
+
+
+def parse_key_pair(text):
+    """(access key, secret key) from a getKeyPair answer, publicKey=...&privateKey=... or JSON."""
+    try:
+        values = json.loads(text)
+    except ValueError:
+        values = dict(urllib.parse.parse_qsl(text))
+    if not isinstance(values, dict) or not values.get("publicKey") or not values.get("privateKey"):
+        raise RuntimeError("getKeyPair returned no key pair: {!r}".format(text[:200]))
+    return values["publicKey"], values["privateKey"]
+
+
+def fetch_panda_keys(key_name, url=PANDA_URL):
+    """Ask the PanDA server for the key pair key_name / key_name.pub. One POST, no caching."""
+    import requests
+    import urllib3
+
+    urllib3.disable_warnings()
+    cert = ssl_certificate()
+    r = requests.post(url,
+                      verify=False,
+                      cert=(cert, cert),
+                      data=urllib.parse.urlencode({"privateKeyName": key_name, "publicKeyName": key_name + ".pub"}),
+                      timeout=60)
+    if r.status_code != 200:
+        raise RuntimeError("getKeyPair for {} failed: HTTP {}".format(key_name, r.status_code))
+    return parse_key_pair(r.text)
+
+
+class CredentialCache:
+    """
+    Keys per site. PanDA keys are kept in memory and in a file shared by every process of
+    the user; environment keys are read as they are. Safe to share between threads.
+    """
+
+    def __init__(self, path=CREDENTIAL_CACHE, ttl=CREDENTIAL_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, site):
+        """
+        (access key, secret key) for site. Environment keys are <NAME>_AWS_ACCESS_KEY_ID and
+        <NAME>_AWS_SECRET_ACCESS_KEY if set, so one process can hold several sites' keys,
+        otherwise AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY.
+        """
+        if site.credentials == "panda":
+            return self.panda(site.panda_key)
+        prefix = site.name.upper() + "_"
+        for names in ((prefix + "AWS_ACCESS_KEY_ID", prefix + "AWS_SECRET_ACCESS_KEY"),
+                      ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY")):
+            keys = tuple(os.environ.get(name) for name in names)
+            if all(keys):
+                return keys
+        raise ValueError("Site {} takes its keys from {}AWS_ACCESS_KEY_ID / AWS_SECRET_ACCESS_KEY, which aren't set".format(site.name, prefix))
+
+    def panda(self, key_name, refresh=False):
+        """The PanDA key pair key_name, fetched only if not cached or older than the ttl."""
+        with self._lock:
+            if not refresh and key_name in self._keys:
+                return self._keys[key_name]
+            stored = self._read()
+            entry = stored.get(key_name)
+            if not refresh and entry and time.time() - entry["fetched"] < self.ttl:
+                keys = entry["access_key"], entry["secret_key"]
+            else:
+                keys = fetch_panda_keys(key_name)
+                logging.info("Fetched key pair %s from PanDA", key_name)
+                stored[key_name] = {"access_key": keys[0], "secret_key": keys[1], "fetched": time.time()}
+                self._write(stored)
+            self._keys[key_name] = keys
+            return keys
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, stored):
+        os.makedirs(op.dirname(self.path), mode=0o700, exist_ok=True)
+        temp = "{}.{}".format(self.path, os.getpid())
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(stored, f)
+        os.replace(temp, self.path)
+
+
+def resolve(host, port):
+    """Every (family, sockaddr) host:port resolves to, in getaddrinfo's order."""
+    addresses = []
+    for family, _, _, _, address in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        if (family, address) not in addresses:
+            addresses.append((family, address))
+    return addresses
+
+
+class Endpoint:
+    """A site after pre-flight: where to connect and with which keys."""
+
+    def __init__(self, site, addresses, access_key, secret_key):
+        self.site = site
+        self.addresses = addresses
+        self.access_key = access_key
+        self.secret_key = secret_key
+
+    @property
+    def address(self):
+        return self.addresses[0]
+
+    def connection(self, **kwargs):
+        """A new s3http connection to the resolved address."""
+        site = self.site
+        return s3http.S3Connection(site.endpoint, site.port, site.secure, self.access_key, self.secret_key,
+                                   site.region, address=self.address, **kwargs)
+
+
+def preflight(site, credentials=None, check_bucket=True):
+    """
+    Resolve site's endpoint, get its keys and HEAD its bucket, once. Raises whatever
+    failed: socket.gaierror, ValueError/RuntimeError for keys, s3http.HTTPError (404: no
+    such bucket, 403: the keys aren't valid for it).
+    """
+    start = time.monotonic()
+    addresses = resolve(site.endpoint, site.port)
+    resolved = time.monotonic()
+    access_key, secret_key = (credentials or CredentialCache()).get(site)
+    endpoint = Endpoint(site, addresses, access_key, secret_key)
+    if check_bucket and site.bucket:
+        s3conn = endpoint.connection()
+        try:
+            s3conn.head_bucket(site.bucket)
+        finally:
+            s3conn.close()
+    logging.info("Site %s: %s resolved to %s in %.3fs, ready in %.3fs", site.name, site.endpoint,
+                 endpoint.address[1][0], resolved - start, time.monotonic() - start)
+    return endpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Site registry: list the sites or check them")
+    parser.add_argument("--sites-file", default=SITES_FILE)
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("list", help="list the sites")
+    check_parser = subparsers.add_parser("check", help="resolve, get keys and HEAD the bucket of each site")
+    check_parser.add_argument("sites", nargs="*", help="default all")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+    sites = load_sites(args.sites_file)
+    if args.command == "list":
+        for name in sorted(sites):
+            print("{:8} {}, credentials {}".format(name, sites[name], sites[name].credentials))
+    elif args.command == "check":
+        credentials = CredentialCache()
+        failed = 0
+        for name in args.sites or sorted(sites):
+            if name not in sites:
+                parser.error("Unknown site {}".format(name))
+            try:
+                preflight(sites[name], credentials)
+            except Exception as e:
+                logging.error("Site %s: %s", name, e)
+                failed += 1
+        return 1 if failed else 0
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,112 @@
+"""
+Startup timing for the load generator, and a benchmark of it.
+
+With replicas scaled up, the seconds between a pod being scheduled and its first request
+decide how quickly the fleet reaches its target load. mkobjects2.py logs each step against
+the time the process started (from /proc, so interpreter start-up is included):
+
+    Startup: configured 0.121s after process start
+    Startup: pre-flight 0.158s after process start
+    Startup: first request 0.163s after process start
+
+The benchmark runs a generator command a few times with the current environment, stops
+each run at its first request and prints the median and worst time of every step:
+
+    ENGINE=http ENDPOINT_HOSTNAME=... python startup.py -n 5 python mkobjects2.py
+
+python -X importtime mkobjects2.py shows which imports to blame for a slow first step.
+"""
+
+import argparse
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+_IMPORTED = time.monotonic()
+_MARK = re.compile(r"Startup: (.+) ([0-9.]+)s after process start")
+
+
+def process_age():
+    """Seconds since this process started, from /proc; since this module was imported elsewhere."""
+    try:
+        with open("/proc/self/stat") as f:
+            # the command name can hold spaces, the fields after it can't
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        # the start time is counted in clock ticks on the boot time clock
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic() - _IMPORTED
+
+
+class StartupClock:
+    """Logs named steps, and the first request, against the process start time."""
+
+    def __init__(self, logger=None):
+        self.logger = logger or logging.getLogger()
+        self.started = time.monotonic() - process_age()
+        self._first = False
+        self._lock = threading.Lock()
+
+    def mark(self, step):
+        self.logger.info("Startup: %s %.3fs after process start", step, time.monotonic() - self.started)
+
+    def first_request(self):
+        """Call after every request; only the first call logs. Cheap once it has."""
+        if self._first:
+            return
+        with self._lock:
+            if self._first:
+                return
+            self._first = True
+        self.mark("first request")
+
+
+def run_once(command, timeout):
+    """{step: seconds} from one run of command, stopped at its first request."""
+    marks = {}
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    try:
+        for line in process.stderr:
+            match = _MARK.search(line)
+            if match:
+                marks[match.group(1)] = float(match.group(2))
+                if match.group(1) == "first request":
+                    break
+    finally:
+        timer.cancel()
+        process.kill()
+        process.wait()
+    return marks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time a load generator from process start to first request")
+    parser.add_argument("-n", "--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for a run's first request")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="generator command, e.g. python mkobjects2.py")
+    args = parser.parse_args()
+    if not args.command:
+        parser.error("give the generator command to run")
+
+    runs = [run_once(args.command, args.timeout) for _ in range(args.runs)]
+    steps = []
+    for marks in runs:
+        steps.extend(step for step in marks if step not in steps)
+    if "first request" not in steps:
+        sys.exit("No run got as far as its first request")
+    print("{:16} {:>9} {:>9}  over {} runs".format("step", "median", "worst", len(runs)))
+    for step in steps:
+        times = [marks[step] for marks in runs if step in marks]
+        print("{:16} {:8.3f}s {:8.3f}s{}".format(step, statistics.median(times), max(times),
+                                                "  ({} runs didn't get here)".format(len(runs) - len(times)) if len(times) < len(runs) else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,23 @@
 import boto
 import boto.s3.connection
-#access_key = ''
-#secret_key = ''
-#host_base = 'cephgw-test.usatlas.bnl.gov'
+import sys
+
+import sites
 
 """
 Test temporary URL generation
 """
 
-access_key = ''
-secret_key = ''
-host_base = 'storage.datacentred.io'
+# e.g. python urling.py bnl
+site = sites.get_site(sys.argv[1] if len(sys.argv) > 1 else 'ral')
+access_key, secret_key = sites.CredentialCache().get(site)
 
 conn = boto.connect_s3(
         aws_access_key_id = access_key,
         aws_secret_access_key = secret_key,
-        host = host_base,
-        is_secure = True,
+        host = site.endpoint,
+        port = site.port,
+        is_secure = site.secure,
         calling_format = boto.s3.connection.OrdinaryCallingFormat(),
         )
 